@@ -0,0 +1,213 @@
+import json
+import platform
+import time
+from typing import Callable, Dict, List, Optional
+
+from django import get_version
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Channel, CommunicationSchedule, Status
+from api.serializers import CommunicationScheduleSerializer, ScheduleDetailSerializer
+from api.services.rabbitmq import RabbitmqService
+
+
+class StubChannel:
+    """
+    Stands in for a pika channel: every AMQP method is accepted and discarded.
+    """
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class StubConnectionPool:
+    """
+    Stands in for the connection pool, running operations on a StubChannel.
+    """
+
+    channel = StubChannel()
+
+    def run(self, operation):
+        return operation(self.channel)
+
+
+def measure(operation: Callable[[], object], iterations: int, warmup: int = 5) -> Dict[str, float]:
+    """
+    Times an operation.
+
+    Args:
+        operation: The callable to time.
+        iterations (int): Timed calls.
+        warmup (int): Untimed calls made first, to fill caches.
+
+    Returns:
+        dict: Operations per second and the p50/p99 latency in milliseconds.
+    """
+    for _ in range(warmup):
+        operation()
+    samples: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    last = len(samples) - 1
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 1),
+        "p50_ms": round(samples[int(last * 0.50)] * 1000, 4),
+        "p99_ms": round(samples[int(last * 0.99)] * 1000, 4),
+    }
+
+
+def _seed(rows: int) -> CommunicationSchedule:
+    channels = list(Channel.objects.all())
+    scheduled = Status.objects.get(name="scheduled")
+    CommunicationSchedule.objects.bulk_create(
+        CommunicationSchedule(
+            recipient=f"user{i}@example.com",
+            message="Benchmark message",
+            scheduled_datetime=f"2030-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+            channel=channels[i % len(channels)],
+            status=scheduled,
+            exchange="benchmark",
+        )
+        for i in range(rows)
+    )
+    return CommunicationSchedule.objects.order_by("id").first()
+
+
+def build_scenarios(rows: int) -> Dict[str, Callable[[], object]]:
+    """
+    Builds the benchmarked operations over `rows` seeded schedules.
+
+    Args:
+        rows (int): Schedules inserted before timing, and serialized by the `serializer.detail_*` scenarios.
+
+    Returns:
+        dict: Scenario name to a callable running one operation.
+    """
+    schedule = _seed(rows)
+    service = RabbitmqService(pool=StubConnectionPool())
+    client = APIClient()
+    payload = {
+        "recipient": "bench@example.com",
+        "message": "Benchmark message",
+        "scheduled_datetime": "2030-01-01T10:00:00Z",
+        "channel": "email",
+        "exchange": "benchmark",
+    }
+    bulk_payload = [payload] * 100
+    schedules_url = "communication-schedule-%s"
+    detail_kwargs = {"pk": schedule.pk}
+
+    def get(name, **kwargs):
+        url = reverse(name, kwargs=kwargs or None)
+        return lambda: client.get(url)
+
+    def post(name, data=None, **kwargs):
+        url = reverse(name, kwargs=kwargs or None)
+        return lambda: client.post(url, data, format="json")
+
+    def export():
+        response = client.get(reverse(schedules_url % "export"))
+        for _ in response.streaming_content:
+            pass
+
+    return {
+        "service.send_message": lambda: service.send_message("benchmark", "", {"id": schedule.pk}),
+        "serializer.validate": lambda: CommunicationScheduleSerializer(data=payload).is_valid(),
+        "serializer.detail_many": lambda: ScheduleDetailSerializer(
+            CommunicationSchedule.objects.order_by("id")[:rows], many=True
+        ).data,
+        "serializer.detail_values": lambda: list(ScheduleDetailSerializer.from_values(
+            CommunicationSchedule.objects.order_by("id").values(*ScheduleDetailSerializer.values_fields)[:rows]
+        )),
+        # Read-only actions first, so they all see the `rows` seeded schedules.
+        "view.get_channels": get(schedules_url % "get-channels"),
+        "view.get_status": get(schedules_url % "get-status"),
+        "view.get_schedules": get(schedules_url % "get-schedules"),
+        "view.export": export,
+        "view.check": get(schedules_url % "check", **detail_kwargs),
+        "view.create_schedule": post(schedules_url % "create-schedule", payload),
+        "view.bulk_create_100": post(schedules_url % "bulk-create", bulk_payload),
+        "view.cancel": post(schedules_url % "cancel", **detail_kwargs),
+        "view.update_schedule": lambda: client.put(
+            reverse(schedules_url % "update-schedule", kwargs=detail_kwargs),
+            {"message": "Updated"},
+            format="json",
+        ),
+        "view.rabbitmq_list_queues": get("rabbitmq-list-queues"),
+        "view.rabbitmq_create_exchange": post("rabbitmq-create-exchange", {"exchange_name": "benchmark"}),
+    }
+
+
+def run_suite(iterations: int, rows: int, only: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Runs every scenario (or those whose name starts with one of `only`).
+
+    `service.send_message` runs RabbitmqService on a stubbed connection pool; the views use the
+    in-memory broker backend. Either way the benchmarks measure our own code instead of the network.
+
+    Args:
+        iterations (int): Timed calls per scenario.
+        rows (int): Schedules seeded in the database.
+        only (list): Prefixes of the scenarios to run.
+
+    Returns:
+        dict: Scenario name to its measurements.
+    """
+    with override_settings(BROKER_BACKEND="api.services.memory_broker.InMemoryBroker"):
+        scenarios = build_scenarios(rows)
+        return {
+            name: measure(operation, iterations)
+            for name, operation in scenarios.items()
+            if not only or name.startswith(tuple(only))
+        }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> Dict[str, Dict]:
+    """
+    Compares the results with a baseline, adding the throughput change to each scenario.
+
+    Args:
+        results (dict): The output of `run_suite`, updated in place.
+        baseline (dict): Results stored by an earlier run.
+        tolerance (float): Allowed throughput drop, e.g. 0.2 for 20%.
+
+    Returns:
+        dict: The scenarios whose throughput dropped by more than the tolerance.
+    """
+    regressions = {}
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        change = result["ops_per_sec"] / reference["ops_per_sec"] - 1
+        result["baseline_ops_per_sec"] = reference["ops_per_sec"]
+        result["change"] = round(change, 4)
+        if change < -tolerance:
+            regressions[name] = result
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    """
+    Describes where the benchmarks ran, so that results from different machines are not mixed up.
+    """
+    return {"python": platform.python_version(), "django": get_version(), "machine": platform.machine()}
+
+
+def load_baseline(path) -> Dict[str, Dict]:
+    """
+    Reads the results stored by `--save-baseline`, or returns an empty baseline if there are none.
+    """
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file)["results"]
+    except FileNotFoundError:
+        return {}
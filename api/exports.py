@@ -0,0 +1,72 @@
+import csv
+import json
+from typing import Dict, Iterator
+from api.serializers import ScheduleDetailSerializer
+
+EXPORT_FIELDS = ["id", "recipient", "message", "scheduled_datetime", "channel", "status", "delivery_error"]
+
+
+class _Echo:
+    """
+    File-like object whose `write` returns the line instead of buffering it, so csv.writer can feed a generator.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, chunk_size: int) -> Iterator[Dict]:
+    """
+    Yields the schedules of the queryset as dicts shaped like ScheduleDetailSerializer.
+
+    Rows are fetched as `.values()` `chunk_size` at a time (through a server-side cursor on PostgreSQL)
+    and the channel and status names come from the reference data cache, so memory use does not grow
+    with the number of rows and no join is needed.
+
+    Args:
+        queryset: The filtered CommunicationSchedule queryset.
+        chunk_size (int): Rows fetched from the database per round trip.
+
+    Yields:
+        dict: One schedule.
+    """
+    rows = queryset.order_by("scheduled_datetime", "id").values(*ScheduleDetailSerializer.values_fields)
+    yield from ScheduleDetailSerializer.from_values(rows.iterator(chunk_size=chunk_size))
+
+
+def stream_ndjson(queryset, chunk_size: int) -> Iterator[str]:
+    """
+    Streams the schedules as newline-delimited JSON, one schedule per line.
+
+    Args:
+        queryset: The filtered CommunicationSchedule queryset.
+        chunk_size (int): Rows fetched from the database per round trip.
+
+    Yields:
+        str: One line of output.
+    """
+    for row in iter_rows(queryset, chunk_size):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def stream_csv(queryset, chunk_size: int) -> Iterator[str]:
+    """
+    Streams the schedules as CSV, starting with a header row.
+
+    Args:
+        queryset: The filtered CommunicationSchedule queryset.
+        chunk_size (int): Rows fetched from the database per round trip.
+
+    Yields:
+        str: One line of output.
+    """
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in iter_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", stream_ndjson),
+    "csv": ("text/csv", stream_csv),
+}
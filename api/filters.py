@@ -0,0 +1,42 @@
+import django_filters
+from api.models import CommunicationSchedule
+from api.services.reference_data import channels, statuses
+
+
+class CommunicationScheduleFilter(django_filters.FilterSet):
+    """
+    Filters accepted by the schedule listing endpoints.
+
+    Attributes:
+        status (CharFilter): Name of the status, e.g. 'scheduled'.
+        channel (CharFilter): Name of the channel, e.g. 'email'.
+        recipient (CharFilter): Exact recipient of the message.
+        campaign (NumberFilter): Id of the campaign the schedules belong to.
+        scheduled_after (IsoDateTimeFilter): Only schedules at or after this moment.
+        scheduled_before (IsoDateTimeFilter): Only schedules before this moment.
+    """
+
+    status = django_filters.CharFilter(method="filter_status")
+    channel = django_filters.CharFilter(method="filter_channel")
+    recipient = django_filters.CharFilter(field_name="recipient")
+    campaign = django_filters.NumberFilter(field_name="campaign_id")
+    scheduled_after = django_filters.IsoDateTimeFilter(field_name="scheduled_datetime", lookup_expr="gte")
+    scheduled_before = django_filters.IsoDateTimeFilter(field_name="scheduled_datetime", lookup_expr="lt")
+
+    class Meta:
+        model = CommunicationSchedule
+        fields = ["status", "channel", "recipient", "campaign", "scheduled_after", "scheduled_before"]
+
+    def filter_status(self, queryset, name, value):
+        """
+        Filters by status id, resolving the name through the reference data cache.
+        """
+        status = statuses.get(value)
+        return queryset.filter(status_id=status.pk) if status is not None else queryset.none()
+
+    def filter_channel(self, queryset, name, value):
+        """
+        Filters by channel id, resolving the name through the reference data cache.
+        """
+        channel = channels.get(value)
+        return queryset.filter(channel_id=channel.pk) if channel is not None else queryset.none()
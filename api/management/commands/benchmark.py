@@ -0,0 +1,60 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.benchmarks import compare, environment, load_baseline, run_suite
+
+
+class Command(BaseCommand):
+    """
+    Times the hot paths of the API (RabbitMQ service, serializers and every schedule view action)
+    against a stubbed broker and a throwaway test database, so it runs offline and never touches real data.
+
+    Results are printed as JSON and compared with a stored baseline to catch performance regressions.
+    """
+
+    help = "Runs the microbenchmark suite and compares it with the stored baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="Timed calls per scenario.")
+        parser.add_argument("--rows", type=int, default=1000, help="Schedules seeded in the test database.")
+        parser.add_argument(
+            "--only", action="append", default=[], help="Only run scenarios starting with this prefix (repeatable)."
+        )
+        parser.add_argument(
+            "--baseline", default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"),
+            help="File holding the baseline results.",
+        )
+        parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2, help="Allowed throughput drop before flagging a regression."
+        )
+        parser.add_argument(
+            "--fail-on-regression", action="store_true", help="Exit with an error if any scenario regressed."
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = run_suite(options["iterations"], options["rows"], options["only"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {"environment": environment(), "rows": options["rows"], "results": results}
+        regressions = compare(results, load_baseline(options["baseline"]), options["tolerance"])
+        report["regressions"] = sorted(regressions)
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if options["save_baseline"]:
+            os.makedirs(os.path.dirname(options["baseline"]) or ".", exist_ok=True)
+            with open(options["baseline"], "w") as baseline_file:
+                json.dump(report, baseline_file, indent=2)
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"Performance regression in: {', '.join(sorted(regressions))}")
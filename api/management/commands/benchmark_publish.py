@@ -0,0 +1,71 @@
+import json
+import time
+
+import pika
+from django.core.management.base import BaseCommand
+
+from api.services.connection_pool import build_connection_parameters
+from api.services.rabbitmq import RabbitmqService
+
+
+class Command(BaseCommand):
+    """
+    Measures publishes per second against a live broker, comparing one connection per publish
+    (the behaviour before the connection pool) with the pooled RabbitmqService.
+    """
+
+    help = "Benchmarks RabbitMQ publishing with and without the connection pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=1000, help="Messages published per scenario.")
+        parser.add_argument("--queue", default="benchmark_publish", help="Scratch queue receiving the messages.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        messages = options["messages"]
+        queue_name = options["queue"]
+        service = RabbitmqService()
+        service.run(lambda channel: channel.queue_declare(queue=queue_name, auto_delete=False))
+
+        try:
+            results = {
+                "messages": messages,
+                "unpooled_publishes_per_second": self._measure(messages, lambda i: self._publish_unpooled(queue_name, i)),
+                "pooled_publishes_per_second": self._measure(
+                    messages, lambda i: service.send_message("", queue_name, {"id": i})
+                ),
+            }
+        finally:
+            service.run(lambda channel: channel.queue_delete(queue=queue_name))
+
+        results["speedup"] = round(
+            results["pooled_publishes_per_second"] / results["unpooled_publishes_per_second"], 2
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"Messages per scenario: {messages}")
+        self.stdout.write(f"Before (connection per publish): {results['unpooled_publishes_per_second']} msg/s")
+        self.stdout.write(f"After (pooled connections):      {results['pooled_publishes_per_second']} msg/s")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {results['speedup']}x"))
+
+    @staticmethod
+    def _measure(messages, publish) -> float:
+        started = time.perf_counter()
+        for i in range(messages):
+            publish(i)
+        elapsed = time.perf_counter() - started
+        return round(messages / elapsed, 1)
+
+    @staticmethod
+    def _publish_unpooled(queue_name, i) -> None:
+        connection = pika.BlockingConnection(build_connection_parameters())
+        try:
+            connection.channel().basic_publish(
+                exchange="",
+                routing_key=queue_name,
+                body=json.dumps({"id": i}),
+                properties=pika.BasicProperties(delivery_mode=2),
+            )
+        finally:
+            connection.close()
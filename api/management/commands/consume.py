@@ -0,0 +1,88 @@
+import multiprocessing
+import signal
+import threading
+
+from django import db
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.broker import get_broker
+from api.services.consumer import ScheduleConsumer
+
+
+def _run_worker(options) -> None:
+    consumer = ScheduleConsumer(
+        get_broker(),
+        options["queue"],
+        prefetch_count=options["prefetch"],
+        batch_size=options["batch_size"],
+        max_wait=options["max_wait"],
+    )
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    consumer.run_forever(stop_event, report_interval=options["report_interval"])
+
+
+class Command(BaseCommand):
+    """
+    Runs workers consuming the messages published for communication schedules and delivering them.
+    """
+
+    help = "Consumes schedule messages from a queue in batches and delivers them with the handler of their channel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("queue", help="The queue to consume.")
+        parser.add_argument(
+            "--prefetch", type=int, default=settings.CONSUMER_PREFETCH,
+            help="Unacknowledged messages held by each worker (basic_qos prefetch count).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.CONSUMER_BATCH_SIZE,
+            help="Messages loaded, delivered and acknowledged together; at most the prefetch.",
+        )
+        parser.add_argument(
+            "--max-wait", type=float, default=settings.CONSUMER_MAX_WAIT,
+            help="Seconds to wait for a batch to fill before handling what arrived.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=settings.CONSUMER_WORKERS,
+            help="Worker processes, each with its own broker and database connections.",
+        )
+        parser.add_argument(
+            "--report-interval", type=float, default=60.0,
+            help="Seconds between two reports of the throughput and the delivery lag.",
+        )
+
+    def handle(self, *args, **options):
+        if options["prefetch"] < 1 or options["batch_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--prefetch, --batch-size and --workers must be at least 1.")
+
+        if options["workers"] == 1:
+            self.stdout.write(f"Consuming {options['queue']}.")
+            _run_worker(options)
+            self.stdout.write("Consumer stopped.")
+            return
+
+        # Children must not share the database connections of the parent.
+        db.connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_run_worker, args=(options,), name=f"consumer-{index}")
+            for index in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+
+        def stop(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        # Ctrl+C reaches the whole process group, so the workers stop by themselves.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.stdout.write(f"Consuming {options['queue']} with {len(workers)} workers.")
+        for worker in workers:
+            worker.join()
+        self.stdout.write("Consumers stopped.")
@@ -0,0 +1,61 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.dispatcher import ScheduleDispatcher
+from api.services.broker import get_broker
+
+
+class Command(BaseCommand):
+    """
+    Runs the dispatcher that publishes communication schedules at their scheduled datetime.
+    """
+
+    help = "Publishes schedules when they are due and moves them from scheduled to sent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lookahead", type=float, default=settings.DISPATCHER_LOOKAHEAD,
+            help="Seconds ahead of now loaded into memory on each refill.",
+        )
+        parser.add_argument(
+            "--refill-interval", type=float, default=settings.DISPATCHER_REFILL_INTERVAL,
+            help="Seconds between two scans of the database.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.DISPATCHER_BATCH_SIZE,
+            help="Schedules claimed and published per transaction.",
+        )
+        parser.add_argument(
+            "--max-pending", type=int, default=settings.DISPATCHER_MAX_PENDING,
+            help="Maximum schedules held in memory.",
+        )
+        parser.add_argument("--shard-index", type=int, default=0, help="Shard handled by this process.")
+        parser.add_argument("--shard-count", type=int, default=1, help="Number of dispatcher shards.")
+        parser.add_argument(
+            "--report-interval", type=float, default=60.0,
+            help="Seconds between two reports of the firing lateness.",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["shard_index"] < options["shard_count"]:
+            raise CommandError("--shard-index must be between 0 and --shard-count - 1.")
+
+        dispatcher = ScheduleDispatcher(
+            get_broker(),
+            lookahead=options["lookahead"],
+            refill_interval=options["refill_interval"],
+            batch_size=options["batch_size"],
+            max_pending=options["max_pending"],
+            shard_index=options["shard_index"],
+            shard_count=options["shard_count"],
+        )
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+        self.stdout.write("Dispatcher started.")
+        dispatcher.run_forever(stop_event, report_interval=options["report_interval"])
+        self.stdout.write(f"Dispatcher stopped after {dispatcher.lag.total} schedules.")
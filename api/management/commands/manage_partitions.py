@@ -0,0 +1,82 @@
+import logging
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.services import partitions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Maintains the monthly partitions of the schedule table on PostgreSQL.
+
+    Creates the partitions of the coming months ahead of time and, when a retention period is set,
+    detaches the partitions older than it whose schedules are all sent or canceled, archives each
+    one as a gzip-compressed CSV file and drops it.
+    """
+
+    help = "Creates upcoming schedule partitions and archives expired ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=settings.SCHEDULE_PARTITION_MONTHS_AHEAD,
+            help="Future months to create partitions for.",
+        )
+        parser.add_argument(
+            "--retention-months", type=int, default=settings.SCHEDULE_RETENTION_MONTHS,
+            help="Full months kept before the current one; 0 keeps every partition.",
+        )
+        parser.add_argument(
+            "--archive-dir", default=settings.SCHEDULE_ARCHIVE_DIR,
+            help="Directory receiving the archived partitions.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Seconds between two runs; by default the command runs once and exits.",
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write("The schedule table is not partitioned (PostgreSQL only), nothing to do.")
+            return
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            try:
+                self.run_once(options)
+            except Exception:
+                if not options["interval"]:
+                    raise
+                logger.exception("Partition maintenance failed, retrying in %ss.", options["interval"])
+                close_old_connections()
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def run_once(self, options):
+        now = timezone.now()
+        for partition in partitions.ensure_partitions(now, options["months_ahead"]):
+            self.stdout.write(f"Created partition {partition.name}.")
+        if options["retention_months"] <= 0:
+            return
+
+        for partition in partitions.expired(partitions.attached_partitions(), now, options["retention_months"]):
+            if partitions.has_pending_schedules(partition):
+                logger.warning("Partition %s still has pending schedules, keeping it.", partition.name)
+                continue
+            partitions.detach_partition(partition)
+            self.stdout.write(f"Detached partition {partition.name}.")
+        # Includes partitions detached by an earlier run whose archive did not complete.
+        for partition in partitions.detached_partitions():
+            path = partitions.archive_partition(partition, options["archive_dir"])
+            self.stdout.write(f"Archived partition {partition.name} to {path}.")
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """
+    Deletes idempotency keys older than the retention period; requests retried later are handled as new ones.
+    """
+
+    help = "Deletes expired idempotency keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=int, default=settings.IDEMPOTENCY_KEY_RETENTION_HOURS,
+            help="Age in hours after which a key is deleted.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} idempotency keys.")
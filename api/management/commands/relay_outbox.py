@@ -0,0 +1,60 @@
+import logging
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.services.outbox import relay_batch
+from api.services.broker import get_broker
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Drains the outbox, publishing its messages to RabbitMQ in batches over one pooled channel.
+
+    Several relays can run at the same time; rows are claimed with SKIP LOCKED.
+    """
+
+    help = "Publishes the messages waiting in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_RELAY_BATCH_SIZE,
+            help="Messages claimed and published per transaction.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=settings.OUTBOX_RELAY_POLL_INTERVAL,
+            help="Seconds to wait when the outbox is empty.",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the outbox and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        poll_interval = options["poll_interval"]
+        service = get_broker()
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        published = 0
+        while self.running:
+            try:
+                count = relay_batch(service, batch_size)
+            except Exception:
+                logger.exception("Failed to relay outbox batch, retrying in %ss.", poll_interval)
+                close_old_connections()
+                time.sleep(poll_interval)
+                continue
+            published += count
+            if count < batch_size:
+                if options["once"]:
+                    break
+                time.sleep(poll_interval)
+        self.stdout.write(f"Published {published} messages.")
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,54 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.broker import get_broker
+from api.services.delay_tiers import ROUTER_NAME, DelayRouter
+
+
+class Command(BaseCommand):
+    """
+    Forwards the messages expired from the delay tiers to their next tier or to their exchange.
+    """
+
+    help = (
+        "Consumes the delay router queue and republishes each message to the next delay tier, "
+        "or to its exchange once due (SCHEDULE_DISPATCH_MODE = 'delayed')."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefetch", type=int, default=settings.DELAY_ROUTER_PREFETCH,
+            help="Unacknowledged messages held by the router (basic_qos prefetch count).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.DELAY_ROUTER_BATCH_SIZE,
+            help="Messages republished and acknowledged together; at most the prefetch.",
+        )
+        parser.add_argument(
+            "--max-wait", type=float, default=settings.DELAY_ROUTER_MAX_WAIT,
+            help="Seconds to wait for a batch to fill, added to the delay of each hop.",
+        )
+        parser.add_argument(
+            "--report-interval", type=float, default=60.0,
+            help="Seconds between two reports of the throughput.",
+        )
+
+    def handle(self, *args, **options):
+        if options["prefetch"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--prefetch and --batch-size must be at least 1.")
+
+        router = DelayRouter(
+            get_broker(),
+            prefetch_count=options["prefetch"],
+            batch_size=options["batch_size"],
+            max_wait=options["max_wait"],
+        )
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+        self.stdout.write(f"Routing delayed messages from {ROUTER_NAME}.")
+        router.run_forever(stop_event, report_interval=options["report_interval"])
+        self.stdout.write("Delay router stopped.")
@@ -0,0 +1,51 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from api.services.metrics import HTTP_REQUEST_QUERIES, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, counting_queries
+
+# View label of requests that matched no URL pattern, keeping the label set bounded.
+UNMATCHED_VIEW = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, the response status and the number of database queries of each request, by view.
+
+    The view is the URL pattern name (e.g. "communication-schedule-get-schedules") rather than the
+    path, so ids in URLs do not create a time series each. Works under WSGI and ASGI; queries
+    made by async views through `sync_to_async` are counted as well.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with counting_queries() as queries:
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, queries.count)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with counting_queries() as queries:
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, queries.count)
+        return response
+
+    @staticmethod
+    def _record(request, response, seconds: float, query_count: int) -> None:
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name or match._func_path) if match is not None else UNMATCHED_VIEW
+        HTTP_REQUEST_SECONDS.observe(seconds, view=view, method=request.method)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_REQUEST_QUERIES.observe(query_count, view=view)
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_default_values"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="communicationschedule",
+            index=models.Index(fields=["scheduled_datetime", "id"], name="sched_dt_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="communicationschedule",
+            index=models.Index(fields=["status", "scheduled_datetime", "id"], name="sched_status_dt_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="communicationschedule",
+            index=models.Index(fields=["channel", "scheduled_datetime", "id"], name="sched_channel_dt_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="communicationschedule",
+            index=models.Index(fields=["recipient", "scheduled_datetime", "id"], name="sched_recipient_dt_idx"),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_outbox_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="communicationschedule",
+            name="dispatched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="communicationschedule",
+            name="exchange",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="communicationschedule",
+            name="routing_key",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
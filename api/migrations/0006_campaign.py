@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_schedule_dispatch_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Campaign",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255)),
+                ("message", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="communicationschedule",
+            name="variables",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="communicationschedule",
+            name="message",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="communicationschedule",
+            name="campaign",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="schedules",
+                to="api.campaign",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="communicationschedule",
+            index=models.Index(fields=["campaign", "scheduled_datetime", "id"], name="sched_campaign_dt_idx"),
+        ),
+    ]
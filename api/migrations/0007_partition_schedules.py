@@ -0,0 +1,122 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+from django.utils import timezone
+
+# Months after the current one created with the partitioned table; later months are created by
+# the `manage_partitions` command.
+MONTHS_AHEAD = 3
+
+
+def _month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _free_names(cursor, table):
+    # Drops the primary key, foreign keys and indexes of `table`, whose names are needed by the
+    # table replacing it, and detaches its id from any identity or serial sequence.
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'f')", [table]
+    )
+    for (name,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+    for (name,) in cursor.fetchall():
+        cursor.execute(f'DROP INDEX "{name}"')
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT")
+
+
+def _add_foreign_keys_and_indexes(schema_editor, model):
+    for field in model._meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(schema_editor._create_fk_sql(model, field, "_fk_%(to_table)s_%(to_column)s"))
+        if field.db_index and not field.unique and not field.primary_key:
+            schema_editor.execute(schema_editor._create_index_sql(model, fields=[field]))
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def partition_schedules(apps, schema_editor):
+    """
+    Turns the schedule table into a table partitioned by month of `scheduled_datetime`.
+
+    The primary key becomes (id, scheduled_datetime), since PostgreSQL requires the partition key
+    in every unique constraint; ids still come from a single sequence. No foreign key may point at
+    the table afterwards. Other databases keep the plain table.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    model = apps.get_model("api", "CommunicationSchedule")
+    table = model._meta.db_table
+    legacy = f"{table}_legacy"
+    sequence = f"{table}_id_seq"
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        _free_names(cursor, legacy)
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence}")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1, MIN(scheduled_datetime) FROM {legacy}")
+        next_id, oldest = cursor.fetchone()
+
+        cursor.execute(f"CREATE SEQUENCE {sequence} START WITH {int(next_id)}")
+        cursor.execute(f"CREATE TABLE {table} (LIKE {legacy}) PARTITION BY RANGE (scheduled_datetime)")
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, scheduled_datetime)")
+        _add_foreign_keys_and_indexes(schema_editor, model)
+
+        month = _month_start(min(oldest, timezone.now()) if oldest else timezone.now())
+        last = _month_start(timezone.now())
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {table}_p{month.year:04d}_{month.month:02d} PARTITION OF {table} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [month.isoformat(), _next_month(month).isoformat()],
+            )
+            month = _next_month(month)
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+        cursor.execute(f"DROP TABLE {legacy}")
+
+
+def unpartition_schedules(apps, schema_editor):
+    """
+    Moves the schedules back into a plain table with `id` as primary key. Archived partitions are not restored.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    model = apps.get_model("api", "CommunicationSchedule")
+    table = model._meta.db_table
+    partitioned = f"{table}_partitioned"
+    sequence = f"{table}_id_seq"
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        _free_names(cursor, partitioned)
+        cursor.execute(f"CREATE TABLE {table} (LIKE {partitioned})")
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+        _add_foreign_keys_and_indexes(schema_editor, model)
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+        cursor.execute(f"DROP TABLE {partitioned} CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_campaign"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_schedules, unpartition_schedules),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="channel",
+            name="burst",
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name="channel",
+            name="rate_limit",
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0.001)]),
+        ),
+    ]
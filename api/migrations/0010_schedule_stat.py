@@ -0,0 +1,62 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:23
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_schedule_stats(apps, schema_editor):
+    """
+    Counts the existing schedules by UTC day, channel and status with one GROUP BY.
+    """
+    CommunicationSchedule = apps.get_model("api", "CommunicationSchedule")
+    ScheduleStat = apps.get_model("api", "ScheduleStat")
+    rows = (
+        CommunicationSchedule.objects.annotate(day=TruncDate("scheduled_datetime", tzinfo=dt_timezone.utc))
+        .values("day", "channel_id", "status_id")
+        .annotate(total=models.Count("id"))
+        .order_by()
+    )
+    ScheduleStat.objects.bulk_create(
+        (
+            ScheduleStat(day=row["day"], channel_id=row["channel_id"], status_id=row["status_id"], count=row["total"])
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_channel_rate_limit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleStat",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("count", models.BigIntegerField(default=0)),
+                (
+                    "channel",
+                    models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to="api.channel"),
+                ),
+                (
+                    "status",
+                    models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to="api.status"),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "channel", "status"), name="schedule_stat_day_channel_status_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_schedule_stats, migrations.RunPython.noop),
+    ]
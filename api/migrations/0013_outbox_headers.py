@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_dead_letter_replay"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="headers",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
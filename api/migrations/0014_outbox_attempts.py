@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_outbox_headers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
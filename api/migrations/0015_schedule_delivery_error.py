@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_outbox_attempts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="communicationschedule",
+            name="delivery_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
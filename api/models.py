@@ -1,4 +1,8 @@
+from string import Template
+
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 
 class Channel(models.Model):
@@ -8,9 +12,17 @@ class Channel(models.Model):
     Attributes:
         name (CharField): The unique name of the channel with a maximum length of 20 characters.
         description (CharField): A brief description of the channel with a maximum length of 50 characters.
+        rate_limit (FloatField): Messages per second the downstream provider accepts, or null for no limit.
+        burst (PositiveIntegerField): Messages that may be sent back to back once the channel was idle.
+
+    The limit is a token bucket (see `api.services.rate_limit`): the dispatcher spreads the messages
+    of a limited channel over time and, with `CHANNEL_RATE_LIMIT_ADMISSION`, the API answers 429
+    when the channel is over its rate. Changes apply at runtime, through the channel cache.
     """
     name = models.CharField(max_length=20, unique=True)
     description = models.CharField(max_length=50)
+    rate_limit = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0.001)])
+    burst = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
 
     def __str__(self) -> str:
         """
@@ -43,25 +55,110 @@ class Status(models.Model):
         return self.name
 
 
+def render_message(template: str, variables=None) -> str:
+    """
+    Replaces the `$name` placeholders of a campaign message with the variables of a recipient.
+
+    Args:
+        template (str): The campaign message.
+        variables (dict): The variables of the recipient, or None.
+
+    Returns:
+        str: The rendered message.
+    """
+    if not variables:
+        return template
+    return Template(template).safe_substitute(variables)
+
+
+class Campaign(models.Model):
+    """
+    Model representing a message sent to many recipients.
+
+    The message is stored once; each recipient gets a CommunicationSchedule pointing at the campaign,
+    with its own `variables` to personalize the message.
+
+    Attributes:
+        name (CharField): A name identifying the campaign with a maximum length of 255 characters.
+        message (TextField): The message template. `$name` or `${name}` placeholders are replaced by
+            the variables of each recipient; placeholders without a variable are left as they are.
+        created_at (DateTimeField): The timestamp for when the campaign was created.
+    """
+    name = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def render(self, variables=None) -> str:
+        """
+        Returns the message of the campaign for one recipient.
+
+        Args:
+            variables (dict): The variables of the recipient, or None.
+
+        Returns:
+            str: The message with the placeholders replaced.
+        """
+        return render_message(self.message, variables)
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the campaign.
+
+        Returns:
+            str: A string indicating the primary key and the name.
+        """
+        return f"{self.pk} -- {self.name}"
+
+
 class CommunicationSchedule(models.Model):
     """
     Model representing a scheduled communication.
 
+    On PostgreSQL the table is partitioned by month of `scheduled_datetime` and its primary key is
+    (id, scheduled_datetime), see migration 0007 and the `manage_partitions` command. Ids remain
+    unique, but no foreign key may reference this model.
+
     Attributes:
         recipient (CharField): The recipient's information with a maximum length of 255 characters.
-        message (TextField): The message to be sent.
+        message (TextField): The message to be sent; empty for schedules of a campaign, whose message
+            is stored once on the campaign.
         scheduled_datetime (DateTimeField): The date and time when the message is scheduled to be sent.
         channel (ForeignKey): A foreign key linking to the Channel model, indicating the communication channel.
         status (ForeignKey): A foreign key linking to the Status model, indicating the current status of the schedule.
+        exchange (CharField): The exchange the schedule is published to when it is due.
+        routing_key (CharField): The routing key used to publish the schedule.
+        dispatched_at (DateTimeField): The moment the schedule was handed to the broker, if it already was.
+        delivery_error (TextField): Why the consumer last failed to deliver the message, empty otherwise.
+        campaign (ForeignKey): The campaign the schedule belongs to, if any.
+        variables (JSONField): Values of the campaign placeholders for this recipient.
         created_at (DateTimeField): The timestamp for when the communication schedule was created.
     """
     recipient = models.CharField(max_length=255)
-    message = models.TextField()
+    message = models.TextField(blank=True, default="")
     scheduled_datetime = models.DateTimeField()
     channel = models.ForeignKey(Channel, on_delete=models.CASCADE, default=1)
     status = models.ForeignKey(Status, on_delete=models.CASCADE, default=1)
+    exchange = models.CharField(max_length=255, blank=True, default="")
+    routing_key = models.CharField(max_length=255, blank=True, default="")
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    delivery_error = models.TextField(blank=True, default="")
+    campaign = models.ForeignKey(
+        Campaign, on_delete=models.CASCADE, null=True, blank=True, related_name="schedules", db_index=False
+    )
+    variables = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Composite indexes backing the keyset pagination on (scheduled_datetime, id), alone or
+        # combined with an equality filter on status, channel or recipient.
+        indexes = [
+            models.Index(fields=["scheduled_datetime", "id"], name="sched_dt_id_idx"),
+            models.Index(fields=["status", "scheduled_datetime", "id"], name="sched_status_dt_idx"),
+            models.Index(fields=["channel", "scheduled_datetime", "id"], name="sched_channel_dt_idx"),
+            models.Index(fields=["recipient", "scheduled_datetime", "id"], name="sched_recipient_dt_idx"),
+            models.Index(fields=["campaign", "scheduled_datetime", "id"], name="sched_campaign_dt_idx"),
+        ]
+
     def __str__(self) -> str:
         """
         Returns a string representation of the communication schedule.
@@ -70,3 +167,142 @@ class CommunicationSchedule(models.Model):
             str: A string indicating the primary key, channel, and recipient.
         """
         return f"{self.pk} -- {self.channel} to {self.recipient}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Model representing a message waiting to be published to RabbitMQ.
+
+    Rows are written in the same transaction as the data they announce and are drained by the
+    `relay_outbox` management command, so a committed schedule is never left unpublished.
+
+    Attributes:
+        exchange (CharField): The exchange the message is published to.
+        routing_key (CharField): The routing key used to publish the message.
+        body (JSONField): The message body, serialized to JSON when published.
+        created_at (DateTimeField): The timestamp for when the message was enqueued.
+        available_at (DateTimeField): The time from which the relay may publish the message; later
+            than `created_at` for messages due beyond the largest delay tier.
+        headers (JSONField): The message headers, if any; they tell the delay tiers when a delayed
+            message is due.
+        attempts (PositiveIntegerField): The publishes the broker did not confirm; each one pushes
+            `available_at` back (see `OUTBOX_RETRY_DELAY`).
+    """
+    exchange = models.CharField(max_length=255)
+    routing_key = models.CharField(max_length=255, blank=True, default="")
+    body = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    headers = models.JSONField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["available_at", "id"], name="outbox_available_at_idx")]
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the outbox message.
+
+        Returns:
+            str: A string indicating the primary key and the exchange.
+        """
+        return f"{self.pk} -- {self.exchange}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model representing a request made with an `Idempotency-Key` header and the response it got.
+
+    A retried request with the same key gets the stored response instead of creating its schedules
+    again. The schedule is referenced by a plain id rather than a foreign key, since the partitioned
+    schedule table cannot be referenced (see CommunicationSchedule).
+
+    Attributes:
+        scope (CharField): The endpoint the key was used on, e.g. "create_schedule".
+        key (CharField): The value of the `Idempotency-Key` header, unique within its scope.
+        fingerprint (CharField): SHA-256 of the request body, to detect a key reused for another request.
+        schedule_id (BigIntegerField): The schedule created by the request, if it created exactly one.
+        status_code (PositiveSmallIntegerField): The HTTP status of the stored response.
+        response (JSONField): The body of the stored response.
+        created_at (DateTimeField): The timestamp for when the request was first handled.
+    """
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    schedule_id = models.BigIntegerField(null=True, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["scope", "key"], name="idempotency_scope_key_uniq")]
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the idempotency key.
+
+        Returns:
+            str: A string indicating the scope and the key.
+        """
+        return f"{self.scope} -- {self.key}"
+
+
+class ScheduleStat(models.Model):
+    """
+    Model counting the schedules of a day, channel and status.
+
+    The counters are kept up to date in the transaction of every write to the schedules (see
+    `api.services.stats`), so dashboards read this small table instead of counting the schedule
+    table. Schedules of archived partitions stay counted.
+
+    Attributes:
+        day (DateField): The UTC day of the scheduled datetime.
+        channel (ForeignKey): The channel of the schedules.
+        status (ForeignKey): The status of the schedules.
+        count (BigIntegerField): The number of schedules.
+    """
+    day = models.DateField()
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, db_index=False)
+    status = models.ForeignKey(Status, on_delete=models.CASCADE, db_index=False)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "channel", "status"], name="schedule_stat_day_channel_status_uniq")
+        ]
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the counter.
+
+        Returns:
+            str: A string indicating the day, the channel, the status and the count.
+        """
+        return f"{self.day} -- {self.channel_id} -- {self.status_id}: {self.count}"
+
+
+class DeadLetterReplay(models.Model):
+    """
+    Model recording a bulk replay of dead-lettered messages to their original exchanges.
+
+    Attributes:
+        queue (CharField): The dead-letter queue the messages were taken from.
+        replayed (PositiveIntegerField): The messages republished, confirmed by the broker and removed from the queue.
+        failed (PositiveIntegerField): The selected messages left in the queue because they could not be republished.
+        error (TextField): Why the replay stopped early, empty if it went through the whole selection.
+        created_at (DateTimeField): The timestamp for when the replay ran.
+    """
+    queue = models.CharField(max_length=255)
+    replayed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the replay.
+
+        Returns:
+            str: A string indicating the queue and the replayed and failed counts.
+        """
+        return f"{self.queue}: {self.replayed} replayed, {self.failed} failed"
@@ -0,0 +1,158 @@
+import base64
+import json
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ScheduleKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over `(scheduled_datetime, id)`.
+
+    Each page continues strictly after the last row of the previous page, so the cost of a page does
+    not depend on how deep into the table it is. The page is resolved in two steps: the ids are read
+    from the composite indexes of CommunicationSchedule (an index-only scan), and only the rows of the
+    page are then fetched by primary key.
+    """
+
+    cursor_query_param = "cursor"
+    # When set, the page is returned as `.values(*values_fields)` dicts instead of model instances.
+    values_fields = None
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request) -> int:
+        """
+        Returns the requested page size, capped by `SCHEDULE_MAX_PAGE_SIZE`.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            int: The number of rows in a page.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.SCHEDULE_PAGE_SIZE
+        if page_size <= 0:
+            return settings.SCHEDULE_PAGE_SIZE
+        return min(page_size, settings.SCHEDULE_MAX_PAGE_SIZE)
+
+    def decode_cursor(self, request):
+        """
+        Decodes the cursor sent by the client.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            tuple: The (scheduled_datetime, id) of the last row already seen, or None for the first page.
+
+        Raises:
+            NotFound: If the cursor is malformed.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            scheduled_datetime, pk = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            scheduled_datetime = parse_datetime(scheduled_datetime)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if scheduled_datetime is None:
+            raise NotFound(self.invalid_cursor_message)
+        return scheduled_datetime, pk
+
+    @staticmethod
+    def encode_cursor(scheduled_datetime, pk) -> str:
+        """
+        Encodes a position as an opaque cursor.
+
+        Args:
+            scheduled_datetime (datetime): The scheduled datetime of the last row of the page.
+            pk (int): The id of the last row of the page.
+
+        Returns:
+            str: The URL-safe cursor.
+        """
+        raw = json.dumps([scheduled_datetime.isoformat(), pk]).encode("ascii")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the rows of the requested page.
+
+        Args:
+            queryset (QuerySet): The filtered CommunicationSchedule queryset.
+            request: The HTTP request object.
+            view: The view requesting the page.
+
+        Returns:
+            list: The CommunicationSchedule instances of the page, or dicts if `values_fields` is set.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        keys = queryset.order_by("scheduled_datetime", "id")
+        if position is not None:
+            scheduled_datetime, pk = position
+            keys = keys.filter(
+                Q(scheduled_datetime__gte=scheduled_datetime)
+                & (Q(scheduled_datetime__gt=scheduled_datetime) | Q(id__gt=pk))
+            )
+        keys = list(keys.values_list("scheduled_datetime", "id")[:page_size + 1])
+
+        self.has_next = len(keys) > page_size
+        keys = keys[:page_size]
+        self.next_position = keys[-1] if self.has_next else None
+
+        rows = queryset.model._default_manager.filter(id__in=[pk for _, pk in keys])
+        if keys:
+            # Bounds the lookup by id to the datetimes of the page, so on PostgreSQL only the
+            # partitions of those months are searched.
+            rows = rows.filter(scheduled_datetime__range=(keys[0][0], keys[-1][0]))
+        rows = rows.order_by("scheduled_datetime", "id")
+        if self.values_fields is not None:
+            rows = rows.values(*self.values_fields)
+        return list(rows)
+
+    def get_next_link(self):
+        """
+        Builds the URL of the next page.
+
+        Returns:
+            str: The absolute URL of the next page, or None on the last page.
+        """
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
+
+    def get_paginated_response(self, data):
+        """
+        Wraps the serialized page with the link to the next one.
+
+        Args:
+            data (list): The serialized rows of the page.
+
+        Returns:
+            Response: JSON response with `next` and `results`.
+        """
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,42 @@
+import json
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one JSON document per line) into a list.
+
+    Blank lines are ignored, so payloads produced by streaming writers that end with a newline are accepted.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parses the incoming bytestream line by line.
+
+        Args:
+            stream: The request body stream.
+            media_type: The media type of the request.
+            parser_context: Context provided by the view.
+
+        Returns:
+            list: One parsed item per non-empty line.
+
+        Raises:
+            ParseError: If a line is not valid JSON.
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        items = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {number} - {exc}")
+        return items
@@ -1,18 +1,188 @@
+from django.conf import settings
+from django.utils.encoding import smart_str
 from rest_framework import serializers
-from api.models import CommunicationSchedule, Channel, Status
+from api.filters import CommunicationScheduleFilter
+from api.models import Campaign, CommunicationSchedule, Channel, DeadLetterReplay, Status
+from api.services import stats
+from api.services.campaigns import resolve_message
+from api.services.metrics import SERIALIZER_SECONDS
+from api.services.reference_data import channels, statuses
+from api.services.topology import EXCHANGE_TYPES, BindingSpec, ExchangeSpec, QueueSpec, Topology
+from api.services.transitions import ALLOWED_TRANSITIONS
 
-class CommunicationScheduleSerializer(serializers.ModelSerializer):
+
+class CachedSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField that resolves names through the in-process reference data cache
+    instead of querying the database for every value.
+
+    Attributes:
+        cache (ReferenceDataCache): The cache holding the related rows.
+    """
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        """
+        Resolves a name into the cached instance.
+
+        Args:
+            data (str): The name sent by the client.
+
+        Returns:
+            Model: The cached instance with that name.
+
+        Raises:
+            serializers.ValidationError: If no row has that name.
+        """
+        if not isinstance(data, str):
+            self.fail("invalid")
+        instance = self.cache.get(data)
+        if instance is None:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=smart_str(data))
+        return instance
+
+
+class CachedNameField(serializers.Field):
+    """
+    Read-only field rendering a foreign key id as the name of the referenced row, looked up in the
+    in-process reference data cache, so no join or extra query is needed.
+
+    Attributes:
+        cache (ReferenceDataCache): The cache holding the related rows.
+    """
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        """
+        Translates the id into the name of the cached row.
+
+        Args:
+            value (int): The foreign key id.
+
+        Returns:
+            str: The name of the row.
+        """
+        return self.cache.name_for(value)
+
+
+class ResolvedMessageField(serializers.Field):
+    """
+    Read-only field rendering the message a schedule sends: its own message, or the message of its
+    campaign rendered with its variables. Campaign messages come from the in-process campaign cache.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        """
+        Resolves the message of the schedule.
+
+        Args:
+            value (CommunicationSchedule): The schedule.
+
+        Returns:
+            str: The message.
+        """
+        return resolve_message(value.message, value.campaign_id, value.variables)
+
+
+class TimedSerializerMixin:
+    """
+    Records the time spent validating (`is_valid`) and rendering (`data`) a serializer in the
+    `serializer_duration_seconds` metric, labelled with the serializer class, or with the class of
+    the items for list serializers.
+    """
+
+    @property
+    def _metric_name(self):
+        return type(getattr(self, "child", self)).__name__
+
+    def is_valid(self, *args, **kwargs):
+        with SERIALIZER_SECONDS.time(serializer=self._metric_name, phase="validate"):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        with SERIALIZER_SECONDS.time(serializer=self._metric_name, phase="represent"):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    List serializer recording its validation and rendering time, see `TimedSerializerMixin`.
+    """
+
+
+class CommunicationScheduleListSerializer(TimedListSerializer):
+    """
+    List serializer used by the bulk endpoints. Each item is validated independently, so invalid
+    items are reported next to their index instead of failing the whole batch.
+
+    Attributes:
+        item_errors (list): One entry per input item; an empty dict for valid items.
+    """
+
+    def to_internal_value(self, data):
+        """
+        Validates the list, collecting the errors of each item in `item_errors`.
+
+        Args:
+            data (list): The raw items sent by the client.
+
+        Returns:
+            list: The validated data of each item, or None for invalid items.
+
+        Raises:
+            serializers.ValidationError: If the payload is not a list or has too many items.
+        """
+        self.item_errors = []
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        """
+        Validates a single item, recording its errors instead of raising them.
+
+        Args:
+            data (dict): The raw item.
+
+        Returns:
+            dict: The validated item, or None if it is invalid.
+        """
+        try:
+            validated = super().run_child_validation(data)
+        except serializers.ValidationError as exc:
+            self.item_errors.append(exc.detail)
+            return None
+        self.item_errors.append({})
+        return validated
+
+
+class CommunicationScheduleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the CommunicationSchedule model. This serializer is used to create and validate
     data for scheduling a communication message to a specific channel.
 
     Attributes:
-        channel (SlugRelatedField): Specifies the channel for sending the message by its name.
+        channel (CachedSlugRelatedField): Specifies the channel for sending the message by its name.
         exchange (CharField): The name of the exchange where the message will be sent.
         rout_key_name (CharField): Optional routing key name for message delivery. Defaults to an empty string.
+
+    The message is required here; only the schedules of a campaign, created through
+    `CampaignCreateSerializer`, leave it empty and render the campaign message instead.
     """
 
-    channel = serializers.SlugRelatedField(
+    channel = CachedSlugRelatedField(
+        cache=channels,
         queryset=Channel.objects.all(),
         slug_field="name",
         help_text="Name of the channel to which the message should be sent. Should be the channel name, e.g., 'email'."
@@ -32,19 +202,65 @@ class CommunicationScheduleSerializer(serializers.ModelSerializer):
             "channel",
             "exchange",
         ]
+        extra_kwargs = {"message": {"required": True, "allow_blank": False}}
+        list_serializer_class = CommunicationScheduleListSerializer
+
+# Formats datetimes exactly like the DateTimeField generated for `scheduled_datetime`.
+_datetime_field = serializers.DateTimeField()
+
 
-class ScheduleDetailSerializer(serializers.ModelSerializer):
+class ScheduleDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for detailed information of a scheduled communication. This serializer is read-only and
     includes the status and channel names.
 
+    The names are resolved from `status_id` and `channel_id` through the reference data cache, so
+    serializing any number of schedules costs no query beyond loading the schedules themselves.
+    The message of campaign schedules is rendered from the campaign only when serialized, at the
+    cost of one query per campaign not yet cached in the process.
+    For large reads, `from_values` builds the same output from `.values(*ScheduleDetailSerializer.values_fields)`
+    rows without model instances or per-field DRF overhead.
+
     Attributes:
-        status (CharField): The name of the communication status.
-        channel (CharField): The name of the channel used for sending the message.
+        message (ResolvedMessageField): The message sent to the recipient.
+        status (CachedNameField): The name of the communication status.
+        channel (CachedNameField): The name of the channel used for sending the message.
+        delivery_error (CharField): Why the last delivery failed, empty if it did not.
     """
 
-    status = serializers.CharField(source="status.name", read_only=True)
-    channel = serializers.CharField(source="channel.name", read_only=True)
+    message = ResolvedMessageField()
+    status = CachedNameField(statuses, source="status_id")
+    channel = CachedNameField(channels, source="channel_id")
+
+    values_fields = (
+        "id", "recipient", "message", "scheduled_datetime", "channel_id", "status_id", "campaign_id", "variables",
+        "delivery_error",
+    )
+
+    @classmethod
+    def from_values(cls, rows):
+        """
+        Serializes `.values(*values_fields)` rows like `ScheduleDetailSerializer(instances, many=True).data`.
+
+        Args:
+            rows (Iterable[dict]): The schedule rows.
+
+        Yields:
+            dict: One serialized schedule per row.
+        """
+        datetime_to_representation = _datetime_field.to_representation
+        channel_name = channels.name_for
+        status_name = statuses.name_for
+        for row in rows:
+            yield {
+                "id": row["id"],
+                "recipient": row["recipient"],
+                "message": resolve_message(row["message"], row["campaign_id"], row["variables"]),
+                "scheduled_datetime": datetime_to_representation(row["scheduled_datetime"]),
+                "channel": channel_name(row["channel_id"]),
+                "status": status_name(row["status_id"]),
+                "delivery_error": row["delivery_error"],
+            }
 
     class Meta:
         model = CommunicationSchedule
@@ -55,7 +271,9 @@ class ScheduleDetailSerializer(serializers.ModelSerializer):
             "scheduled_datetime",
             "channel",
             "status",
+            "delivery_error",
         ]
+        list_serializer_class = TimedListSerializer
 
 class ScheduleUpdateSerializer(serializers.ModelSerializer):
     """
@@ -97,28 +315,174 @@ class ScheduleUpdateSerializer(serializers.ModelSerializer):
         """
         if 'channel' in validated_data:
             channel_name = validated_data.pop('channel')['name']
-            try:
-                instance.channel = Channel.objects.get(name=channel_name)
-            except Channel.DoesNotExist:
+            channel = channels.get(channel_name)
+            if channel is None:
                 raise serializers.ValidationError(f"Channel with name '{channel_name}' not found.")
+            instance.channel = channel
             
         if 'status' in validated_data:
             status_name = validated_data.pop('status')['name']
-            try:
-                instance.status = Status.objects.get(name=status_name)
-            except Status.DoesNotExist:
+            schedule_status = statuses.get(status_name)
+            if schedule_status is None:
                 raise serializers.ValidationError(f"Status with name '{status_name}' not found.")
+            instance.status = schedule_status
         return super().update(instance, validated_data)
 
 
+class BulkSelectionSerializer(serializers.Serializer):
+    """
+    Selects the schedules of a bulk operation, either by id or by the filters of `get_schedules`.
+
+    Attributes:
+        ids (ListField): The ids of the schedules.
+        filter (DictField): Filters as accepted by `get_schedules`, e.g. {"channel": "sms"}.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=settings.SCHEDULE_BULK_UPDATE_MAX_IDS,
+    )
+    filter = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate_filter(self, value):
+        """
+        Checks that the filter is not empty and that every filter is known and valid.
+
+        Args:
+            value (dict): The filters sent by the client.
+
+        Returns:
+            dict: The same filters.
+
+        Raises:
+            serializers.ValidationError: If the filter is empty, unknown or invalid.
+        """
+        if not value:
+            raise serializers.ValidationError("At least one filter is required.")
+        unknown = sorted(set(value) - set(CommunicationScheduleFilter.base_filters))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filters: {', '.join(unknown)}.")
+        filterset = CommunicationScheduleFilter(value, queryset=CommunicationSchedule.objects.none())
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        return value
+
+    def validate(self, attrs):
+        """
+        Ensures exactly one of `ids` and `filter` is given.
+        """
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("Send either `ids` or `filter`.")
+        return attrs
+
+
+class BulkTransitionSerializer(BulkSelectionSerializer):
+    """
+    Selects schedules and the status they should move to.
+
+    Attributes:
+        status (ChoiceField): The name of the new status.
+    """
+
+    status = serializers.ChoiceField(choices=list(ALLOWED_TRANSITIONS))
+
+
+class CampaignRecipientSerializer(serializers.Serializer):
+    """
+    One recipient of a campaign.
+
+    Attributes:
+        recipient (CharField): The recipient's information.
+        variables (DictField): Values of the placeholders of the campaign message for this recipient.
+        scheduled_datetime (DateTimeField): When to send to this recipient, if not at the campaign datetime.
+    """
+
+    recipient = serializers.CharField(max_length=255)
+    variables = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False)
+    scheduled_datetime = serializers.DateTimeField(required=False)
+
+
+class CampaignRecipientsSerializer(serializers.Serializer):
+    """
+    Recipients to add to a campaign, with the delivery settings they share.
+
+    Attributes:
+        channel (CachedSlugRelatedField): The name of the channel, e.g. 'email'.
+        exchange (CharField): The name of the exchange where the messages will be sent.
+        rout_key_name (CharField): Optional routing key name for message delivery.
+        scheduled_datetime (DateTimeField): When to send to the recipients without a datetime of their own.
+        recipients (ListField): The recipients.
+    """
+
+    channel = CachedSlugRelatedField(
+        cache=channels,
+        queryset=Channel.objects.all(),
+        slug_field="name",
+        help_text="Name of the channel to which the messages should be sent, e.g., 'email'."
+    )
+    exchange = serializers.CharField(help_text="The name of the exchange for sending the messages.")
+    rout_key_name = serializers.CharField(required=False, allow_blank=True, default="")
+    scheduled_datetime = serializers.DateTimeField()
+    recipients = serializers.ListField(
+        child=CampaignRecipientSerializer(),
+        allow_empty=False,
+        max_length=settings.CAMPAIGN_MAX_RECIPIENTS,
+    )
+
+
+class CampaignCreateSerializer(CampaignRecipientsSerializer):
+    """
+    A new campaign with its first recipients.
+
+    Attributes:
+        name (CharField): A name identifying the campaign.
+        message (CharField): The message template, with `$name` placeholders filled from the variables of each recipient.
+    """
+
+    name = serializers.CharField(max_length=255)
+    message = serializers.CharField()
+
+
+class CampaignSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Campaign model, with the number of schedules created for it.
+
+    Attributes:
+        recipients (IntegerField): The number of schedules of the campaign.
+    """
+
+    recipients = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Campaign
+        fields = ["id", "name", "message", "created_at", "recipients"]
+
+
 class ChannelSerializer(serializers.ModelSerializer):
     """
-    Serializer for the Channel model, which includes basic details such as ID, name, and description.
+    Serializer for the Channel model, which includes basic details such as ID, name, and description,
+    and its rate limit.
     """
 
     class Meta:
         model = Channel
-        fields = ["id", "name", "description"]
+        fields = ["id", "name", "description", "rate_limit", "burst"]
+
+
+class ChannelRateLimitSerializer(serializers.ModelSerializer):
+    """
+    Serializer updating the token bucket limit of a channel.
+
+    Attributes:
+        rate_limit (FloatField): Messages per second, or null to remove the limit.
+        burst (IntegerField): Messages that may be sent back to back once the channel was idle.
+    """
+
+    class Meta:
+        model = Channel
+        fields = ["rate_limit", "burst"]
 
 
 class StatusSerializer(serializers.ModelSerializer):
@@ -129,3 +493,245 @@ class StatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = Status
         fields = ["id", "name", "description"]
+
+
+class ScheduleStatsQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the schedule stats.
+
+    Attributes:
+        day_from (DateField): The first (UTC) day counted, inclusive.
+        day_to (DateField): The last (UTC) day counted, inclusive.
+        channel (CachedSlugRelatedField): Only count this channel.
+        status (CachedSlugRelatedField): Only count this status.
+        group_by (CharField): Comma-separated fields among "day", "channel" and "status"; empty for one total.
+    """
+
+    day_from = serializers.DateField(required=False)
+    day_to = serializers.DateField(required=False)
+    channel = CachedSlugRelatedField(cache=channels, queryset=Channel.objects.all(), slug_field="name", required=False)
+    status = CachedSlugRelatedField(cache=statuses, queryset=Status.objects.all(), slug_field="name", required=False)
+    group_by = serializers.CharField(
+        required=False, allow_blank=True, default=",".join(stats.GROUP_BY_FIELDS)
+    )
+
+    def validate_group_by(self, value):
+        """
+        Splits the grouped fields, dropping duplicates.
+
+        Args:
+            value (str): The comma-separated fields.
+
+        Returns:
+            list: The fields, in the order given.
+
+        Raises:
+            serializers.ValidationError: If a field is unknown.
+        """
+        fields = list(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+        unknown = [field for field in fields if field not in stats.GROUP_BY_FIELDS]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}.")
+        return fields
+
+    def validate(self, attrs):
+        """
+        Ensures the day range is not reversed.
+        """
+        if "day_from" in attrs and "day_to" in attrs and attrs["day_from"] > attrs["day_to"]:
+            raise serializers.ValidationError("`day_from` must not be after `day_to`.")
+        return attrs
+
+
+class ScheduleStatSerializer(serializers.Serializer):
+    """
+    One group of the schedule stats; the fields that were not grouped by are left out.
+
+    Attributes:
+        day (DateField): The UTC day of the scheduled datetimes.
+        channel (CachedNameField): The name of the channel.
+        status (CachedNameField): The name of the status.
+        count (IntegerField): The number of schedules.
+    """
+
+    day = serializers.DateField(read_only=True)
+    channel = CachedNameField(channels, source="channel_id")
+    status = CachedNameField(statuses, source="status_id")
+    count = serializers.IntegerField(read_only=True)
+
+
+class ExchangeSpecSerializer(serializers.Serializer):
+    """
+    An exchange of a topology spec.
+
+    Attributes:
+        name (CharField): The name of the exchange.
+        type (ChoiceField): "direct", "fanout", "topic" or "headers".
+        durable (BooleanField): Whether the exchange survives a broker restart.
+        auto_delete (BooleanField): Whether the exchange is deleted when its last binding is removed.
+        internal (BooleanField): Whether clients are prevented from publishing to the exchange directly.
+        arguments (DictField): Optional arguments, e.g. {"alternate-exchange": "unrouted"}.
+    """
+
+    name = serializers.CharField(max_length=255)
+    type = serializers.ChoiceField(choices=EXCHANGE_TYPES, default="direct")
+    durable = serializers.BooleanField(default=True)
+    auto_delete = serializers.BooleanField(default=False)
+    internal = serializers.BooleanField(default=False)
+    arguments = serializers.DictField(default=dict)
+
+
+class QueueSpecSerializer(serializers.Serializer):
+    """
+    A queue of a topology spec.
+
+    Attributes:
+        name (CharField): The name of the queue.
+        durable (BooleanField): Whether the queue survives a broker restart.
+        auto_delete (BooleanField): Whether the queue is deleted when its last consumer unsubscribes.
+        arguments (DictField): Optional arguments, e.g. {"x-message-ttl": 60000}.
+    """
+
+    name = serializers.CharField(max_length=255)
+    durable = serializers.BooleanField(default=True)
+    auto_delete = serializers.BooleanField(default=False)
+    arguments = serializers.DictField(default=dict)
+
+
+class BindingSpecSerializer(serializers.Serializer):
+    """
+    A binding of a topology spec.
+
+    Attributes:
+        exchange (CharField): The name of the exchange.
+        queue (CharField): The name of the queue.
+        routing_key (CharField): The binding key, empty by default.
+        arguments (DictField): Optional arguments, e.g. for headers exchanges.
+    """
+
+    exchange = serializers.CharField(max_length=255)
+    queue = serializers.CharField(max_length=255)
+    routing_key = serializers.CharField(max_length=255, allow_blank=True, default="")
+    arguments = serializers.DictField(default=dict)
+
+
+class DelayTiersSerializer(serializers.Serializer):
+    """
+    The delay tiers to provision for an exchange.
+
+    Attributes:
+        exchange_name (CharField): The exchange the messages of the tiers are headed to.
+        delays (ListField): The tier delays in seconds, `SCHEDULE_DELAY_TIERS` by default.
+    """
+
+    exchange_name = serializers.CharField(max_length=255)
+    delays = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, required=False)
+
+
+class TopologySerializer(serializers.Serializer):
+    """
+    A full RabbitMQ topology: exchanges, queues and the bindings between them.
+
+    Attributes:
+        exchanges (ListField): The exchanges.
+        queues (ListField): The queues.
+        bindings (ListField): The bindings.
+    """
+
+    exchanges = ExchangeSpecSerializer(many=True, required=False, default=list)
+    queues = QueueSpecSerializer(many=True, required=False, default=list)
+    bindings = BindingSpecSerializer(many=True, required=False, default=list)
+
+    def to_topology(self) -> Topology:
+        """
+        Builds the validated spec.
+
+        Returns:
+            Topology: The spec, ready for `api.services.topology.apply`.
+        """
+        data = self.validated_data
+        return Topology(
+            exchanges=[ExchangeSpec(**exchange) for exchange in data["exchanges"]],
+            queues=[QueueSpec(**queue) for queue in data["queues"]],
+            bindings=[BindingSpec(**binding) for binding in data["bindings"]],
+        )
+
+
+class DeadLetterPageSerializer(serializers.Serializer):
+    """
+    Query parameters of a page of dead-lettered messages.
+
+    Attributes:
+        queue_name (CharField): The dead-letter queue.
+        page (IntegerField): The page, from 1.
+        page_size (IntegerField): The messages per page, `DEAD_LETTER_PAGE_SIZE` by default.
+    """
+
+    queue_name = serializers.CharField(max_length=255)
+    page = serializers.IntegerField(min_value=1, default=1)
+    page_size = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        """
+        Fills in the default page size and checks that the page is within the peekable head of the queue.
+
+        Args:
+            attrs (dict): The validated parameters.
+
+        Returns:
+            dict: The parameters, with `page_size`.
+
+        Raises:
+            serializers.ValidationError: If the page ends beyond `DEAD_LETTER_PEEK_MAX` messages.
+        """
+        attrs.setdefault("page_size", settings.DEAD_LETTER_PAGE_SIZE)
+        if attrs["page"] * attrs["page_size"] > settings.DEAD_LETTER_PEEK_MAX:
+            raise serializers.ValidationError(
+                f"Only the first {settings.DEAD_LETTER_PEEK_MAX} messages of a queue can be peeked."
+            )
+        return attrs
+
+
+class DeadLetterReplayRequestSerializer(serializers.Serializer):
+    """
+    The dead-lettered messages to replay.
+
+    Attributes:
+        queue_name (CharField): The dead-letter queue.
+        fingerprints (ListField): The fingerprints of the messages to replay, as listed by the peek endpoint.
+        all (BooleanField): Replay every message of the queue instead.
+        limit (IntegerField): The maximum number of messages considered, `DEAD_LETTER_REPLAY_LIMIT` by default.
+    """
+
+    queue_name = serializers.CharField(max_length=255)
+    fingerprints = serializers.ListField(child=serializers.CharField(max_length=40), required=False, allow_empty=False)
+    all = serializers.BooleanField(default=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        """
+        Checks that exactly one of `fingerprints` and `all` selects the messages.
+
+        Args:
+            attrs (dict): The validated parameters.
+
+        Returns:
+            dict: The parameters.
+
+        Raises:
+            serializers.ValidationError: If both or none of them are given.
+        """
+        if attrs["all"] == ("fingerprints" in attrs):
+            raise serializers.ValidationError("Give either the fingerprints of the messages or all=true.")
+        return attrs
+
+
+class DeadLetterReplaySerializer(serializers.ModelSerializer):
+    """
+    Serializer for the DeadLetterReplay model, read-only.
+    """
+
+    class Meta:
+        model = DeadLetterReplay
+        fields = ["id", "queue", "replayed", "failed", "error", "created_at"]
+        read_only_fields = fields
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+from pika.exceptions import AMQPConnectionError, AMQPError, ChannelClosedByBroker
+
+from api.services.connection_pool import build_connection_parameters
+from api.services.metrics import RABBITMQ_CONNECTIONS_OPENED
+from core.settings import RABBIT_MQ_CONFIRM_WINDOW, RABBIT_MQ_POOL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRabbitmqPublisher:
+    """
+    Non-blocking publisher built on pika's asyncio adapter.
+
+    Each event loop owns one publisher (see `get_async_publisher`), which keeps a single connection
+    open and shares it between every coroutine running on that loop. Plain publishes only buffer the
+    frames on the socket; confirmed publishes go through a second channel in confirm mode, where up
+    to `confirm_window` messages are in flight at once and each ack or nack is matched back to its
+    message by delivery tag.
+    """
+
+    # Reply codes of a channel closed by a publish to an exchange that is missing or not allowed.
+    REFUSING_REPLY_CODES = (403, 404)
+
+    def __init__(
+        self,
+        parameters: pika.ConnectionParameters,
+        loop: asyncio.AbstractEventLoop,
+        confirm_window: int = 1000,
+        open_timeout: float = 5.0,
+    ) -> None:
+        """
+        :param parameters: The connection parameters used to reach the broker.
+        :type parameters: pika.ConnectionParameters
+        :param loop: The event loop the connection is bound to.
+        :type loop: asyncio.AbstractEventLoop
+        :param confirm_window: Maximum number of unconfirmed messages in flight.
+        :type confirm_window: int
+        :param open_timeout: Seconds to wait for the broker to open a channel.
+        :type open_timeout: float
+        """
+        self.parameters = parameters
+        self.loop = loop
+        self.open_timeout = open_timeout
+        self._connection = None
+        self._channel = None
+        self._confirm_channel = None
+        self._lock = asyncio.Lock()
+        self._window = asyncio.Semaphore(confirm_window)
+        self._delivery_tag = 0
+        self._unconfirmed: Dict[int, asyncio.Future] = {}
+        self._returned = set()
+        self._confirm_close_reason = None
+
+    async def _open_connection(self):
+        opened = self.loop.create_future()
+
+        def on_connection_open(connection):
+            if not opened.done():
+                opened.set_result(connection)
+
+        def on_connection_open_error(connection, error):
+            if not opened.done():
+                opened.set_exception(AMQPConnectionError(error))
+
+        def on_connection_closed(connection, reason):
+            logger.warning("Async RabbitMQ connection closed: %s", reason)
+            self._connection = None
+            self._channel = None
+            self._confirm_channel = None
+            self._fail_unconfirmed()
+            if not opened.done():
+                opened.set_exception(AMQPConnectionError(reason))
+
+        AsyncioConnection(
+            parameters=self.parameters,
+            on_open_callback=on_connection_open,
+            on_open_error_callback=on_connection_open_error,
+            on_close_callback=on_connection_closed,
+            custom_ioloop=self.loop,
+        )
+        self._connection = await opened
+        RABBITMQ_CONNECTIONS_OPENED.inc(kind="asyncio")
+        return self._connection
+
+    async def _open_channel(self):
+        if self._connection is None or not self._connection.is_open:
+            await self._open_connection()
+        opened = self.loop.create_future()
+        self._connection.channel(on_open_callback=opened.set_result)
+        return await asyncio.wait_for(opened, self.open_timeout)
+
+    async def channel(self):
+        """
+        Returns the shared channel, connecting on first use and after the connection was lost.
+
+        :return: An open channel.
+        :rtype: pika.channel.Channel
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        """
+        if self._channel is not None and self._channel.is_open:
+            return self._channel
+        async with self._lock:
+            if self._channel is None or not self._channel.is_open:
+                self._channel = await self._open_channel()
+            return self._channel
+
+    async def confirm_channel(self):
+        """
+        Returns the shared channel in publisher confirm mode, opening it if needed.
+
+        :return: An open channel in confirm mode.
+        :rtype: pika.channel.Channel
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        """
+        if self._confirm_channel is not None and self._confirm_channel.is_open:
+            return self._confirm_channel
+        async with self._lock:
+            if self._confirm_channel is None or not self._confirm_channel.is_open:
+                channel = await self._open_channel()
+                selected = self.loop.create_future()
+                channel.confirm_delivery(self._on_confirmation, callback=selected.set_result)
+                await asyncio.wait_for(selected, self.open_timeout)
+                channel.add_on_return_callback(self._on_return)
+                channel.add_on_close_callback(self._on_confirm_channel_closed)
+                self._fail_unconfirmed()
+                self._delivery_tag = 0
+                self._confirm_close_reason = None
+                self._confirm_channel = channel
+            return self._confirm_channel
+
+    def _on_confirmation(self, method_frame) -> None:
+        method = method_frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            future = self._unconfirmed.pop(tag, None)
+            routed = str(tag) not in self._returned
+            self._returned.discard(str(tag))
+            if future is not None and not future.done():
+                future.set_result(acked and routed)
+
+    def _on_return(self, channel, method, properties, body) -> None:
+        # The broker sends basic.return before the ack of an unroutable mandatory message.
+        self._returned.add(properties.message_id)
+
+    def _on_confirm_channel_closed(self, channel, reason) -> None:
+        self._confirm_close_reason = reason
+        self._fail_unconfirmed()
+
+    def _fail_unconfirmed(self) -> None:
+        # Messages in flight when the channel or the connection closes may or may not have reached a queue.
+        unconfirmed, self._unconfirmed = self._unconfirmed, {}
+        self._returned.clear()
+        for future in unconfirmed.values():
+            if not future.done():
+                future.set_result(None)
+
+    def _refused(self, channel, exchange_name: str) -> bool:
+        # Whether the broker closed the channel because of a publish to this exchange.
+        reason = self._confirm_close_reason
+        return (
+            not channel.is_open
+            and isinstance(reason, ChannelClosedByBroker)
+            and reason.reply_code in self.REFUSING_REPLY_CODES
+            and f"'{exchange_name}'" in reason.reply_text
+        )
+
+    async def publish(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
+        """
+        Sends a message to an exchange with a specific routing key without blocking the event loop.
+
+        :param exchange_name: The name of the exchange where the message will be sent.
+        :type exchange_name: str
+        :param rout_key_name: The routing key used to route the message.
+        :type rout_key_name: str
+        :param body: The message body to be sent, which will be serialized to JSON.
+        :type body: Dict
+        :raises pika.exceptions.AMQPError: If the message cannot be published.
+        """
+        channel = await self.channel()
+        channel.basic_publish(
+            exchange=exchange_name,
+            routing_key=rout_key_name,
+            body=json.dumps(body),
+            properties=pika.BasicProperties(delivery_mode=2),
+        )
+
+    async def publish_confirmed(
+        self,
+        messages: Iterable[Tuple],
+        mandatory: bool = False,
+        timeout: Optional[float] = None,
+    ) -> List[Optional[bool]]:
+        """
+        Publishes messages in confirm mode, keeping many of them in flight instead of waiting for each ack.
+
+        Messages are published one exchange at a time, in order within each exchange, and the confirms
+        of an exchange are awaited before the next one: a publish to a missing exchange makes the
+        broker close the channel, so only the messages of that exchange are refused and the others go
+        through a reopened channel.
+
+        :param messages: Tuples of (exchange name, routing key, body), optionally followed by the
+            message headers, to be published in order.
+        :type messages: Iterable[Tuple]
+        :param mandatory: Treat messages the broker cannot route to any queue as refused.
+        :type mandatory: bool
+        :param timeout: Seconds to wait for all the confirms; unconfirmed messages are reported as unknown.
+        :type timeout: Optional[float]
+        :return: For each message, True if the broker confirmed it, False if it refused it (nack,
+            unroutable with `mandatory`, or missing exchange), None if the connection was lost or the
+            confirm did not arrive in time.
+        :rtype: List[Optional[bool]]
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        """
+        messages = list(messages)
+        results: List[Optional[bool]] = [None] * len(messages)
+        groups: Dict[str, List[int]] = {}
+        for index, message in enumerate(messages):
+            groups.setdefault(message[0], []).append(index)
+        deadline = None if timeout is None else self.loop.time() + timeout
+        for position, (exchange_name, indexes) in enumerate(groups.items()):
+            if deadline is not None and self.loop.time() >= deadline:
+                break
+            try:
+                channel = await self.confirm_channel()
+            except AMQPConnectionError:
+                if not position:
+                    raise
+                break
+            futures = [await self._publish_confirmed(channel, messages[index], mandatory) for index in indexes]
+            await asyncio.wait(futures, timeout=None if deadline is None else deadline - self.loop.time())
+            pending = {id(future) for future in futures if not future.done()}
+            if pending:
+                logger.warning("%s messages were not confirmed in time.", len(pending))
+                for tag, future in list(self._unconfirmed.items()):
+                    if id(future) in pending:
+                        del self._unconfirmed[tag]
+                        future.set_result(None)
+            refused = self._refused(channel, exchange_name)
+            for index, future in zip(indexes, futures):
+                results[index] = False if refused and future.result() is None else future.result()
+        return results
+
+    async def _publish_confirmed(self, channel, message: Tuple, mandatory: bool) -> asyncio.Future:
+        exchange_name, rout_key_name, body, *headers = message
+        future = self.loop.create_future()
+        if not channel.is_open:
+            future.set_result(None)
+            return future
+        await self._window.acquire()
+        future.add_done_callback(lambda _: self._window.release())
+        self._delivery_tag += 1
+        self._unconfirmed[self._delivery_tag] = future
+        try:
+            channel.basic_publish(
+                exchange=exchange_name,
+                routing_key=rout_key_name,
+                body=json.dumps(body),
+                properties=pika.BasicProperties(
+                    delivery_mode=2, message_id=str(self._delivery_tag), headers=headers[0] if headers else None
+                ),
+                mandatory=mandatory,
+            )
+        except AMQPError:
+            self._unconfirmed.pop(self._delivery_tag, None)
+            future.set_result(None)
+        return future
+
+    async def close(self) -> None:
+        """
+        Closes the connection of this publisher.
+        """
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+        self._connection = None
+        self._channel = None
+        self._confirm_channel = None
+
+
+_publishers = weakref.WeakKeyDictionary()
+
+
+def get_async_publisher() -> AsyncRabbitmqPublisher:
+    """
+    Returns the publisher of the running event loop, creating it on first use.
+
+    :rtype: AsyncRabbitmqPublisher
+    """
+    loop = asyncio.get_running_loop()
+    publisher = _publishers.get(loop)
+    if publisher is None:
+        publisher = AsyncRabbitmqPublisher(
+            build_connection_parameters(),
+            loop,
+            confirm_window=RABBIT_MQ_CONFIRM_WINDOW,
+            open_timeout=RABBIT_MQ_POOL_TIMEOUT,
+        )
+        _publishers[loop] = publisher
+    return publisher
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_pid: Optional[int] = None
+_background_lock = threading.Lock()
+
+
+def run_in_background_loop(coroutine, timeout: Optional[float] = None):
+    """
+    Runs a coroutine on the process-wide background event loop and waits for its result.
+
+    Synchronous code (views, management commands) uses it to share one asyncio AMQP connection
+    per process. The loop runs in a daemon thread and is recreated after a fork.
+
+    :param coroutine: The coroutine to run.
+    :param timeout: Seconds to wait for the result.
+    :type timeout: Optional[float]
+    :return: The result of the coroutine.
+    """
+    global _background_loop, _background_pid
+    pid = os.getpid()
+    if _background_loop is None or _background_pid != pid:
+        with _background_lock:
+            if _background_loop is None or _background_pid != pid:
+                _background_loop = asyncio.new_event_loop()
+                _background_pid = pid
+                threading.Thread(
+                    target=_background_loop.run_forever, name="rabbitmq-async-loop", daemon=True
+                ).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop).result(timeout)
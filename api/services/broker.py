@@ -0,0 +1,269 @@
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from api.services.management import ManagementResponse
+
+
+class Delivery(NamedTuple):
+    """
+    A message received from a queue, to be settled with `QueueConsumer.settle`.
+
+    Attributes:
+        tag (int): The delivery tag, unique and increasing within the consumer.
+        body (bytes): The raw message body.
+        redelivered (bool): Whether the broker delivered the message before.
+        headers (Dict): The message headers.
+    """
+
+    tag: int
+    body: bytes
+    redelivered: bool = False
+    headers: Dict = {}
+
+
+class QueueConsumer:
+    """
+    A consumer of one queue, holding at most `prefetch_count` unsettled messages. See `BrokerBackend.open_consumer`.
+
+    Messages still unsettled when the consumer closes or its connection is lost go back to the queue.
+    """
+
+    def fetch(self, max_count: int, timeout: float) -> List[Delivery]:
+        """
+        Waits for messages until `max_count` of them arrived or `timeout` elapsed.
+
+        :param max_count: The maximum number of messages returned.
+        :type max_count: int
+        :param timeout: Seconds to wait for the messages.
+        :type timeout: float
+        :return: The messages received, possibly none, in delivery order.
+        :rtype: List[Delivery]
+        :raises pika.exceptions.AMQPError: If the connection or the channel is lost.
+        """
+        raise NotImplementedError
+
+    def settle(self, acked: List[int], rejected: List[int]) -> None:
+        """
+        Acknowledges and rejects fetched messages, with as few frames as possible.
+
+        Rejected messages are not requeued: the broker dead-letters them if the queue has a
+        dead-letter exchange, and drops them otherwise.
+
+        :param acked: The tags of the messages processed.
+        :type acked: List[int]
+        :param rejected: The tags of the messages that cannot be processed.
+        :type rejected: List[int]
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Stops consuming; unsettled messages are requeued.
+        """
+        raise NotImplementedError
+
+
+class BrokerBackend:
+    """
+    Interface of the message broker used by the API, the outbox relay and the dispatcher.
+
+    The backend in use is chosen by the `BROKER_BACKEND` setting and obtained with `get_broker()`.
+    Backends raise `pika.exceptions.AMQPError` subclasses for broker errors, so callers handle every
+    backend the same way.
+    """
+
+    def create_exchange(self, exchange_name: str) -> None:
+        """
+        Creates a durable direct exchange.
+
+        :param exchange_name: The name of the exchange to be created.
+        :type exchange_name: str
+        """
+        raise NotImplementedError
+
+    def create_queue(self, queue_name: str) -> None:
+        """
+        Creates a durable queue.
+
+        :param queue_name: The name of the queue to be created.
+        :type queue_name: str
+        """
+        raise NotImplementedError
+
+    def queue_bind(self, exchange_name: str, queue_name: str, rout_key_name: str) -> None:
+        """
+        Binds a queue to an exchange with a routing key.
+
+        :param exchange_name: The name of the exchange to bind the queue to.
+        :type exchange_name: str
+        :param queue_name: The name of the queue to be bound.
+        :type queue_name: str
+        :param rout_key_name: The routing key used to bind the queue.
+        :type rout_key_name: str
+        """
+        raise NotImplementedError
+
+    def declare_topology(self, declarations: List) -> List[Optional[str]]:
+        """
+        Declares exchanges, queues and bindings in order, over a single channel.
+
+        A declaration refused by the broker does not stop the following ones.
+
+        :param declarations: `ExchangeSpec`, `QueueSpec` and `BindingSpec` instances, see `api.services.topology`.
+        :type declarations: List
+        :return: For each declaration, None if it succeeded, otherwise the error of the broker.
+        :rtype: List[Optional[str]]
+        :raises pika.exceptions.AMQPConnectionError: If the broker cannot be reached.
+        """
+        raise NotImplementedError
+
+    def send_message(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
+        """
+        Sends a message to an exchange with a specific routing key.
+
+        :param exchange_name: The name of the exchange where the message will be sent.
+        :type exchange_name: str
+        :param rout_key_name: The routing key used to route the message.
+        :type rout_key_name: str
+        :param body: The message body to be sent, which will be serialized to JSON.
+        :type body: Dict
+        """
+        raise NotImplementedError
+
+    def send_messages(self, messages: Iterable[Tuple[str, str, Dict]]) -> int:
+        """
+        Sends several messages.
+
+        :param messages: Tuples of (exchange name, routing key, body) to be published in order.
+        :type messages: Iterable[Tuple[str, str, Dict]]
+        :return: The number of messages published.
+        :rtype: int
+        """
+        count = 0
+        for exchange_name, rout_key_name, body in messages:
+            self.send_message(exchange_name, rout_key_name, body)
+            count += 1
+        return count
+
+    def send_messages_confirmed(
+        self, messages: Iterable[Tuple], mandatory: bool = False
+    ) -> List[Optional[bool]]:
+        """
+        Sends several messages and reports which ones the broker accepted.
+
+        A message refused by the broker, e.g. sent to a missing exchange, does not affect the others.
+
+        :param messages: Tuples of (exchange name, routing key, body), optionally followed by the
+            message headers, to be published in order.
+        :type messages: Iterable[Tuple]
+        :param mandatory: Treat messages the broker cannot route to any queue as refused.
+        :type mandatory: bool
+        :return: For each message, True if the broker confirmed it, False if it refused it (nack,
+            unroutable with `mandatory`, or missing exchange), None if its fate is unknown, e.g. the
+            connection was lost or the confirm did not arrive in time; publishing it again may succeed.
+        :rtype: List[Optional[bool]]
+        """
+        raise NotImplementedError
+
+    async def apublish(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
+        """
+        Sends a message from async code. By default `send_message` runs in a worker thread.
+
+        :param exchange_name: The name of the exchange where the message will be sent.
+        :type exchange_name: str
+        :param rout_key_name: The routing key used to route the message.
+        :type rout_key_name: str
+        :param body: The message body to be sent, which will be serialized to JSON.
+        :type body: Dict
+        """
+        await sync_to_async(self.send_message)(exchange_name, rout_key_name, body)
+
+    def open_consumer(self, queue_name: str, prefetch_count: int) -> QueueConsumer:
+        """
+        Starts consuming a queue on a connection of its own, outside the publishing pool.
+
+        :param queue_name: The queue to consume.
+        :type queue_name: str
+        :param prefetch_count: The maximum number of unsettled messages the broker sends (`basic_qos`).
+        :type prefetch_count: int
+        :rtype: QueueConsumer
+        :raises pika.exceptions.AMQPError: If the broker cannot be reached or the queue does not exist.
+        """
+        raise NotImplementedError
+
+    def peek_messages(self, queue_name: str, count: int) -> List[Dict]:
+        """
+        Returns messages from the head of a queue without consuming them.
+
+        Each message is shaped like the messages of the management API `queues/<vhost>/<name>/get`
+        endpoint: `payload`, `payload_encoding`, `exchange`, `routing_key`, `redelivered`,
+        `message_count` and `properties` (with the `headers`, e.g. `x-death`).
+
+        :param queue_name: The queue to read.
+        :type queue_name: str
+        :param count: The maximum number of messages.
+        :type count: int
+        :rtype: List[Dict]
+        :raises ManagementApiError: If the messages cannot be retrieved, e.g. the queue does not exist.
+        """
+        raise NotImplementedError
+
+    def management_get(self, path: str) -> ManagementResponse:
+        """
+        Retrieves a resource shaped like the RabbitMQ management API, e.g. "queues".
+
+        :param path: The path below `/api`.
+        :type path: str
+        :rtype: ManagementResponse
+        :raises ManagementApiError: If the resource cannot be retrieved.
+        """
+        raise NotImplementedError
+
+    def list_exchanges(self) -> list:
+        """
+        Retrieves the list of exchanges.
+
+        :rtype: list
+        :raises ManagementApiError: If the request to retrieve exchanges fails.
+        """
+        return self.management_get("exchanges").data
+
+    def list_queues(self) -> list:
+        """
+        Retrieves the list of queues.
+
+        :rtype: list
+        :raises ManagementApiError: If the request to retrieve queues fails.
+        """
+        return self.management_get("queues").data
+
+
+_broker: Optional[BrokerBackend] = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> BrokerBackend:
+    """
+    Returns the broker backend configured by `BROKER_BACKEND`, creating it on first use.
+
+    :rtype: BrokerBackend
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.BROKER_BACKEND)()
+    return _broker
+
+
+def reset_broker() -> None:
+    """
+    Forgets the current backend, so the next `get_broker()` builds it again from the settings.
+    """
+    global _broker
+    with _broker_lock:
+        _broker = None
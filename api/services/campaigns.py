@@ -0,0 +1,168 @@
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from api.models import Campaign, CommunicationSchedule, render_message
+from api.services import outbox, stats
+from api.services.reference_data import statuses
+
+
+class CampaignMessageCache:
+    """
+    In-process LRU cache of campaign messages keyed by campaign id.
+
+    Schedules of a campaign only store the campaign id, so rendering their message needs the campaign
+    message: it is loaded once per campaign and process instead of once per schedule. Saves and
+    deletes of a campaign invalidate its entry in the current process (see `api.signals`).
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        """
+        :param max_entries: The number of campaign messages kept in memory.
+        :type max_entries: int
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._messages: "OrderedDict[int, str]" = OrderedDict()
+
+    def get(self, pk: int) -> Optional[str]:
+        """
+        Returns the message of a campaign, loading it on a miss.
+
+        :param pk: The primary key of the campaign.
+        :type pk: int
+        :return: The message template, or None if the campaign does not exist.
+        :rtype: Optional[str]
+        """
+        with self._lock:
+            message = self._messages.get(pk)
+            if message is not None:
+                self._messages.move_to_end(pk)
+                return message
+        message = Campaign.objects.filter(pk=pk).values_list("message", flat=True).first()
+        if message is not None:
+            self._store(pk, message)
+        return message
+
+    def _store(self, pk: int, message: str) -> None:
+        with self._lock:
+            self._messages[pk] = message
+            self._messages.move_to_end(pk)
+            while len(self._messages) > self.max_entries:
+                self._messages.popitem(last=False)
+
+    def invalidate(self, pk: Optional[int] = None) -> None:
+        """
+        Drops the message of one campaign, or of every campaign.
+
+        :param pk: The primary key of the campaign, or None for all of them.
+        :type pk: Optional[int]
+        """
+        with self._lock:
+            if pk is None:
+                self._messages.clear()
+            else:
+                self._messages.pop(pk, None)
+
+
+campaign_messages = CampaignMessageCache(settings.CAMPAIGN_MESSAGE_CACHE_SIZE)
+
+
+def resolve_message(message: str, campaign_id: Optional[int], variables: Optional[Dict]) -> str:
+    """
+    Returns the message a schedule sends.
+
+    A schedule without a campaign, or with a message of its own (set by an update), sends its own
+    message; the others send the campaign message rendered with their variables.
+
+    :param message: The message column of the schedule.
+    :type message: str
+    :param campaign_id: The campaign of the schedule, if any.
+    :type campaign_id: Optional[int]
+    :param variables: The variables of the schedule.
+    :type variables: Optional[Dict]
+    :rtype: str
+    """
+    if campaign_id is None or message:
+        return message
+    template = campaign_messages.get(campaign_id)
+    return render_message(template, variables) if template is not None else message
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def add_recipients(campaign: Campaign, recipients: Iterable[Dict], defaults: Dict, batch_size: int) -> int:
+    """
+    Creates one schedule per recipient of a campaign with batched inserts, in a single transaction.
+
+    The schedules store no message of their own, only the campaign and their variables. In
+    "immediate" dispatch mode their outbox messages are written in the same transaction.
+
+    :param campaign: The campaign the schedules belong to.
+    :type campaign: Campaign
+    :param recipients: Dicts with the `recipient` and, optionally, its `variables` and `scheduled_datetime`.
+    :type recipients: Iterable[Dict]
+    :param defaults: The `channel`, `exchange`, `rout_key_name` and `scheduled_datetime` shared by the recipients.
+    :type defaults: Dict
+    :param batch_size: Rows per INSERT statement.
+    :type batch_size: int
+    :return: The number of schedules created.
+    :rtype: int
+    """
+    scheduled = statuses.get("scheduled")
+    exchange = defaults["exchange"]
+    routing_key = defaults.get("rout_key_name", "")
+    created = 0
+    with transaction.atomic():
+        for batch in _batches(recipients, batch_size):
+            schedules = CommunicationSchedule.objects.bulk_create(
+                CommunicationSchedule(
+                    recipient=item["recipient"],
+                    scheduled_datetime=item.get("scheduled_datetime") or defaults["scheduled_datetime"],
+                    channel=defaults["channel"],
+                    status=scheduled,
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    campaign=campaign,
+                    variables=item.get("variables") or None,
+                )
+                for item in batch
+            )
+            stats.record_created(schedules)
+            outbox.enqueue_schedules(schedules)
+            created += len(schedules)
+    return created
+
+
+def create_campaign(name: str, message: str, recipients: Iterable[Dict], defaults: Dict, batch_size: int):
+    """
+    Creates a campaign and the schedules of its recipients in a single transaction.
+
+    :param name: The name of the campaign.
+    :type name: str
+    :param message: The message template.
+    :type message: str
+    :param recipients: See `add_recipients`.
+    :type recipients: Iterable[Dict]
+    :param defaults: See `add_recipients`.
+    :type defaults: Dict
+    :param batch_size: Rows per INSERT statement.
+    :type batch_size: int
+    :return: The campaign and the number of schedules created.
+    :rtype: Tuple[Campaign, int]
+    """
+    with transaction.atomic():
+        campaign = Campaign.objects.create(name=name, message=message)
+        created = add_recipients(campaign, recipients, defaults, batch_size)
+    return campaign, created
@@ -0,0 +1,295 @@
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+
+import pika
+from pika.exceptions import AMQPConnectionError, AMQPError, ChannelWrongStateError
+
+from api.services.metrics import RABBITMQ_CONNECTIONS_OPENED
+
+from core.settings import (
+    RABBIT_MQ_HOST,
+    RABBIT_MQ_PORT,
+    RABBIT_MQ_USER,
+    RABBIT_MQ_PASSWORD,
+    RABBIT_MQ_HEARTBEAT,
+    RABBIT_MQ_BLOCKED_CONNECTION_TIMEOUT,
+    RABBIT_MQ_CONNECTION_ATTEMPTS,
+    RABBIT_MQ_RETRY_DELAY,
+    RABBIT_MQ_POOL_SIZE,
+    RABBIT_MQ_POOL_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PoolExhaustedError(Exception):
+    """
+    Raised when no broker connection becomes available within the pool timeout.
+    """
+
+
+class PooledConnection:
+    """
+    A long-lived broker connection owned by the pool, together with the channel opened on it.
+
+    The channel is opened lazily and reused for every operation executed on this connection,
+    so the AMQP handshake and the channel open are only paid once per connection.
+    """
+
+    def __init__(self, parameters: pika.ConnectionParameters) -> None:
+        """
+        Opens the connection to RabbitMQ.
+
+        :param parameters: The connection parameters used to reach the broker.
+        :type parameters: pika.ConnectionParameters
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        """
+        self.connection = pika.BlockingConnection(parameters)
+        self._channel = None
+        RABBITMQ_CONNECTIONS_OPENED.inc(kind="blocking")
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Whether the underlying connection is still usable.
+
+        :rtype: bool
+        """
+        return self.connection.is_open
+
+    def channel(self):
+        """
+        Returns the channel of this connection, reopening it if the broker closed it.
+
+        :return: An open channel.
+        :rtype: pika.adapters.blocking_connection.BlockingChannel
+        """
+        if self._channel is None or not self._channel.is_open:
+            self._channel = self.connection.channel()
+        return self._channel
+
+    def reset_channel(self) -> None:
+        """
+        Forgets the current channel so that the next call to `channel` opens a new one.
+        """
+        self._channel = None
+
+    def heartbeat(self) -> None:
+        """
+        Services heartbeats and pending frames of an idle connection.
+
+        A `BlockingConnection` only answers heartbeats while it performs I/O, so connections
+        parked in the pool are pumped before being handed out again. A connection the broker
+        dropped in the meantime raises here instead of in the middle of an operation.
+
+        :raises pika.exceptions.AMQPConnectionError: If the connection was lost.
+        """
+        self.connection.process_data_events(time_limit=0)
+
+    def close(self) -> None:
+        """
+        Closes the connection, ignoring errors from connections that are already dead.
+        """
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except AMQPError:
+            pass
+
+
+class ConnectionPool:
+    """
+    A process-wide pool of long-lived RabbitMQ connections.
+
+    At most `max_size` connections are open at the same time. Idle connections are kept in a
+    LIFO queue so the most recently used (and therefore warmest) connection is handed out first.
+    A thread that already holds a connection reuses it for nested operations instead of taking
+    a second slot from the pool.
+    """
+
+    def __init__(
+        self,
+        parameters: pika.ConnectionParameters,
+        max_size: int = 10,
+        acquire_timeout: Optional[float] = 5.0,
+    ) -> None:
+        """
+        :param parameters: The connection parameters used to open new connections.
+        :type parameters: pika.ConnectionParameters
+        :param max_size: The maximum number of connections opened by this pool.
+        :type max_size: int
+        :param acquire_timeout: Seconds to wait for a free connection, or None to wait forever.
+        :type acquire_timeout: Optional[float]
+        """
+        self.parameters = parameters
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+
+    def _open(self) -> PooledConnection:
+        return PooledConnection(self.parameters)
+
+    def acquire(self) -> PooledConnection:
+        """
+        Takes a live connection from the pool, opening a new one if no idle connection is left.
+
+        :return: A connection reserved for the caller until `release` is called.
+        :rtype: PooledConnection
+        :raises PoolExhaustedError: If every connection stays busy for longer than the timeout.
+        :raises pika.exceptions.AMQPConnectionError: If a new connection cannot be opened.
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhaustedError(
+                f"No RabbitMQ connection available after {self.acquire_timeout}s "
+                f"(pool size {self.max_size})."
+            )
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                try:
+                    connection.heartbeat()
+                except AMQPError:
+                    logger.info("Discarding stale RabbitMQ connection from the pool.")
+                    connection.close()
+                    continue
+                if connection.is_open:
+                    return connection
+                connection.close()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection: PooledConnection, discard: bool = False) -> None:
+        """
+        Returns a connection to the pool.
+
+        :param connection: The connection obtained from `acquire`.
+        :type connection: PooledConnection
+        :param discard: Close the connection instead of keeping it for reuse.
+        :type discard: bool
+        """
+        if discard or not connection.is_open:
+            connection.close()
+        else:
+            self._idle.put(connection)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that holds a pooled connection for the duration of the block.
+
+        Nested blocks on the same thread share the connection already held by that thread.
+
+        :return: The pooled connection.
+        :rtype: PooledConnection
+        """
+        held = getattr(self._local, "connection", None)
+        if held is not None:
+            yield held
+            return
+
+        connection = self.acquire()
+        self._local.connection = connection
+        discard = False
+        try:
+            yield connection
+        except AMQPConnectionError:
+            discard = True
+            raise
+        finally:
+            self._local.connection = None
+            self.release(connection, discard=discard or not connection.is_open)
+
+    def run(self, operation: Callable[..., T]) -> T:
+        """
+        Runs `operation(channel)` on a pooled channel, reconnecting once if the connection was lost.
+
+        :param operation: A callable receiving an open channel.
+        :type operation: Callable
+        :return: Whatever the operation returns.
+        :raises pika.exceptions.AMQPError: If the operation still fails after reconnecting.
+        """
+        nested = getattr(self._local, "connection", None) is not None
+        attempts = 1 if nested else 2
+        for attempt in range(1, attempts + 1):
+            try:
+                with self.connection() as connection:
+                    try:
+                        return operation(connection.channel())
+                    except ChannelWrongStateError:
+                        connection.reset_channel()
+                        raise
+            except (AMQPConnectionError, ChannelWrongStateError):
+                if attempt == attempts:
+                    raise
+                logger.warning("RabbitMQ connection lost, retrying on a new connection.")
+
+    def close(self) -> None:
+        """
+        Closes every idle connection held by the pool.
+        """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def build_connection_parameters() -> pika.ConnectionParameters:
+    """
+    Builds the pika connection parameters from the project settings.
+
+    :rtype: pika.ConnectionParameters
+    """
+    return pika.ConnectionParameters(
+        host=RABBIT_MQ_HOST,
+        port=RABBIT_MQ_PORT,
+        credentials=pika.PlainCredentials(
+            username=RABBIT_MQ_USER,
+            password=RABBIT_MQ_PASSWORD
+        ),
+        heartbeat=RABBIT_MQ_HEARTBEAT,
+        blocked_connection_timeout=RABBIT_MQ_BLOCKED_CONNECTION_TIMEOUT,
+        connection_attempts=RABBIT_MQ_CONNECTION_ATTEMPTS,
+        retry_delay=RABBIT_MQ_RETRY_DELAY,
+    )
+
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    Returns the connection pool of the current process, creating it on first use.
+
+    The pool is rebuilt after a fork so that worker processes never share sockets with their parent.
+
+    :rtype: ConnectionPool
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    build_connection_parameters(),
+                    max_size=RABBIT_MQ_POOL_SIZE,
+                    acquire_timeout=RABBIT_MQ_POOL_TIMEOUT,
+                )
+                _pool_pid = pid
+    return _pool
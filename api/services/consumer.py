@@ -0,0 +1,342 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.models import CommunicationSchedule
+from api.services.broker import Delivery
+from api.services.campaigns import resolve_message
+from api.services.dispatcher import LagStats
+from api.services.metrics import CONSUMER_LAG_SECONDS, CONSUMER_MESSAGES
+from api.services.reference_data import channels, statuses
+from api.services.transitions import apply_transition
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of a message, as counted by `BatchResult` and the consumer_messages_total metric.
+DELIVERED = "delivered"
+FAILED = "failed"
+SKIPPED = "skipped"
+REJECTED = "rejected"
+
+
+class DeliveryHandler:
+    """
+    Delivers the messages of a channel to their recipients, e.g. through an SMS or e-mail provider.
+
+    Handlers are configured per channel name by `CONSUMER_HANDLERS`, with `CONSUMER_DEFAULT_HANDLER`
+    for the other channels, and built once per worker process. Subclasses implement `deliver`, or
+    override `deliver_many` to hand a whole batch to a provider at once.
+    """
+
+    def deliver(self, schedule: CommunicationSchedule, message: str) -> None:
+        """
+        Delivers one message.
+
+        :param schedule: The schedule, with its recipient, channel and scheduled datetime.
+        :type schedule: CommunicationSchedule
+        :param message: The text to send, campaign placeholders already rendered.
+        :type message: str
+        :raises Exception: If the message could not be delivered.
+        """
+        raise NotImplementedError
+
+    def deliver_many(self, items: List[Tuple[CommunicationSchedule, str]]) -> List[Optional[str]]:
+        """
+        Delivers a batch of messages of the channel, by default one `deliver` call each.
+
+        :param items: The schedules and their messages.
+        :type items: List[Tuple[CommunicationSchedule, str]]
+        :return: For each item, None if it was delivered, otherwise the reason it failed.
+        :rtype: List[Optional[str]]
+        """
+        errors = []
+        for schedule, message in items:
+            try:
+                self.deliver(schedule, message)
+            except Exception as exc:
+                logger.warning("Delivery of schedule %s failed: %s", schedule.id, exc)
+                errors.append(str(exc) or exc.__class__.__name__)
+            else:
+                errors.append(None)
+        return errors
+
+
+class LoggingHandler(DeliveryHandler):
+    """
+    Default handler: logs each message instead of sending it.
+    """
+
+    def deliver(self, schedule: CommunicationSchedule, message: str) -> None:
+        logger.info("Delivering schedule %s to %s: %s", schedule.id, schedule.recipient, message)
+
+
+_handlers: Dict[str, DeliveryHandler] = {}
+_handlers_lock = threading.Lock()
+
+
+def get_handler(channel_name: str) -> DeliveryHandler:
+    """
+    Returns the handler of a channel, building it on first use.
+
+    :param channel_name: The name of the channel.
+    :type channel_name: str
+    :rtype: DeliveryHandler
+    """
+    handler = _handlers.get(channel_name)
+    if handler is None:
+        with _handlers_lock:
+            handler = _handlers.get(channel_name)
+            if handler is None:
+                path = settings.CONSUMER_HANDLERS.get(channel_name, settings.CONSUMER_DEFAULT_HANDLER)
+                handler = _handlers[channel_name] = import_string(path)()
+    return handler
+
+
+def reset_handlers() -> None:
+    """
+    Forgets the handlers built so far, so the next `get_handler` builds them again from the settings.
+    """
+    with _handlers_lock:
+        _handlers.clear()
+
+
+def _schedule_id(delivery: Delivery) -> Optional[int]:
+    try:
+        pk = json.loads(delivery.body)["id"]
+    except (ValueError, TypeError, KeyError):
+        return None
+    return pk if isinstance(pk, int) and not isinstance(pk, bool) else None
+
+
+class BatchResult:
+    """
+    What happened to the messages of one batch.
+
+    Attributes:
+        acked (List[int]): The tags to acknowledge.
+        rejected (List[int]): The tags to reject (dead-letter).
+        counts (Dict[str, int]): The number of messages by outcome.
+    """
+
+    def __init__(self) -> None:
+        self.acked: List[int] = []
+        self.rejected: List[int] = []
+        self.counts: Dict[str, int] = {DELIVERED: 0, FAILED: 0, SKIPPED: 0, REJECTED: 0}
+
+
+class ScheduleConsumer:
+    """
+    Consumes the `{"id": ...}` messages published for communication schedules and delivers them.
+
+    Messages are handled in batches of up to `batch_size`: the schedules of a batch are loaded with
+    one `id__in` query, grouped by channel and handed to the handler of each channel, and their
+    statuses are written with one UPDATE per outcome before the batch is acknowledged with a single
+    `basic_ack(multiple=True)`. Delivery is therefore at least once: a worker stopped between the
+    delivery and the acknowledgement leaves the batch to be redelivered.
+
+    Canceled schedules and messages referencing unknown schedules are acknowledged without being
+    delivered. Delivered schedules move from `scheduled` to `sent` (those published by the dispatcher
+    already are). Failed deliveries store their reason in `delivery_error`, which a later successful
+    delivery clears, and move from `scheduled` to `failed`; schedules the dispatcher already marked
+    `sent` keep that status, so for them `delivery_error` is the only record of the failure. Like
+    malformed messages, failed deliveries are rejected, so the broker dead-letters them if the queue
+    has a dead-letter exchange.
+    """
+
+    def __init__(
+        self,
+        broker,
+        queue_name: str,
+        prefetch_count: int = 500,
+        batch_size: int = 200,
+        max_wait: float = 0.5,
+    ) -> None:
+        """
+        :param broker: The broker backend, see `get_broker()`.
+        :param queue_name: The queue to consume.
+        :type queue_name: str
+        :param prefetch_count: The maximum number of unacknowledged messages held by the worker.
+        :type prefetch_count: int
+        :param batch_size: The maximum number of messages handled together.
+        :type batch_size: int
+        :param max_wait: Seconds to wait for a batch to fill before handling what arrived.
+        :type max_wait: float
+        """
+        self.broker = broker
+        self.queue_name = queue_name
+        self.prefetch_count = prefetch_count
+        self.batch_size = min(batch_size, prefetch_count)
+        self.max_wait = max_wait
+        self.lag = LagStats()
+        self.handled = 0
+
+    def process(self, deliveries: List[Delivery], now=None) -> BatchResult:
+        """
+        Delivers a batch of messages and writes the resulting statuses.
+
+        :param deliveries: The messages of the batch.
+        :type deliveries: List[Delivery]
+        :param now: The delivery time used for the lag, defaults to `timezone.now()`.
+        :type now: datetime
+        :return: The tags to acknowledge and to reject, and the counts by outcome.
+        :rtype: BatchResult
+        :raises django.db.Error: If the schedules cannot be read or updated; nothing is settled then.
+        """
+        result = BatchResult()
+        tags_by_id: Dict[int, List[int]] = {}
+        for delivery in deliveries:
+            pk = _schedule_id(delivery)
+            if pk is None:
+                logger.warning("Rejecting malformed message %r.", delivery.body[:200])
+                result.rejected.append(delivery.tag)
+                result.counts[REJECTED] += 1
+                CONSUMER_MESSAGES.inc(channel="", outcome=REJECTED)
+            else:
+                # A schedule published twice in the batch is delivered once.
+                tags_by_id.setdefault(pk, []).append(delivery.tag)
+        if not tags_by_id:
+            return result
+
+        schedules = CommunicationSchedule.objects.filter(id__in=list(tags_by_id)).only(
+            "id", "recipient", "message", "scheduled_datetime", "channel_id", "status_id", "campaign_id", "variables"
+        )
+        canceled = statuses.id_for("canceled")
+        by_channel: Dict[int, List[CommunicationSchedule]] = {}
+        found = set()
+        for schedule in schedules:
+            found.add(schedule.id)
+            if schedule.status_id == canceled:
+                self._count(result, tags_by_id[schedule.id], schedule.channel_id, SKIPPED)
+                result.acked.extend(tags_by_id[schedule.id])
+            else:
+                by_channel.setdefault(schedule.channel_id, []).append(schedule)
+        for pk in set(tags_by_id) - found:
+            logger.warning("Schedule %s does not exist, skipping its message.", pk)
+            self._count(result, tags_by_id[pk], None, SKIPPED)
+            result.acked.extend(tags_by_id[pk])
+
+        delivered, failed = [], []
+        for channel_id, group in by_channel.items():
+            handler = get_handler(channels.name_for(channel_id))
+            items = [
+                (schedule, resolve_message(schedule.message, schedule.campaign_id, schedule.variables))
+                for schedule in group
+            ]
+            try:
+                errors = handler.deliver_many(items)
+            except Exception:
+                logger.exception("Handler of channel %s failed.", channels.name_for(channel_id))
+                errors = ["handler error"] * len(group)
+            if len(errors) != len(group):
+                # Which messages the results belong to is unknown, so none of them counts as delivered.
+                logger.error(
+                    "Handler of channel %s returned %s results for %s messages.",
+                    channels.name_for(channel_id), len(errors), len(group),
+                )
+                errors = [f"handler returned {len(errors)} results for {len(group)} messages"] * len(group)
+            for schedule, error in zip(group, errors):
+                if error:
+                    schedule.delivery_error = error
+                    failed.append(schedule)
+                else:
+                    delivered.append(schedule)
+
+        if delivered or failed:
+            with transaction.atomic():
+                if delivered:
+                    sent = CommunicationSchedule.objects.filter(id__in=[s.id for s in delivered])
+                    apply_transition(sent, "sent")
+                    sent.exclude(delivery_error="").update(delivery_error="")
+                if failed:
+                    apply_transition(CommunicationSchedule.objects.filter(id__in=[s.id for s in failed]), "failed")
+                    CommunicationSchedule.objects.bulk_update(failed, ["delivery_error"])
+
+        now = now or timezone.now()
+        for schedule in delivered:
+            lag = max(0.0, (now - schedule.scheduled_datetime).total_seconds())
+            self.lag.record(lag)
+            CONSUMER_LAG_SECONDS.observe(lag, channel=channels.name_for(schedule.channel_id))
+            self._count(result, tags_by_id[schedule.id], schedule.channel_id, DELIVERED)
+            result.acked.extend(tags_by_id[schedule.id])
+        for schedule in failed:
+            self._count(result, tags_by_id[schedule.id], schedule.channel_id, FAILED)
+            result.rejected.extend(tags_by_id[schedule.id])
+        return result
+
+    @staticmethod
+    def _count(result: BatchResult, tags: List[int], channel_id: Optional[int], outcome: str) -> None:
+        result.counts[outcome] += len(tags)
+        channel = channels.name_for(channel_id) if channel_id is not None else ""
+        CONSUMER_MESSAGES.inc(len(tags), channel=channel, outcome=outcome)
+
+    def run_once(self, consumer) -> int:
+        """
+        Fetches one batch, handles it and settles its messages.
+
+        :param consumer: The open queue consumer, see `BrokerBackend.open_consumer`.
+        :type consumer: QueueConsumer
+        :return: The number of messages handled.
+        :rtype: int
+        """
+        deliveries = consumer.fetch(self.batch_size, self.max_wait)
+        if not deliveries:
+            return 0
+        result = self.process(deliveries)
+        consumer.settle(result.acked, result.rejected)
+        self.handled += len(deliveries)
+        return len(deliveries)
+
+    def run_forever(
+        self, stop_event: threading.Event, report_interval: float = 60.0, retry_delay: float = 5.0
+    ) -> None:
+        """
+        Consumes until `stop_event` is set, logging the throughput and the delivery lag periodically.
+
+        After a broker or database error the consumer is closed, so its unsettled messages go back to
+        the queue, and reopened after `retry_delay` seconds.
+
+        :param stop_event: Event used to stop the loop.
+        :type stop_event: threading.Event
+        :param report_interval: Seconds between two reports.
+        :type report_interval: float
+        :param retry_delay: Seconds to wait before reconnecting after an error.
+        :type retry_delay: float
+        """
+        started = time.monotonic()
+        next_report = started + report_interval
+        reported = 0
+        consumer = None
+        while not stop_event.is_set():
+            try:
+                if consumer is None:
+                    consumer = self.broker.open_consumer(self.queue_name, self.prefetch_count)
+                self.run_once(consumer)
+            except Exception:
+                logger.exception("Consuming %s failed, retrying in %ss.", self.queue_name, retry_delay)
+                if consumer is not None:
+                    consumer.close()
+                    consumer = None
+                close_old_connections()
+                stop_event.wait(retry_delay)
+                continue
+            now = time.monotonic()
+            if now >= next_report:
+                summary = self.lag.summary()
+                logger.info(
+                    "Handled %s messages (%.1f/s), lag p50=%.3fs p99=%.3fs max=%.3fs.",
+                    self.handled - reported, (self.handled - reported) / (now - started),
+                    summary["p50"], summary["p99"], summary["max"],
+                )
+                self.lag.reset()
+                reported = self.handled
+                started = now
+                next_report = now + report_interval
+        if consumer is not None:
+            consumer.close()
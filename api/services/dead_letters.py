@@ -0,0 +1,243 @@
+import base64
+import hashlib
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from pika.exceptions import AMQPError
+
+from api.models import DeadLetterReplay
+from api.services import topology
+from api.services.topology import BindingSpec, ExchangeSpec, QueueSpec, Topology, TopologyResult
+
+logger = logging.getLogger(__name__)
+
+# Seconds a replay waits for the next messages of the dead-letter queue before stopping.
+REPLAY_FETCH_TIMEOUT = 1.0
+
+# The largest prefetch count accepted by RabbitMQ, which bounds the messages a replay holds unsettled.
+MAX_PREFETCH = 65535
+
+
+def dead_letter_exchange(queue_name: str) -> str:
+    """
+    The name of the exchange the rejected and expired messages of a queue are dead-lettered to.
+
+    :param queue_name: The queue.
+    :type queue_name: str
+    :rtype: str
+    """
+    return f"{queue_name}.dlx"
+
+
+def dead_letter_queue(queue_name: str) -> str:
+    """
+    The name of the queue holding the dead-lettered messages of a queue.
+
+    :param queue_name: The queue.
+    :type queue_name: str
+    :rtype: str
+    """
+    return f"{queue_name}.dlq"
+
+
+def queue_topology(queue_name: str) -> Topology:
+    """
+    A queue whose rejected and expired messages are kept in its dead-letter queue.
+
+    The dead-letter exchange is a fanout, so messages keep the routing key they had, and the
+    `x-death` header added by the broker tells which exchange and routing key they came from.
+
+    :param queue_name: The queue.
+    :type queue_name: str
+    :rtype: Topology
+    """
+    exchange_name, dlq_name = dead_letter_exchange(queue_name), dead_letter_queue(queue_name)
+    return Topology(
+        exchanges=[ExchangeSpec(exchange_name, "fanout")],
+        queues=[QueueSpec(dlq_name), QueueSpec(queue_name, arguments={"x-dead-letter-exchange": exchange_name})],
+        bindings=[BindingSpec(exchange_name, dlq_name)],
+    )
+
+
+def provision(broker, queue_name: str) -> List[TopologyResult]:
+    """
+    Declares a queue with its dead-letter exchange and queue, see `api.services.topology.apply`.
+
+    A queue that already exists without the dead-letter argument is reported as a conflict, as
+    RabbitMQ does not allow changing the arguments of a queue.
+
+    :param broker: The broker backend, see `get_broker()`.
+    :param queue_name: The queue.
+    :type queue_name: str
+    :return: The result of every exchange, queue and binding.
+    :rtype: List[TopologyResult]
+    :raises ManagementApiError: If the current state cannot be retrieved.
+    :raises pika.exceptions.AMQPConnectionError: If the broker cannot be reached.
+    """
+    return topology.apply(broker, queue_topology(queue_name))
+
+
+def fingerprint(body: bytes) -> str:
+    """
+    Identifies a dead-lettered message by its body, to select it for a replay; messages with the same body share it.
+
+    :param body: The raw body.
+    :type body: bytes
+    :rtype: str
+    """
+    return hashlib.sha1(body).hexdigest()
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def origin(headers: Dict, exchange_name: str = "", rout_key_name: str = "") -> Tuple[str, str]:
+    """
+    The exchange and routing key a message was published with before it was last dead-lettered.
+
+    The broker prepends an entry to the `x-death` header each time a message is dead-lettered, so
+    the first entry describes the last publication.
+
+    :param headers: The headers of the dead-lettered message.
+    :type headers: Dict
+    :param exchange_name: The exchange to fall back to without an `x-death` header.
+    :type exchange_name: str
+    :param rout_key_name: The routing key to fall back to without an `x-death` header.
+    :type rout_key_name: str
+    :rtype: Tuple[str, str]
+    """
+    deaths = (headers or {}).get("x-death") or []
+    if not deaths:
+        return exchange_name, rout_key_name
+    death = deaths[0]
+    routing_keys = death.get("routing-keys") or [rout_key_name]
+    return _text(death.get("exchange", exchange_name)), _text(routing_keys[0])
+
+
+def describe(message: Dict, position: int) -> Dict:
+    """
+    Summarizes a message returned by `BrokerBackend.peek_messages`.
+
+    :param message: The message, shaped like the management API returns it.
+    :type message: Dict
+    :param position: The position of the message in the queue, from 0.
+    :type position: int
+    :return: Its position, fingerprint (None if the payload was truncated), original exchange and
+        routing key, the queue it was dead-lettered from, why and how many times, and its payload.
+    :rtype: Dict
+    """
+    payload = message["payload"]
+    raw = base64.b64decode(payload) if message.get("payload_encoding") == "base64" else payload.encode()
+    headers = (message.get("properties") or {}).get("headers") or {}
+    deaths = headers.get("x-death") or [{}]
+    exchange_name, rout_key_name = origin(headers, message.get("exchange", ""), message.get("routing_key", ""))
+    return {
+        "position": position,
+        "fingerprint": fingerprint(raw) if len(raw) == message.get("payload_bytes", len(raw)) else None,
+        "exchange": exchange_name,
+        "routing_key": rout_key_name,
+        "dead_lettered_from": deaths[0].get("queue", ""),
+        "reason": deaths[0].get("reason", ""),
+        "death_count": deaths[0].get("count", 0),
+        "payload": payload,
+        "payload_encoding": message.get("payload_encoding", "string"),
+    }
+
+
+def peek(broker, queue_name: str, offset: int, limit: int) -> Tuple[int, List[Dict]]:
+    """
+    Reads a page of a dead-letter queue without consuming it.
+
+    The broker can only return messages from the head of a queue, so a page reads the `offset`
+    messages before it too; callers bound `offset + limit` (see `DEAD_LETTER_PEEK_MAX`).
+
+    :param broker: The broker backend, see `get_broker()`.
+    :param queue_name: The dead-letter queue.
+    :type queue_name: str
+    :param offset: The messages to skip.
+    :type offset: int
+    :param limit: The maximum number of messages of the page.
+    :type limit: int
+    :return: The number of messages in the queue and the page, see `describe`.
+    :rtype: Tuple[int, List[Dict]]
+    :raises ManagementApiError: If the messages cannot be retrieved.
+    """
+    messages = broker.peek_messages(queue_name, offset + limit)
+    total = messages[0]["message_count"] + 1 if messages else 0
+    return total, [describe(message, offset + index) for index, message in enumerate(messages[offset:])]
+
+
+def replay(
+    broker,
+    queue_name: str,
+    fingerprints: Optional[Iterable[str]] = None,
+    limit: int = None,
+    batch_size: int = None,
+) -> DeadLetterReplay:
+    """
+    Republishes dead-lettered messages to the exchange and routing key they were dead-lettered from.
+
+    Only the messages in the queue when the replay starts are considered, so messages dead-lettered
+    again while it runs are not replayed twice. They are consumed in batches of `batch_size` and
+    each batch is republished with publisher confirms (`BrokerBackend.send_messages_confirmed`,
+    over a single channel with RabbitMQ); a message is acknowledged, and so removed from the queue,
+    only once its copy is confirmed and routed to a queue. Messages not selected, not confirmed or
+    whose body is not JSON go back to the queue when the consumer is closed.
+
+    :param broker: The broker backend, see `get_broker()`.
+    :param queue_name: The dead-letter queue.
+    :type queue_name: str
+    :param fingerprints: The fingerprints of the messages to replay (see `fingerprint`), or None for all of them.
+    :type fingerprints: Optional[Iterable[str]]
+    :param limit: The maximum number of messages considered, `DEAD_LETTER_REPLAY_LIMIT` by default.
+    :type limit: int
+    :param batch_size: Messages republished together, `DEAD_LETTER_REPLAY_BATCH_SIZE` by default.
+    :type batch_size: int
+    :return: The saved record of the replay, with its replayed and failed counts.
+    :rtype: DeadLetterReplay
+    :raises ManagementApiError: If the size of the queue cannot be retrieved.
+    """
+    selected = None if fingerprints is None else set(fingerprints)
+    limit = min(limit or settings.DEAD_LETTER_REPLAY_LIMIT, MAX_PREFETCH)
+    batch_size = batch_size or settings.DEAD_LETTER_REPLAY_BATCH_SIZE
+    head = broker.peek_messages(queue_name, 1)
+    pending = min(limit, head[0]["message_count"] + 1 if head else 0)
+    record = DeadLetterReplay(queue=queue_name)
+    consumer = None
+    try:
+        if pending:
+            consumer = broker.open_consumer(queue_name, pending)
+        while pending:
+            deliveries = consumer.fetch(min(batch_size, pending), REPLAY_FETCH_TIMEOUT)
+            if not deliveries:
+                break
+            pending -= len(deliveries)
+            tags, messages = [], []
+            for delivery in deliveries:
+                if selected is not None and fingerprint(delivery.body) not in selected:
+                    continue
+                try:
+                    body = json.loads(delivery.body)
+                except ValueError:
+                    record.failed += 1
+                    continue
+                tags.append(delivery.tag)
+                messages.append((*origin(delivery.headers), body))
+            if not messages:
+                continue
+            confirmed = broker.send_messages_confirmed(messages, mandatory=True)
+            acked = [tag for tag, ok in zip(tags, confirmed) if ok]
+            consumer.settle(acked, [])
+            record.replayed += len(acked)
+            record.failed += len(tags) - len(acked)
+    except AMQPError as exc:
+        logger.exception("Replay of %s stopped after %s messages.", queue_name, record.replayed)
+        record.error = str(exc) or exc.__class__.__name__
+    finally:
+        if consumer is not None:
+            consumer.close()
+    record.save()
+    return record
@@ -0,0 +1,317 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.services import topology
+from api.services.broker import Delivery
+from api.services.dead_letters import origin
+from api.services.management import ManagementApiError
+from api.services.topology import BindingSpec, ExchangeSpec, QueueSpec, Topology, TopologyResult
+
+logger = logging.getLogger(__name__)
+
+# With SCHEDULE_DISPATCH_MODE = "delayed", the message of a schedule carries its due time and its
+# exchange in the headers below and waits in the delay tiers: each tier is a queue whose messages
+# expire after the tier delay (its `x-message-ttl`) and are dead-lettered to the router queue. The
+# router (`DelayRouter`, run by the `route_delays` command) republishes each of them to the largest
+# tier not longer than the delay left, or to the schedule exchange once less than half the smallest
+# tier is left. Every message of a tier queue has the same TTL, so messages expire in order at the
+# head of the queue. Only the part of a delay beyond the largest tier is waited in the outbox.
+DUE_HEADER = "x-delay-until"
+EXCHANGE_HEADER = "x-delay-exchange"
+
+# The exchange and queue every delay tier dead-letters to.
+ROUTER_NAME = "schedule_delay.router"
+
+
+class DelayRoutingError(Exception):
+    """
+    Raised by `DelayRouter.run_once` when the fate of some of the messages republished is unknown,
+    e.g. the connection was lost; they are left unacknowledged.
+    """
+
+
+def tiers() -> List[int]:
+    """
+    The delay tiers, in seconds, from `SCHEDULE_DELAY_TIERS`.
+
+    :rtype: List[int]
+    """
+    return sorted(set(settings.SCHEDULE_DELAY_TIERS))
+
+
+def tier_name(exchange_name: str, tier: int) -> str:
+    """
+    The name of the exchange and of the queue of a delay tier of an exchange, e.g. "schedule_data.delay.60s".
+
+    :param exchange_name: The exchange the messages of the tier are headed to.
+    :type exchange_name: str
+    :param tier: The delay of the tier, in seconds.
+    :type tier: int
+    :rtype: str
+    """
+    return f"{exchange_name}.delay.{tier}s"
+
+
+def tier_topology(exchange_name: str, delays: Iterable[int] = None) -> Topology:
+    """
+    The exchanges, queues and bindings of the delay tiers of an exchange, and of the router.
+
+    Each tier is a fanout exchange, so messages keep the routing key they were published with,
+    bound to a queue whose messages expire after the tier delay and are dead-lettered to the router.
+
+    :param exchange_name: The exchange the messages of the tiers are headed to.
+    :type exchange_name: str
+    :param delays: The tier delays in seconds, by default `tiers()`.
+    :type delays: Iterable[int]
+    :rtype: Topology
+    """
+    delays = tiers() if delays is None else sorted(set(delays))
+    names = [(tier_name(exchange_name, tier), tier) for tier in delays]
+    return Topology(
+        exchanges=[ExchangeSpec(ROUTER_NAME, "fanout")] + [ExchangeSpec(name, "fanout") for name, _ in names],
+        queues=[QueueSpec(ROUTER_NAME)] + [
+            QueueSpec(name, arguments={"x-message-ttl": tier * 1000, "x-dead-letter-exchange": ROUTER_NAME})
+            for name, tier in names
+        ],
+        bindings=[BindingSpec(ROUTER_NAME, ROUTER_NAME)] + [BindingSpec(name, name) for name, _ in names],
+    )
+
+
+def next_hop(exchange_name: str, due: datetime, now: datetime) -> str:
+    """
+    Where a delayed message goes next: the largest tier not longer than the delay left, the smallest
+    tier if at least half of it is left, or else the exchange itself.
+
+    A message therefore reaches its exchange within half the smallest tier of its due time.
+
+    :param exchange_name: The exchange the message is headed to.
+    :type exchange_name: str
+    :param due: When the message is due.
+    :type due: datetime
+    :param now: The current time.
+    :type now: datetime
+    :rtype: str
+    """
+    delays = tiers()
+    remaining = (due - now).total_seconds()
+    tier = max((tier for tier in delays if tier <= remaining), default=0)
+    if not tier and delays and remaining * 2 >= delays[0]:
+        tier = delays[0]
+    return tier_name(exchange_name, tier) if tier else exchange_name
+
+
+def route(exchange_name: str, scheduled_datetime: datetime, now: datetime = None) -> Tuple[str, datetime, Dict]:
+    """
+    Where, when and with which headers the message of a schedule is published in the "delayed" dispatch mode.
+
+    The message is published right away to its first hop (see `next_hop`), unless its delay exceeds
+    the largest tier: it then becomes available in the outbox the largest tier before its due time.
+
+    :param exchange_name: The exchange of the schedule.
+    :type exchange_name: str
+    :param scheduled_datetime: When the schedule is due.
+    :type scheduled_datetime: datetime
+    :param now: The current time, defaults to `timezone.now()`.
+    :type now: datetime
+    :return: The exchange to publish to, the time the outbox message becomes available and its headers.
+    :rtype: Tuple[str, datetime, Dict]
+    """
+    now = now or timezone.now()
+    delays = tiers()
+    available_at = max(now, scheduled_datetime - timedelta(seconds=delays[-1] if delays else 0))
+    headers = {DUE_HEADER: int(scheduled_datetime.timestamp() * 1000), EXCHANGE_HEADER: exchange_name}
+    return next_hop(exchange_name, scheduled_datetime, available_at), available_at, headers
+
+
+def provisioned(broker, exchange_names: Iterable[str]) -> Set[str]:
+    """
+    The exchanges whose delay tiers, and the router, all exist on the broker.
+
+    The exchanges are listed through the management API cache, so this costs no request most of
+    the time; if they cannot be listed, no exchange is considered provisioned.
+
+    :param broker: The broker backend, see `get_broker()`.
+    :param exchange_names: The exchanges to check.
+    :type exchange_names: Iterable[str]
+    :rtype: Set[str]
+    """
+    try:
+        existing = {exchange["name"] for exchange in broker.list_exchanges()}
+    except ManagementApiError as exc:
+        logger.warning("Cannot check the delay tiers: %s", exc)
+        return set()
+    if ROUTER_NAME not in existing:
+        return set()
+    delays = tiers()
+    return {name for name in exchange_names if all(tier_name(name, tier) in existing for tier in delays)}
+
+
+def provision(broker, exchange_name: str, delays: Iterable[int] = None) -> List[TopologyResult]:
+    """
+    Declares the delay tiers of an exchange and the router that the broker lacks, see `api.services.topology.apply`.
+
+    :param broker: The broker backend, see `get_broker()`.
+    :param exchange_name: The exchange the messages of the tiers are headed to.
+    :type exchange_name: str
+    :param delays: The tier delays in seconds, by default `tiers()`.
+    :type delays: Iterable[int]
+    :return: The result of every exchange, queue and binding of the tiers and of the router.
+    :rtype: List[TopologyResult]
+    :raises ManagementApiError: If the current state cannot be retrieved.
+    :raises pika.exceptions.AMQPConnectionError: If the broker cannot be reached.
+    """
+    return topology.apply(broker, tier_topology(exchange_name, delays))
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class DelayRouter:
+    """
+    Republishes the messages dead-lettered by the delay tiers to their next hop, see `next_hop`.
+
+    Messages are republished in batches with publisher confirms and acknowledged once confirmed, so
+    a message is never lost between two tiers. A hop refused by the broker, because the tier was
+    deleted, goes straight to the exchange of the message instead; a message refused by its exchange
+    as well is dropped. Messages without a due time, such as those published to a tier before the
+    router existed, go straight to the exchange of their tier.
+    """
+
+    def __init__(self, broker, prefetch_count: int = 500, batch_size: int = 200, max_wait: float = 0.05) -> None:
+        """
+        :param broker: The broker backend, see `get_broker()`.
+        :param prefetch_count: The maximum number of unacknowledged messages held by the router.
+        :type prefetch_count: int
+        :param batch_size: The maximum number of messages republished together.
+        :type batch_size: int
+        :param max_wait: Seconds to wait for a batch to fill, which delays each hop by as much.
+        :type max_wait: float
+        """
+        self.broker = broker
+        self.prefetch_count = prefetch_count
+        self.batch_size = min(batch_size, prefetch_count)
+        self.max_wait = max_wait
+        self.routed = 0
+
+    @staticmethod
+    def hop(delivery: Delivery, now: datetime) -> Optional[Tuple[str, str, Dict, Dict]]:
+        """
+        The message republishing a delivery of the router queue.
+
+        :param delivery: The dead-lettered message.
+        :type delivery: Delivery
+        :param now: The current time.
+        :type now: datetime
+        :return: The exchange, routing key, body and headers to publish, or None if the body is not JSON.
+        :rtype: Optional[Tuple[str, str, Dict, Dict]]
+        """
+        try:
+            body = json.loads(delivery.body)
+        except ValueError:
+            return None
+        tier_exchange, rout_key_name = origin(delivery.headers)
+        exchange_name = _text(delivery.headers.get(EXCHANGE_HEADER) or tier_exchange.rsplit(".delay.", 1)[0])
+        due_ms = delivery.headers.get(DUE_HEADER)
+        due = now if due_ms is None else datetime.fromtimestamp(int(due_ms) / 1000, tz=dt_timezone.utc)
+        headers = {DUE_HEADER: int(due.timestamp() * 1000), EXCHANGE_HEADER: exchange_name}
+        return next_hop(exchange_name, due, now), rout_key_name, body, headers
+
+    def run_once(self, consumer) -> int:
+        """
+        Fetches one batch and republishes it.
+
+        :param consumer: The open consumer of the router queue, see `BrokerBackend.open_consumer`.
+        :type consumer: QueueConsumer
+        :return: The number of messages fetched.
+        :rtype: int
+        :raises DelayRoutingError: If the broker did not tell whether it received some messages;
+            they stay unacknowledged, the others are settled.
+        """
+        deliveries = consumer.fetch(self.batch_size, self.max_wait)
+        if not deliveries:
+            return 0
+        now = timezone.now()
+        tags, messages, rejected = [], [], []
+        for delivery in deliveries:
+            message = self.hop(delivery, now)
+            if message is None:
+                logger.warning("Dropping malformed delayed message %r.", delivery.body[:200])
+                rejected.append(delivery.tag)
+            else:
+                tags.append(delivery.tag)
+                messages.append(message)
+        confirmed = self.broker.send_messages_confirmed(messages) if messages else []
+        # Hops refused by a tier go straight to their exchange.
+        fallback = [
+            index for index, (message, ok) in enumerate(zip(messages, confirmed))
+            if ok is False and message[0] != message[3][EXCHANGE_HEADER]
+        ]
+        if fallback:
+            logger.warning("%s delayed messages were refused by their tier, sending them on.", len(fallback))
+            retried = self.broker.send_messages_confirmed(
+                (messages[index][3][EXCHANGE_HEADER], *messages[index][1:]) for index in fallback
+            )
+            for index, ok in zip(fallback, retried):
+                confirmed[index] = ok
+        acked = [tag for tag, ok in zip(tags, confirmed) if ok]
+        refused = [tag for tag, ok in zip(tags, confirmed) if ok is False]
+        if refused:
+            logger.error("Dropping %s delayed messages refused by their exchange.", len(refused))
+        consumer.settle(acked, rejected + refused)
+        self.routed += len(acked)
+        unknown = len(tags) - len(acked) - len(refused)
+        if unknown:
+            raise DelayRoutingError(f"{unknown} delayed messages were not confirmed.")
+        return len(deliveries)
+
+    def run_forever(
+        self, stop_event: threading.Event, report_interval: float = 60.0, retry_delay: float = 5.0
+    ) -> None:
+        """
+        Routes until `stop_event` is set, logging the throughput periodically.
+
+        After an error the consumer is closed, so its unacknowledged messages go back to the router
+        queue, and reopened after `retry_delay` seconds.
+
+        :param stop_event: Event used to stop the loop.
+        :type stop_event: threading.Event
+        :param report_interval: Seconds between two reports.
+        :type report_interval: float
+        :param retry_delay: Seconds to wait before reconnecting after an error.
+        :type retry_delay: float
+        """
+        started = time.monotonic()
+        next_report = started + report_interval
+        reported = 0
+        consumer = None
+        while not stop_event.is_set():
+            try:
+                if consumer is None:
+                    consumer = self.broker.open_consumer(ROUTER_NAME, self.prefetch_count)
+                self.run_once(consumer)
+            except Exception:
+                logger.exception("Routing delayed messages failed, retrying in %ss.", retry_delay)
+                if consumer is not None:
+                    consumer.close()
+                    consumer = None
+                stop_event.wait(retry_delay)
+                continue
+            now = time.monotonic()
+            if now >= next_report:
+                logger.info(
+                    "Routed %s delayed messages (%.1f/s).",
+                    self.routed - reported, (self.routed - reported) / (now - started),
+                )
+                reported = self.routed
+                started = now
+                next_report = now + report_interval
+        if consumer is not None:
+            consumer.close()
@@ -0,0 +1,321 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from api.models import CommunicationSchedule
+from api.services.rate_limit import ChannelRateLimiter
+from api.services.reference_data import statuses
+from api.services.transitions import apply_transition
+
+logger = logging.getLogger(__name__)
+
+
+class LagStats:
+    """
+    Accumulates how late each firing was, in seconds, between two reports.
+    """
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.total = 0
+
+    def record(self, lag: float) -> None:
+        """
+        Records the lateness of one firing.
+
+        :param lag: Seconds between the scheduled datetime and the publish.
+        :type lag: float
+        """
+        self.samples.append(lag)
+        self.total += 1
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarizes the samples recorded since the last reset.
+
+        :return: The count and the p50, p99 and max lateness in seconds.
+        :rtype: Dict[str, float]
+        """
+        if not self.samples:
+            return {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {
+            "count": len(ordered),
+            "p50": ordered[int(last * 0.50)],
+            "p99": ordered[int(last * 0.99)],
+            "max": ordered[last],
+        }
+
+    def reset(self) -> None:
+        """
+        Drops the samples recorded so far.
+        """
+        self.samples = []
+
+
+class ScheduleDispatcher:
+    """
+    Publishes communication schedules at their scheduled datetime.
+
+    Upcoming schedules are kept in an in-memory heap ordered by due time. The heap is refilled by
+    scanning the `(status, scheduled_datetime)` index for schedules due within the lookahead window.
+    When schedules become due they are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, published
+    with pipelined publisher confirms and moved from `scheduled` to `sent` (or to `failed` when the
+    broker nacks or cannot route them) in the same transaction, so several dispatchers can run side
+    by side without firing a schedule twice.
+
+    Schedules of a rate-limited channel (see `Channel.rate_limit`) that become due faster than the
+    channel allows are given the next free send slot of the channel and pushed back into the heap,
+    so a burst is spread over time at the channel rate instead of being dropped.
+    """
+
+    def __init__(
+        self,
+        service,
+        lookahead: float = 60.0,
+        refill_interval: float = 1.0,
+        batch_size: int = 500,
+        max_pending: int = 100000,
+        shard_index: int = 0,
+        shard_count: int = 1,
+    ) -> None:
+        """
+        :param service: The broker backend used to publish, see `get_broker()`.
+        :param lookahead: Seconds ahead of now loaded into the heap on each refill.
+        :type lookahead: float
+        :param refill_interval: Seconds between two scans of the database.
+        :type refill_interval: float
+        :param batch_size: Maximum schedules claimed and published per transaction.
+        :type batch_size: int
+        :param max_pending: Maximum schedules held in memory.
+        :type max_pending: int
+        :param shard_index: The shard handled by this dispatcher, from 0 to shard_count - 1.
+        :type shard_index: int
+        :param shard_count: The number of dispatchers splitting the schedules by id.
+        :type shard_count: int
+        """
+        self.service = service
+        self.lookahead = lookahead
+        self.refill_interval = refill_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.lag = LagStats()
+        self._heap = []
+        # Id -> due timestamp of every schedule in the heap; heap entries with another due are stale.
+        self._pending = {}
+        self._next_refill = 0.0
+        self.limiter = ChannelRateLimiter(share=shard_count)
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of schedules waiting in memory.
+
+        :rtype: int
+        """
+        return len(self._pending)
+
+    def _window(self, now):
+        queryset = CommunicationSchedule.objects.filter(
+            status_id=statuses.id_for("scheduled"),
+            scheduled_datetime__lte=now + timedelta(seconds=self.lookahead),
+        )
+        if self.shard_count > 1:
+            queryset = queryset.annotate(shard=Mod(F("id"), self.shard_count)).filter(shard=self.shard_index)
+        return queryset
+
+    def refill(self, now=None) -> int:
+        """
+        Loads the schedules due within the lookahead window into the heap.
+
+        A schedule already in the heap that was moved to an earlier datetime gets a new entry at
+        that datetime; its old entry is left in the heap as stale and dropped by `pop_due`.
+
+        :param now: The current time, defaults to `timezone.now()`.
+        :type now: datetime
+        :return: The number of schedules added to the heap.
+        :rtype: int
+        """
+        now = now or timezone.now()
+        capacity = self.max_pending - len(self._pending)
+        if capacity <= 0:
+            return 0
+        rows = self._window(now).order_by("scheduled_datetime", "id").values_list(
+            "id", "scheduled_datetime", "channel_id"
+        )
+        added = 0
+        for pk, scheduled_datetime, channel_id in rows[:capacity + len(self._pending)]:
+            due = scheduled_datetime.timestamp()
+            pending_due = self._pending.get(pk)
+            if pending_due is not None and due >= pending_due:
+                # Schedules moved later are skipped by `fire` and come back through a later refill.
+                continue
+            # (timestamp, id, channel id, whether a send slot of the channel is already reserved, due timestamp)
+            heapq.heappush(self._heap, (due, pk, channel_id, False, due))
+            self._pending[pk] = due
+            if pending_due is not None:
+                continue
+            added += 1
+            if added >= capacity:
+                break
+        return added
+
+    def next_due(self) -> Optional[float]:
+        """
+        The timestamp of the earliest schedule in the heap.
+
+        :rtype: Optional[float]
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None) -> List[int]:
+        """
+        Removes the schedules that are due from the heap.
+
+        A due schedule whose channel is over its rate is pushed back at the next send slot of the
+        channel, reserved for it, and popped again at that time.
+
+        :param now: The current time, defaults to `timezone.now()`.
+        :type now: datetime
+        :return: The ids of the due schedules, at most `batch_size` of them.
+        :rtype: List[int]
+        """
+        now_ts = (now or timezone.now()).timestamp()
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts and len(due) < self.batch_size:
+            _, pk, channel_id, reserved, entry_due = heapq.heappop(self._heap)
+            if self._pending.get(pk) != entry_due:
+                # Replaced by an entry at an earlier datetime, or already popped.
+                continue
+            if not reserved:
+                slot = self.limiter.reserve(channel_id, now_ts)
+                if slot > now_ts:
+                    heapq.heappush(self._heap, (slot, pk, channel_id, True, entry_due))
+                    continue
+            del self._pending[pk]
+            due.append(pk)
+        return due
+
+    def fire(self, ids: List[int], now=None) -> int:
+        """
+        Publishes the given schedules if they are still scheduled and due, and marks them as sent,
+        or as failed when the broker refused them (nacked, unroutable, or sent to a missing exchange).
+
+        Schedules the broker may not have received, because the connection was lost or the confirm
+        timed out, stay scheduled and are published again after the next refill. Schedules locked by
+        another dispatcher, already sent, canceled, or moved to a later datetime are skipped; the later
+        ones come back through the next refill. Schedules moved to an earlier datetime are brought
+        forward by `refill`.
+
+        :param ids: The ids of the schedules to fire.
+        :type ids: List[int]
+        :param now: The current time, defaults to `timezone.now()`.
+        :type now: datetime
+        :return: The number of schedules published.
+        :rtype: int
+        """
+        if not ids:
+            return 0
+        now = now or timezone.now()
+        with transaction.atomic():
+            rows = list(
+                CommunicationSchedule.objects.select_for_update(skip_locked=True)
+                .filter(id__in=ids, status_id=statuses.id_for("scheduled"), scheduled_datetime__lte=now)
+                .only("id", "exchange", "routing_key", "scheduled_datetime")
+            )
+            if not rows:
+                return 0
+            confirmed = self.service.send_messages_confirmed(
+                ((row.exchange, row.routing_key, {"id": row.id}) for row in rows), mandatory=True
+            )
+            dispatched_at = timezone.now()
+            sent = [row for row, ok in zip(rows, confirmed) if ok]
+            failed = [row.id for row, ok in zip(rows, confirmed) if ok is False]
+            unknown = len(rows) - len(sent) - len(failed)
+            if sent:
+                apply_transition(
+                    CommunicationSchedule.objects.filter(id__in=[row.id for row in sent]),
+                    "sent",
+                    dispatched_at=dispatched_at,
+                )
+            if failed:
+                apply_transition(CommunicationSchedule.objects.filter(id__in=failed), "failed")
+                logger.warning("Broker refused %s schedules, marked as failed.", len(failed))
+        if unknown:
+            logger.warning("Broker did not confirm %s schedules, retrying them after the next refill.", unknown)
+        for row in sent:
+            self.lag.record((dispatched_at - row.scheduled_datetime).total_seconds())
+        logger.debug("Dispatched %s schedules.", len(sent))
+        return len(sent)
+
+    def run_once(self, now=None) -> int:
+        """
+        Refills the heap if the refill interval elapsed and fires every due schedule.
+
+        :param now: The current time, defaults to `timezone.now()`.
+        :type now: datetime
+        :return: The number of schedules published.
+        :rtype: int
+        """
+        now = now or timezone.now()
+        if time.monotonic() >= self._next_refill:
+            self.refill(now)
+            self._next_refill = time.monotonic() + self.refill_interval
+        fired = 0
+        while True:
+            due = self.pop_due(now)
+            if not due:
+                return fired
+            fired += self.fire(due, now)
+
+    def seconds_until_next_event(self) -> float:
+        """
+        How long the dispatcher can sleep before a schedule is due or the next refill.
+
+        :rtype: float
+        """
+        wait = max(0.0, self._next_refill - time.monotonic())
+        next_due = self.next_due()
+        if next_due is not None:
+            wait = min(wait, max(0.0, next_due - time.time()))
+        return wait
+
+    def run_forever(self, stop_event: threading.Event, report_interval: float = 60.0) -> None:
+        """
+        Runs the dispatcher until `stop_event` is set, logging the firing lateness periodically.
+
+        :param stop_event: Event used to stop the loop.
+        :type stop_event: threading.Event
+        :param report_interval: Seconds between two lateness reports.
+        :type report_interval: float
+        """
+        next_report = time.monotonic() + report_interval
+        while not stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Schedules popped from the heap are still `scheduled` and come back on the next refill.
+                logger.exception("Dispatch failed, retrying in %ss.", self.refill_interval)
+                close_old_connections()
+                stop_event.wait(self.refill_interval)
+                continue
+            if time.monotonic() >= next_report:
+                summary = self.lag.summary()
+                logger.info(
+                    "Dispatched %s schedules, lateness p50=%.3fs p99=%.3fs max=%.3fs, %s pending.",
+                    summary["count"], summary["p50"], summary["p99"], summary["max"], self.pending,
+                )
+                self.lag.reset()
+                next_report = time.monotonic() + report_interval
+            stop_event.wait(self.seconds_until_next_event())
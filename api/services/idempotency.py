@@ -0,0 +1,140 @@
+import hashlib
+import json
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """
+    Raised when an idempotency key is reused with a different request body.
+    """
+
+
+class StoredResponse(NamedTuple):
+    """
+    A response recorded for an idempotency key.
+    """
+
+    status_code: int
+    body: object
+
+
+def fingerprint(data) -> str:
+    """
+    Hashes a request body, independently of the order of its keys.
+
+    :param data: The parsed request body.
+    :return: The hex SHA-256 of the canonical JSON of the body.
+    :rtype: str
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _cache():
+    return caches[settings.IDEMPOTENCY_CACHE]
+
+
+def _cache_key(scope: str, key: str) -> str:
+    # Hashed, so that any header value is a valid key for every cache backend.
+    return f"idempotency:{scope}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def _check(stored_fingerprint: str, request_fingerprint: str, key: str) -> None:
+    if stored_fingerprint != request_fingerprint:
+        raise IdempotencyConflict(f"The idempotency key '{key}' was already used with a different request.")
+
+
+def lookup(scope: str, key: str, request_fingerprint: str) -> Optional[StoredResponse]:
+    """
+    Finds the response recorded for a key, first in the cache and then in the database.
+
+    :param scope: The endpoint, e.g. "create_schedule".
+    :type scope: str
+    :param key: The idempotency key sent by the client.
+    :type key: str
+    :param request_fingerprint: The fingerprint of the current request body.
+    :type request_fingerprint: str
+    :return: The recorded response, or None if the key was never used.
+    :rtype: Optional[StoredResponse]
+    :raises IdempotencyConflict: If the key was used with another request body.
+    """
+    cached = _cache().get(_cache_key(scope, key))
+    if cached is not None:
+        stored_fingerprint, status_code, body = cached
+        _check(stored_fingerprint, request_fingerprint, key)
+        return StoredResponse(status_code, body)
+    row = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if row is None:
+        return None
+    _check(row.fingerprint, request_fingerprint, key)
+    _remember_in_cache(scope, key, row.fingerprint, row.status_code, row.response)
+    return StoredResponse(row.status_code, row.response)
+
+
+def _remember_in_cache(scope: str, key: str, request_fingerprint: str, status_code: int, body) -> None:
+    _cache().set(
+        _cache_key(scope, key), (request_fingerprint, status_code, body), settings.IDEMPOTENCY_CACHE_TTL
+    )
+
+
+def run(
+    scope: str, key: str, data, operation: Callable[[], Tuple[int, object, Optional[int]]]
+) -> Tuple[StoredResponse, bool]:
+    """
+    Runs a write operation at most once per idempotency key.
+
+    A key already used returns its recorded response without running the operation. Otherwise the
+    operation runs in a transaction together with the insert of the key, so the schedules and the
+    key are committed or rolled back together. When two requests race with the same key, the unique
+    constraint makes the loser roll back and replay the response of the winner.
+
+    Only successful responses are recorded: a rejected request can be corrected and retried with the same key.
+
+    :param scope: The endpoint, e.g. "create_schedule".
+    :type scope: str
+    :param key: The idempotency key sent by the client.
+    :type key: str
+    :param data: The parsed request body.
+    :param operation: Performs the request, returning its status code, its body and the id of the
+        schedule created, if exactly one was.
+    :return: The response and whether it was replayed.
+    :rtype: Tuple[StoredResponse, bool]
+    :raises IdempotencyConflict: If the key was used with another request body.
+    """
+    request_fingerprint = fingerprint(data)
+    stored = lookup(scope, key, request_fingerprint)
+    if stored is not None:
+        return stored, True
+    try:
+        with transaction.atomic():
+            status_code, body, schedule_id = operation()
+            if status_code >= 400:
+                return StoredResponse(status_code, body), False
+            # Plain JSON types, so the first response and its replays are rendered the same way.
+            body = json.loads(json.dumps(body, cls=JSONEncoder))
+            IdempotencyKey.objects.create(
+                scope=scope,
+                key=key,
+                fingerprint=request_fingerprint,
+                schedule_id=schedule_id,
+                status_code=status_code,
+                response=body,
+            )
+    except IntegrityError:
+        stored = lookup(scope, key, request_fingerprint)
+        if stored is None:
+            raise
+        return stored, True
+    transaction.on_commit(lambda: _remember_in_cache(scope, key, request_fingerprint, status_code, body))
+    return StoredResponse(status_code, body), False
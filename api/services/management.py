@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.settings import (
+    RABBIT_MQ_HOST,
+    RABBIT_MQ_USER,
+    RABBIT_MQ_PASSWORD,
+    RABBIT_MQ_MANAGEMENT_PORT,
+    RABBIT_MQ_MANAGEMENT_CACHE_TTL,
+    RABBIT_MQ_MANAGEMENT_TIMEOUT,
+    RABBIT_MQ_MANAGEMENT_POOL_SIZE,
+)
+
+class ManagementApiError(Exception):
+    """
+    Raised when the RabbitMQ management API cannot be reached or answers with an error.
+    """
+
+
+class ManagementResponse:
+    """
+    A management API response held by the cache.
+
+    Attributes:
+        data: The decoded JSON body.
+        etag (str): Strong validator of `data`, served as the ETag of our own endpoints.
+        upstream_etag (Optional[str]): The ETag sent by the broker, used for conditional refreshes.
+        fetched_at (float): `time.monotonic()` of the fetch.
+    """
+
+    __slots__ = ("data", "etag", "upstream_etag", "fetched_at")
+
+    def __init__(self, data: Any, upstream_etag: Optional[str] = None) -> None:
+        self.data = data
+        self.etag = '"%s"' % hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        self.upstream_etag = upstream_etag
+        self.fetched_at = time.monotonic()
+
+
+class _InFlight:
+    """
+    A fetch in progress, shared by every caller asking for the same path meanwhile.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: Optional[ManagementResponse] = None
+        self.error: Optional[BaseException] = None
+
+
+class ManagementApiClient:
+    """
+    Client of the RabbitMQ management HTTP API.
+
+    Requests go through one `requests.Session`, so TCP (and keep-alive) connections to the broker are
+    reused. Responses are cached for `ttl` seconds, and concurrent callers that miss the cache for the
+    same path wait for a single upstream request instead of each sending their own.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: tuple,
+        ttl: float = 5.0,
+        timeout: float = 10.0,
+        pool_size: int = 4,
+    ) -> None:
+        """
+        :param base_url: The root of the management API, e.g. `http://rabbitmq:15672/api`.
+        :type base_url: str
+        :param auth: The (user, password) pair used for basic authentication.
+        :type auth: tuple
+        :param ttl: Seconds a response is served from the cache (0 disables caching).
+        :type ttl: float
+        :param timeout: Seconds to wait for the management API.
+        :type timeout: float
+        :param pool_size: Maximum keep-alive connections kept open to the broker.
+        :type pool_size: int
+        """
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache: Dict[str, ManagementResponse] = {}
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _fresh(self, cached: Optional[ManagementResponse]) -> bool:
+        return cached is not None and time.monotonic() - cached.fetched_at < self.ttl
+
+    def _fetch(self, path: str, stale: Optional[ManagementResponse]) -> ManagementResponse:
+        headers = {}
+        if stale is not None and stale.upstream_etag:
+            headers["If-None-Match"] = stale.upstream_etag
+        try:
+            response = self.session.get(f"{self.base_url}/{path}", headers=headers, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise ManagementApiError(f"Failed to reach the management API: {exc}") from exc
+        if response.status_code == 304 and stale is not None:
+            stale.fetched_at = time.monotonic()
+            return stale
+        if response.status_code != 200:
+            raise ManagementApiError(f"Failed to retrieve {path}: {response.status_code} - {response.text}")
+        return ManagementResponse(response.json(), response.headers.get("ETag"))
+
+    def get(self, path: str) -> ManagementResponse:
+        """
+        Returns the response of a management API path, from the cache when it is still fresh.
+
+        :param path: The path below `/api`, e.g. "queues".
+        :type path: str
+        :rtype: ManagementResponse
+        :raises ManagementApiError: If the management API fails.
+        """
+        with self._lock:
+            cached = self._cache.get(path)
+            if self._fresh(cached):
+                return cached
+            call = self._in_flight.get(path)
+            leader = call is None
+            if leader:
+                call = self._in_flight[path] = _InFlight()
+                generation = self._generation
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self._fetch(path, cached)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                # A response fetched before an invalidation may predate the change that caused it.
+                if call.response is not None and generation == self._generation:
+                    self._cache[path] = call.response
+                del self._in_flight[path]
+            call.done.set()
+        return call.response
+
+    def post(self, path: str, payload: Dict) -> Any:
+        """
+        Sends a POST request to the management API, bypassing the cache.
+
+        :param path: The path below `/api`, e.g. "queues/%2F/orders/get".
+        :type path: str
+        :param payload: The JSON body.
+        :type payload: Dict
+        :return: The decoded JSON response.
+        :raises ManagementApiError: If the management API fails.
+        """
+        try:
+            response = self.session.post(f"{self.base_url}/{path}", json=payload, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise ManagementApiError(f"Failed to reach the management API: {exc}") from exc
+        if response.status_code != 200:
+            raise ManagementApiError(f"Failed to post to {path}: {response.status_code} - {response.text}")
+        return response.json()
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        Drops a cached path, or every cached path, so the next call goes to the broker.
+
+        :param path: The path to forget, or None for all of them.
+        :type path: Optional[str]
+        """
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(path, None)
+
+    def close(self) -> None:
+        """
+        Closes the pooled HTTP connections.
+        """
+        self.session.close()
+
+
+_client: Optional[ManagementApiClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_management_client() -> ManagementApiClient:
+    """
+    Returns the management API client of the current process, creating it on first use.
+
+    Like the AMQP connection pool, the client is rebuilt after a fork so that worker processes
+    never share sockets with their parent.
+
+    :rtype: ManagementApiClient
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = ManagementApiClient(
+                    f"http://{RABBIT_MQ_HOST}:{RABBIT_MQ_MANAGEMENT_PORT}/api",
+                    auth=(RABBIT_MQ_USER, RABBIT_MQ_PASSWORD),
+                    ttl=RABBIT_MQ_MANAGEMENT_CACHE_TTL,
+                    timeout=RABBIT_MQ_MANAGEMENT_TIMEOUT,
+                    pool_size=RABBIT_MQ_MANAGEMENT_POOL_SIZE,
+                )
+                _client_pid = pid
+    return _client
@@ -0,0 +1,377 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker
+
+from api.services.broker import BrokerBackend, Delivery, QueueConsumer
+from api.services.management import ManagementApiError, ManagementResponse
+from api.services.topology import ExchangeSpec, QueueSpec
+
+DEFAULT_EXCHANGES = {"": "direct", "amq.direct": "direct", "amq.fanout": "fanout", "amq.topic": "topic"}
+
+# A queued message: exchange, routing key, JSON payload and headers.
+Message = Tuple[str, str, str, Dict]
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """
+    Whether a topic binding key matches a routing key, where `*` stands for exactly one word and `#` for zero or more.
+
+    :param pattern: The binding key, e.g. "sms.*.br" or "email.#".
+    :type pattern: str
+    :param routing_key: The routing key of the message.
+    :type routing_key: str
+    :rtype: bool
+    """
+    words = routing_key.split(".") if routing_key else []
+
+    def match(p: List[str], w: List[str]) -> bool:
+        if not p:
+            return not w
+        if p[0] == "#":
+            return any(match(p[1:], w[i:]) for i in range(len(w) + 1))
+        return bool(w) and p[0] in ("*", w[0]) and match(p[1:], w[1:])
+
+    return match(pattern.split(".") if pattern else [], words)
+
+
+class InMemoryConsumer(QueueConsumer):
+    """
+    Consumer of a queue of the in-memory broker, see `InMemoryBroker.open_consumer`.
+
+    `fetch` returns what the queue holds right away, and only sleeps for `timeout` when it is empty.
+    Rejected messages go to the dead-letter exchange of the queue, if it has one, or are dropped.
+    """
+
+    def __init__(self, broker: "InMemoryBroker", queue_name: str, prefetch_count: int) -> None:
+        self.broker = broker
+        self.queue_name = queue_name
+        self.prefetch_count = prefetch_count
+        self._unsettled: Dict[int, Message] = {}
+        self._next_tag = 1
+
+    def fetch(self, max_count: int, timeout: float) -> List[Delivery]:
+        deliveries = []
+        with self.broker._lock:
+            self.broker._check_connection()
+            queue = self.broker.queues[self.queue_name]
+            while queue and len(deliveries) < max_count and len(self._unsettled) < self.prefetch_count:
+                message = queue.popleft()
+                self._unsettled[self._next_tag] = message
+                deliveries.append(Delivery(self._next_tag, message[2].encode(), False, message[3]))
+                self._next_tag += 1
+        if not deliveries and timeout > 0:
+            time.sleep(timeout)
+        return deliveries
+
+    def settle(self, acked: List[int], rejected: List[int]) -> None:
+        with self.broker._lock:
+            self.broker._check_connection()
+            for tag in acked:
+                self._unsettled.pop(tag, None)
+            for tag in rejected:
+                message = self._unsettled.pop(tag, None)
+                if message is not None:
+                    self.broker._dead_letter(self.queue_name, message)
+
+    def close(self) -> None:
+        with self.broker._lock:
+            queue = self.broker.queues.get(self.queue_name)
+            if queue is not None:
+                queue.extendleft(reversed(list(self._unsettled.values())))
+            self._unsettled = {}
+
+
+class InMemoryBroker(BrokerBackend):
+    """
+    A broker living inside the process, with the exchange, queue and binding semantics of RabbitMQ.
+
+    Direct, fanout and topic exchanges route to bound queues; the default exchange ("") routes to
+    the queue named by the routing key. Publishing to a missing exchange fails like a channel closed
+    by the broker (404), and unroutable messages are dropped or, when mandatory, reported as not
+    confirmed. Messages are JSON encoded on publish, so bodies the AMQP backend rejects are rejected
+    here too. Attributes and arguments given to `declare_topology` are listed by `management_get`;
+    of the arguments, only `x-dead-letter-exchange` and `x-dead-letter-routing-key` are enforced.
+
+    It is meant for tests and for load testing the API and the dispatcher on one machine: select it
+    with `BROKER_BACKEND = "api.services.memory_broker.InMemoryBroker"`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops every exchange, queue, binding and message, and reconnects.
+        """
+        with self._lock:
+            self.exchanges: Dict[str, str] = dict(DEFAULT_EXCHANGES)
+            self.queues: Dict[str, Deque[Message]] = {}
+            self.bindings: List[Tuple[str, str, str]] = []
+            # Attributes of exchanges and queues declared through `declare_topology`, by (kind, name).
+            self.attributes: Dict[Tuple[str, str], Dict] = {}
+            self.published = 0
+            self.connected = True
+
+    def disconnect(self) -> None:
+        """
+        Simulates a broker outage: every operation raises AMQPConnectionError until `connect` is called.
+        """
+        self.connected = False
+
+    def connect(self) -> None:
+        """
+        Ends a simulated outage.
+        """
+        self.connected = True
+
+    def _check_connection(self) -> None:
+        if not self.connected:
+            raise AMQPConnectionError("The in-memory broker is disconnected.")
+
+    def _not_found(self, kind: str, name: str) -> ChannelClosedByBroker:
+        return ChannelClosedByBroker(404, f"NOT_FOUND - no {kind} '{name}' in vhost '/'")
+
+    def create_exchange(self, exchange_name: str, exchange_type: str = "direct") -> None:
+        """
+        Creates an exchange; declaring an existing one again is a no-op.
+
+        :param exchange_name: The name of the exchange to be created.
+        :type exchange_name: str
+        :param exchange_type: "direct", "fanout" or "topic".
+        :type exchange_type: str
+        :raises pika.exceptions.ChannelClosedByBroker: If the exchange exists with another type.
+        """
+        with self._lock:
+            self._check_connection()
+            current = self.exchanges.setdefault(exchange_name, exchange_type)
+            if current != exchange_type:
+                raise ChannelClosedByBroker(
+                    406, f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange '{exchange_name}'"
+                )
+
+    def create_queue(self, queue_name: str) -> None:
+        with self._lock:
+            self._check_connection()
+            self.queues.setdefault(queue_name, deque())
+
+    def declare_topology(self, declarations: List) -> List[Optional[str]]:
+        errors = []
+        for declaration in declarations:
+            try:
+                if isinstance(declaration, ExchangeSpec):
+                    self.create_exchange(declaration.name, declaration.type)
+                    key = ("exchange", declaration.name)
+                elif isinstance(declaration, QueueSpec):
+                    self.create_queue(declaration.name)
+                    key = ("queue", declaration.name)
+                else:
+                    self.queue_bind(declaration.exchange, declaration.queue, declaration.routing_key)
+                    key = None
+            except ChannelClosedByBroker as exc:
+                errors.append(f"{exc.reply_code} - {exc.reply_text}")
+                continue
+            if key is not None:
+                attributes = declaration._asdict()
+                for field in ("name", "type"):
+                    attributes.pop(field, None)
+                with self._lock:
+                    self.attributes.setdefault(key, attributes)
+            errors.append(None)
+        return errors
+
+    def queue_bind(self, exchange_name: str, queue_name: str, rout_key_name: str) -> None:
+        with self._lock:
+            self._check_connection()
+            if exchange_name not in self.exchanges:
+                raise self._not_found("exchange", exchange_name)
+            if queue_name not in self.queues:
+                raise self._not_found("queue", queue_name)
+            binding = (exchange_name, queue_name, rout_key_name)
+            if binding not in self.bindings:
+                self.bindings.append(binding)
+
+    def _route(self, exchange_name: str, rout_key_name: str) -> List[str]:
+        if exchange_name == "":
+            return [rout_key_name] if rout_key_name in self.queues else []
+        exchange_type = self.exchanges[exchange_name]
+        routed = []
+        for source, queue_name, binding_key in self.bindings:
+            if source != exchange_name or queue_name in routed:
+                continue
+            if (
+                exchange_type == "fanout"
+                or (exchange_type == "direct" and binding_key == rout_key_name)
+                or (exchange_type == "topic" and topic_matches(binding_key, rout_key_name))
+            ):
+                routed.append(queue_name)
+        return routed
+
+    def _publish(self, exchange_name: str, rout_key_name: str, body: Dict, headers: Optional[Dict] = None) -> bool:
+        if exchange_name not in self.exchanges:
+            raise self._not_found("exchange", exchange_name)
+        return self._enqueue(exchange_name, rout_key_name, json.dumps(body), headers or {})
+
+    def _enqueue(self, exchange_name: str, rout_key_name: str, payload: str, headers: Dict) -> bool:
+        queues = self._route(exchange_name, rout_key_name)
+        for queue_name in queues:
+            self.queues[queue_name].append((exchange_name, rout_key_name, payload, headers))
+        self.published += 1
+        return bool(queues)
+
+    def _dead_letter(self, queue_name: str, message: Message) -> None:
+        # Called with the lock held. Like RabbitMQ, prepends an x-death entry and republishes the
+        # message to the dead-letter exchange of the queue, if it has one; otherwise drops it.
+        arguments = self.attributes.get(("queue", queue_name), {}).get("arguments") or {}
+        target = arguments.get("x-dead-letter-exchange")
+        if target is None or target not in self.exchanges:
+            return
+        exchange_name, rout_key_name, payload, headers = message
+        death = {
+            "queue": queue_name, "reason": "rejected", "count": 1,
+            "exchange": exchange_name, "routing-keys": [rout_key_name],
+        }
+        self._enqueue(
+            target,
+            arguments.get("x-dead-letter-routing-key", rout_key_name),
+            payload,
+            dict(headers, **{"x-death": [death] + list(headers.get("x-death", []))}),
+        )
+
+    def send_message(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
+        with self._lock:
+            self._check_connection()
+            self._publish(exchange_name, rout_key_name, body)
+
+    def send_messages(self, messages: Iterable[Tuple[str, str, Dict]]) -> int:
+        with self._lock:
+            self._check_connection()
+            count = 0
+            for exchange_name, rout_key_name, body in messages:
+                self._publish(exchange_name, rout_key_name, body)
+                count += 1
+            return count
+
+    def send_messages_confirmed(
+        self, messages: Iterable[Tuple], mandatory: bool = False
+    ) -> List[Optional[bool]]:
+        """
+        Like `RabbitmqService`, messages sent to a missing exchange are refused without affecting the others.
+        """
+        results = []
+        with self._lock:
+            self._check_connection()
+            for exchange_name, rout_key_name, body, *headers in messages:
+                try:
+                    routed = self._publish(exchange_name, rout_key_name, body, *headers)
+                except ChannelClosedByBroker:
+                    results.append(False)
+                else:
+                    results.append(routed or not mandatory)
+        return results
+
+    async def apublish(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
+        # Nothing here blocks, so there is no need for a worker thread.
+        self.send_message(exchange_name, rout_key_name, body)
+
+    def drain(self, queue_name: str, count: Optional[int] = None) -> List[Dict]:
+        """
+        Removes messages from the head of a queue.
+
+        :param queue_name: The queue to read.
+        :type queue_name: str
+        :param count: The maximum number of messages, or None for all of them.
+        :type count: Optional[int]
+        :return: The messages, each with its exchange, routing key and decoded body.
+        :rtype: List[Dict]
+        :raises pika.exceptions.ChannelClosedByBroker: If the queue does not exist.
+        """
+        with self._lock:
+            self._check_connection()
+            if queue_name not in self.queues:
+                raise self._not_found("queue", queue_name)
+            queue = self.queues[queue_name]
+            taken = len(queue) if count is None else min(count, len(queue))
+            messages = [queue.popleft() for _ in range(taken)]
+        return [
+            {"exchange": exchange_name, "routing_key": rout_key_name, "body": json.loads(payload)}
+            for exchange_name, rout_key_name, payload, _ in messages
+        ]
+
+    def peek_messages(self, queue_name: str, count: int) -> List[Dict]:
+        with self._lock:
+            self._check_connection()
+            queue = self.queues.get(queue_name)
+            if queue is None:
+                raise ManagementApiError(f"Failed to post to queues/%2F/{queue_name}/get: 404 - Not Found")
+            messages = list(queue)[:count]
+            return [
+                {
+                    "payload": payload,
+                    "payload_encoding": "string",
+                    "payload_bytes": len(payload),
+                    "exchange": exchange_name,
+                    "routing_key": rout_key_name,
+                    "redelivered": True,
+                    "message_count": len(queue) - index - 1,
+                    "properties": {"delivery_mode": 2, "headers": headers},
+                }
+                for index, (exchange_name, rout_key_name, payload, headers) in enumerate(messages)
+            ]
+
+    def open_consumer(self, queue_name: str, prefetch_count: int) -> QueueConsumer:
+        with self._lock:
+            self._check_connection()
+            if queue_name not in self.queues:
+                raise self._not_found("queue", queue_name)
+        return InMemoryConsumer(self, queue_name, prefetch_count)
+
+    def management_get(self, path: str) -> ManagementResponse:
+        with self._lock:
+            self._check_connection()
+            if path == "exchanges":
+                data = [
+                    {
+                        "name": name,
+                        "vhost": "/",
+                        "type": exchange_type,
+                        "durable": True,
+                        "auto_delete": False,
+                        "internal": False,
+                        "arguments": {},
+                        **self.attributes.get(("exchange", name), {}),
+                    }
+                    for name, exchange_type in self.exchanges.items()
+                ]
+            elif path == "queues":
+                data = [
+                    {
+                        "name": name,
+                        "vhost": "/",
+                        "durable": True,
+                        "auto_delete": False,
+                        "arguments": {},
+                        **self.attributes.get(("queue", name), {}),
+                        "messages": len(queue),
+                    }
+                    for name, queue in self.queues.items()
+                ]
+            elif path == "bindings":
+                data = [
+                    {
+                        "source": exchange_name,
+                        "vhost": "/",
+                        "destination": queue_name,
+                        "destination_type": "queue",
+                        "routing_key": rout_key_name,
+                        "arguments": {},
+                    }
+                    for exchange_name, queue_name, rout_key_name in self.bindings
+                ]
+            else:
+                raise ManagementApiError(f"Failed to retrieve {path}: 404 - Not Found")
+        return ManagementResponse(data)
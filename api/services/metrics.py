@@ -0,0 +1,374 @@
+import atexit
+import functools
+import glob
+import inspect
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+# Upper bounds, in seconds, of the latency buckets: 0.5ms to 10s.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+# Upper bounds, in seconds, of the delivery lag buckets: 100ms to 1h.
+LAG_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up, e.g. a number of errors. Summed across processes.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increments the counter of the given label values.
+
+        :param amount: The increment, which must not be negative.
+        :type amount: float
+        :param labels: One value per label name.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        registry.maybe_flush()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {json.dumps(key): value for key, value in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict[str, float], snapshot: Dict[str, float]) -> None:
+        for key, value in snapshot.items():
+            total[key] = total.get(key, 0) + value
+
+    def render(self, merged: Dict[str, float]) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, json.loads(key))} {_format_value(value)}"
+            for key, value in sorted(merged.items())
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Counts observations, e.g. latencies, into fixed buckets, keeping their sum and count.
+
+    Observing costs a binary search and an increment under a lock, and bucket counts from several
+    processes can be added up, unlike precomputed quantiles.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Records one observation.
+
+        :param value: The observed value, e.g. seconds.
+        :type value: float
+        :param labels: One value per label name.
+        """
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one for values above every bucket), sum and count.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+        registry.maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the seconds spent in the `with` block.
+
+        :param labels: One value per label name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {json.dumps(key): [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict[str, list], snapshot: Dict[str, list]) -> None:
+        for key, (counts, value_sum, count) in snapshot.items():
+            current = total.setdefault(key, [[0] * len(counts), 0.0, 0])
+            current[0] = [a + b for a, b in zip(current[0], counts)]
+            current[1] += value_sum
+            current[2] += count
+
+    def render(self, merged: Dict[str, list]) -> List[str]:
+        lines = []
+        for key, (counts, value_sum, count) in sorted(merged.items()):
+            values = json.loads(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {value_sum!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of the process, exposed in the Prometheus text format.
+
+    With `METRICS_DIR` set, each process periodically writes its values to its own file in that
+    directory (at most every `METRICS_FLUSH_INTERVAL` seconds, and at exit), and `render` adds up the
+    files of every process, so any worker can answer `/metrics` for all of them. Without it only
+    the values of the current process are exposed.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, _Metric] = {}
+        self._next_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def reset(self) -> None:
+        """
+        Zeroes every metric, e.g. in a freshly forked process so it does not report its parent's values again.
+        """
+        for metric in self.metrics.values():
+            metric.reset()
+        self._next_flush = 0.0
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def _path(self, directory: str) -> str:
+        return os.path.join(directory, f"metrics_{os.getpid()}.json")
+
+    def flush(self) -> None:
+        """
+        Writes the values of this process to its file in `METRICS_DIR`, if set.
+        """
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        with self._flush_lock:
+            self._next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+            os.makedirs(directory, exist_ok=True)
+            path = self._path(directory)
+            partial = f"{path}.partial"
+            with open(partial, "w") as metrics_file:
+                json.dump(self.snapshot(), metrics_file)
+            os.replace(partial, path)
+
+    def maybe_flush(self) -> None:
+        """
+        Flushes if the flush interval elapsed; called after every update, so it has to stay cheap.
+        """
+        if time.monotonic() >= self._next_flush and settings.METRICS_DIR:
+            self.flush()
+
+    def _snapshots(self) -> List[Dict[str, dict]]:
+        directory = settings.METRICS_DIR
+        if not directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, "metrics_*.json")):
+            try:
+                with open(path) as metrics_file:
+                    snapshots.append(json.load(metrics_file))
+            except (OSError, ValueError):
+                # A file being replaced or left truncated by a crash; the next scrape reads it.
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """
+        Renders the metrics of every process in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        merged: Dict[str, dict] = {name: {} for name in self.metrics}
+        for snapshot in self._snapshots():
+            for name, values in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    metric.merge(merged[name], values)
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(merged[name]))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry.reset)
+atexit.register(registry.flush)
+
+RABBITMQ_OPERATION_SECONDS = registry.register(Histogram(
+    "rabbitmq_operation_duration_seconds", "Duration of RabbitmqService operations.", ["operation"]
+))
+RABBITMQ_OPERATION_ERRORS = registry.register(Counter(
+    "rabbitmq_operation_errors_total", "RabbitmqService operations that raised an error.", ["operation"]
+))
+RABBITMQ_CONNECTIONS_OPENED = registry.register(Counter(
+    "rabbitmq_connections_opened_total", "AMQP connections opened, by client kind.", ["kind"]
+))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Duration of HTTP requests, by view.", ["view", "method"]
+))
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests, by view and response status.", ["view", "method", "status"]
+))
+HTTP_REQUEST_QUERIES = registry.register(Histogram(
+    "http_request_db_queries", "Database queries made by one HTTP request, by view.", ["view"], QUERY_COUNT_BUCKETS
+))
+SERIALIZER_SECONDS = registry.register(Histogram(
+    "serializer_duration_seconds", "Time spent validating and rendering serializers.", ["serializer", "phase"]
+))
+CONSUMER_MESSAGES = registry.register(Counter(
+    "consumer_messages_total", "Messages handled by the consume command, by outcome.", ["channel", "outcome"]
+))
+CONSUMER_LAG_SECONDS = registry.register(Histogram(
+    "consumer_lag_seconds", "Seconds between the scheduled datetime and the delivery, by channel.", ["channel"],
+    LAG_BUCKETS,
+))
+
+
+def track(histogram: Histogram, errors: Counter, **labels):
+    """
+    Decorates a function, or a coroutine function, to observe its duration and count the errors it raises.
+
+    :param histogram: Receives the duration of each call.
+    :type histogram: Histogram
+    :param errors: Incremented when a call raises.
+    :type errors: Counter
+    :param labels: The label values of both metrics.
+    """
+
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                except Exception:
+                    errors.inc(**labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                errors.inc(**labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+class QueryCounter:
+    """
+    Counts the database queries made while it is active in the current context.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Database execute wrapper incrementing the active QueryCounter, installed on every connection (see `api.signals`).
+
+    Context variables follow `sync_to_async`, so queries of async views run in worker threads are counted too.
+    """
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def counting_queries():
+    """
+    Activates a QueryCounter for the `with` block.
+
+    :return: The counter.
+    :rtype: QueryCounter
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
@@ -0,0 +1,157 @@
+import logging
+from datetime import timedelta
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import CommunicationSchedule, OutboxMessage
+from api.services import delay_tiers
+from api.services.broker import get_broker
+from api.services.transitions import apply_transition
+
+logger = logging.getLogger(__name__)
+
+# Dispatch modes publishing schedules through the outbox rather than the dispatcher.
+OUTBOX_DISPATCH_MODES = ("immediate", "delayed")
+
+
+def enqueue_schedules(schedules: Iterable, batch_size: int = None, broker=None) -> List[OutboxMessage]:
+    """
+    Writes the outbox messages of new schedules according to `SCHEDULE_DISPATCH_MODE`.
+
+    In "immediate" mode each message is published right away to the exchange of its schedule; in
+    "delayed" mode it is published to the delay tiers with the due time in its headers (see
+    `api.services.delay_tiers.route`), right away unless its delay exceeds the largest tier; schedules
+    whose exchange has no provisioned tiers (see `delay_tiers.provisioned`) are published to their
+    exchange at their due time instead. In "dispatcher" mode nothing is written, as the dispatcher
+    publishes the schedules itself.
+
+    :param schedules: The CommunicationSchedule instances created.
+    :type schedules: Iterable
+    :param batch_size: Rows per INSERT statement.
+    :type batch_size: int
+    :param broker: The broker backend whose delay tiers are checked, `get_broker()` by default.
+    :return: The outbox rows.
+    :rtype: List[OutboxMessage]
+    """
+    mode = settings.SCHEDULE_DISPATCH_MODE
+    if mode not in OUTBOX_DISPATCH_MODES:
+        return []
+    now = timezone.now()
+    schedules = list(schedules)
+    if mode == "delayed":
+        exchange_names = {schedule.exchange for schedule in schedules}
+        provisioned = delay_tiers.provisioned(broker or get_broker(), exchange_names)
+        if exchange_names - provisioned:
+            logger.warning(
+                "Exchanges %s have no delay tiers, their schedules wait in the outbox.",
+                sorted(exchange_names - provisioned),
+            )
+    rows = []
+    for schedule in schedules:
+        exchange_name, available_at, headers = schedule.exchange, now, None
+        if mode == "delayed":
+            if schedule.exchange in provisioned:
+                exchange_name, available_at, headers = delay_tiers.route(
+                    schedule.exchange, schedule.scheduled_datetime, now
+                )
+            else:
+                available_at = max(now, schedule.scheduled_datetime)
+        rows.append(OutboxMessage(
+            exchange=exchange_name,
+            routing_key=schedule.routing_key,
+            body={"id": schedule.id},
+            available_at=available_at,
+            headers=headers,
+        ))
+    return OutboxMessage.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """
+    How long a message waits before the next publish after `attempts` unconfirmed ones.
+
+    :param attempts: The publishes not confirmed so far, at least 1.
+    :type attempts: int
+    :rtype: timedelta
+    """
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** min(attempts - 1, 32)
+    return timedelta(seconds=min(delay, settings.OUTBOX_RETRY_MAX_DELAY))
+
+
+def relay_batch(service, batch_size: int) -> int:
+    """
+    Publishes and deletes one batch of outbox messages.
+
+    Only rows whose `available_at` passed are published, oldest first. Rows are claimed with
+    `SELECT ... FOR UPDATE SKIP LOCKED`, so several relays can drain the outbox in parallel without
+    publishing the same row twice. Messages are published with publisher confirms and only the rows
+    the broker acknowledged are deleted. The others stay in the outbox with their `available_at`
+    pushed back by `retry_delay`, so they do not hold up the rows behind them; a row refused
+    `OUTBOX_MAX_ATTEMPTS` times, e.g. for a missing exchange, is dropped and its schedule marked as
+    failed. The whole batch stays untouched if publishing fails.
+
+    :param service: The broker backend used to publish, see `get_broker()`.
+    :param batch_size: The maximum number of rows claimed at once.
+    :type batch_size: int
+    :return: The number of messages confirmed by the broker.
+    :rtype: int
+    """
+    with transaction.atomic():
+        rows = list(_claim_available().order_by("available_at", "id")[:batch_size])
+        return _publish(service, rows)
+
+
+def relay_messages(service, ids: Iterable[int]) -> int:
+    """
+    Publishes and deletes the given outbox messages, like `relay_batch`, unless a relay claimed them.
+
+    Used to publish the messages of new schedules right away: a message is claimed with the same
+    row lock as the relay's, so the two never publish it both, and it is deleted only once the
+    broker confirmed it; otherwise it is backed off and left to the relay.
+
+    :param service: The broker backend used to publish, see `get_broker()`.
+    :param ids: The ids of the outbox messages.
+    :type ids: Iterable[int]
+    :return: The number of messages confirmed by the broker.
+    :rtype: int
+    """
+    with transaction.atomic():
+        rows = list(_claim_available().filter(id__in=list(ids)).order_by("available_at", "id"))
+        return _publish(service, rows)
+
+
+def _claim_available():
+    return OutboxMessage.objects.select_for_update(skip_locked=True).filter(available_at__lte=timezone.now())
+
+
+def _publish(service, rows: List[OutboxMessage]) -> int:
+    # Publishes rows claimed in the current transaction, then deletes or backs off each of them.
+    if not rows:
+        return 0
+    confirmed = service.send_messages_confirmed((row.exchange, row.routing_key, row.body, row.headers) for row in rows)
+    now = timezone.now()
+    published, dropped, retried = [], [], []
+    for row, ok in zip(rows, confirmed):
+        if ok:
+            published.append(row.id)
+            continue
+        row.attempts += 1
+        if ok is False and row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            dropped.append(row)
+        else:
+            row.available_at = now + retry_delay(row.attempts)
+            retried.append(row)
+    OutboxMessage.objects.filter(id__in=published + [row.id for row in dropped]).delete()
+    if retried:
+        OutboxMessage.objects.bulk_update(retried, ["attempts", "available_at"])
+    if dropped:
+        logger.error(
+            "Dropped %s outbox messages refused %s times, e.g. to exchange %s.",
+            len(dropped), settings.OUTBOX_MAX_ATTEMPTS, dropped[0].exchange,
+        )
+        schedule_ids = [row.body["id"] for row in dropped if isinstance(row.body, dict) and "id" in row.body]
+        apply_transition(CommunicationSchedule.objects.filter(id__in=schedule_ids), "failed")
+    return len(published)
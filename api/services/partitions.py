@@ -0,0 +1,250 @@
+import gzip
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import List, NamedTuple, Optional
+
+from django.db import connection, transaction
+
+from api.models import CommunicationSchedule
+from api.services.reference_data import statuses
+
+# On PostgreSQL the schedule table is partitioned by month of `scheduled_datetime` (migration 0007):
+# one partition per UTC month, named like api_communicationschedule_p2024_11, plus a default
+# partition catching rows outside every monthly partition.
+TABLE = CommunicationSchedule._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+# Statuses a schedule never leaves, see api.services.transitions.
+FINAL_STATUSES = ("sent", "canceled")
+
+
+class Partition(NamedTuple):
+    """
+    A monthly partition of the schedule table, holding `start <= scheduled_datetime < end`.
+    """
+
+    name: str
+    start: datetime
+    end: datetime
+
+
+def month_start(value: datetime) -> datetime:
+    """
+    Returns the first instant of the UTC month of `value`.
+
+    :param value: An aware datetime.
+    :type value: datetime
+    :rtype: datetime
+    """
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """
+    Moves the first instant of a month by a number of months.
+
+    :param month: The first instant of a month, see `month_start`.
+    :type month: datetime
+    :param months: How many months to move, possibly negative.
+    :type months: int
+    :rtype: datetime
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_for(month: datetime) -> Partition:
+    """
+    Describes the partition holding the schedules of a month.
+
+    :param month: Any instant of the month.
+    :type month: datetime
+    :rtype: Partition
+    """
+    start = month_start(month)
+    return Partition(f"{TABLE}_p{start.year:04d}_{start.month:02d}", start, add_months(start, 1))
+
+
+def parse_partition_name(name: str) -> Optional[Partition]:
+    """
+    Recovers a partition from its name.
+
+    :param name: The name of the table.
+    :type name: str
+    :return: The partition, or None if the name is not one of a monthly partition.
+    :rtype: Optional[Partition]
+    """
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return partition_for(datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc))
+
+
+def expired(partitions: List[Partition], now: datetime, retention_months: int) -> List[Partition]:
+    """
+    Selects the partitions entirely older than the retention period.
+
+    :param partitions: The monthly partitions.
+    :type partitions: List[Partition]
+    :param now: The current time.
+    :type now: datetime
+    :param retention_months: Full months kept before the current one.
+    :type retention_months: int
+    :rtype: List[Partition]
+    """
+    cutoff = add_months(month_start(now), -retention_months)
+    return sorted((partition for partition in partitions if partition.end <= cutoff), key=lambda p: p.start)
+
+
+def is_partitioned() -> bool:
+    """
+    Whether the schedule table is partitioned, i.e. the database is PostgreSQL and migration 0007 ran.
+
+    :rtype: bool
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def attached_partitions() -> List[Partition]:
+    """
+    Lists the monthly partitions currently attached to the schedule table, oldest first.
+
+    :rtype: List[Partition]
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [TABLE],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    return sorted(filter(None, map(parse_partition_name, names)), key=lambda partition: partition.start)
+
+
+def detached_partitions() -> List[Partition]:
+    """
+    Lists monthly partitions detached by `detach_partition` but not archived yet, e.g. because the
+    archive failed halfway.
+
+    :rtype: List[Partition]
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition AND relname LIKE %s",
+            [f"{TABLE}\\_p%"],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    return sorted(filter(None, map(parse_partition_name, names)), key=lambda partition: partition.start)
+
+
+def create_partition(partition: Partition) -> bool:
+    """
+    Creates and attaches a monthly partition, unless it already exists.
+
+    Schedules of that month already stored in the default partition are moved into the new
+    partition in the same transaction, since PostgreSQL refuses to attach a partition whose range
+    still has rows in the default one.
+
+    :param partition: The partition to create, see `partition_for`.
+    :type partition: Partition
+    :return: Whether the partition was created.
+    :rtype: bool
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [partition.name])
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(f"CREATE TABLE {partition.name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE scheduled_datetime >= %s AND scheduled_datetime < %s RETURNING *) "
+            f"INSERT INTO {partition.name} SELECT * FROM moved",
+            [partition.start, partition.end],
+        )
+        # Partition bounds must be literals, so they are sent as ISO strings rather than timestamps.
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {partition.name} FOR VALUES FROM (%s) TO (%s)",
+            [partition.start.isoformat(), partition.end.isoformat()],
+        )
+    return True
+
+
+def ensure_partitions(now: datetime, months_ahead: int) -> List[Partition]:
+    """
+    Creates the partitions of the current month and of the next `months_ahead` months.
+
+    :param now: The current time.
+    :type now: datetime
+    :param months_ahead: Future months to create.
+    :type months_ahead: int
+    :return: The partitions created.
+    :rtype: List[Partition]
+    """
+    current = month_start(now)
+    partitions = [partition_for(add_months(current, months)) for months in range(months_ahead + 1)]
+    return [partition for partition in partitions if create_partition(partition)]
+
+
+def has_pending_schedules(partition: Partition) -> bool:
+    """
+    Whether a partition still holds schedules that are not sent or canceled.
+
+    :param partition: An attached or detached partition.
+    :type partition: Partition
+    :rtype: bool
+    """
+    final = [statuses.id_for(name) for name in FINAL_STATUSES]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {partition.name} WHERE NOT (status_id = ANY(%s)))", [final]
+        )
+        return cursor.fetchone()[0]
+
+
+def detach_partition(partition: Partition) -> None:
+    """
+    Detaches a partition, so queries on the schedule table no longer see its rows.
+
+    :param partition: An attached partition.
+    :type partition: Partition
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name}")
+
+
+def archive_partition(partition: Partition, directory: str) -> str:
+    """
+    Writes a detached partition to a gzip-compressed CSV file and drops it.
+
+    The file is written under a temporary name and renamed once complete, so a file named like a
+    partition is always a full archive; the table is only dropped after that.
+
+    :param partition: A detached partition.
+    :type partition: Partition
+    :param directory: Directory receiving the archive.
+    :type directory: str
+    :return: The path of the archive.
+    :rtype: str
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{partition.name}.csv.gz")
+    partial = f"{path}.partial"
+    with connection.cursor() as cursor:
+        with gzip.open(partial, "wb") as archive:
+            cursor.copy_expert(
+                f"COPY (SELECT * FROM {partition.name} ORDER BY scheduled_datetime, id) "
+                "TO STDOUT WITH (FORMAT csv, HEADER)",
+                archive,
+            )
+        os.replace(partial, path)
+        cursor.execute(f"DROP TABLE {partition.name}")
+    return path
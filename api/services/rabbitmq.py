@@ -1,44 +1,176 @@
-from typing import Dict
-import requests
-from core.settings import RABBIT_MQ_HOST, RABBIT_MQ_PORT, RABBIT_MQ_USER, RABBIT_MQ_PASSWORD
+import time
+from collections import deque
+from urllib.parse import quote
+from typing import Dict, Iterable, List, Optional, Tuple
+from core.settings import RABBIT_MQ_CONFIRM_TIMEOUT
+from api.services.async_rabbitmq import get_async_publisher, run_in_background_loop
+from api.services.broker import BrokerBackend, Delivery, QueueConsumer
+from api.services.connection_pool import ConnectionPool, build_connection_parameters, get_connection_pool
+from api.services.management import ManagementApiClient, ManagementResponse, get_management_client
+from api.services.metrics import (
+    RABBITMQ_CONNECTIONS_OPENED,
+    RABBITMQ_OPERATION_ERRORS,
+    RABBITMQ_OPERATION_SECONDS,
+    track,
+)
+from api.services.topology import ExchangeSpec, QueueSpec
 import pika
 import json
+from pika.exceptions import ChannelClosedByBroker
 
 
-class RabbitmqService:
+# Virtual host of the connections, as named in management API paths.
+MANAGEMENT_VHOST = "/"
+
+# Bytes of each payload returned by `peek_messages`; longer payloads are truncated by the broker.
+PEEK_TRUNCATE = 50000
+
+
+def _declare(channel, declaration) -> None:
+    if isinstance(declaration, ExchangeSpec):
+        channel.exchange_declare(
+            exchange=declaration.name,
+            exchange_type=declaration.type,
+            durable=declaration.durable,
+            auto_delete=declaration.auto_delete,
+            internal=declaration.internal,
+            arguments=declaration.arguments or None,
+        )
+    elif isinstance(declaration, QueueSpec):
+        channel.queue_declare(
+            queue=declaration.name,
+            durable=declaration.durable,
+            auto_delete=declaration.auto_delete,
+            arguments=declaration.arguments or None,
+        )
+    else:
+        channel.queue_bind(
+            queue=declaration.queue,
+            exchange=declaration.exchange,
+            routing_key=declaration.routing_key,
+            arguments=declaration.arguments or None,
+        )
+
+
+def _tracked(operation: str):
+    # Latency histogram and error counter per operation, see api.services.metrics.
+    return track(RABBITMQ_OPERATION_SECONDS, RABBITMQ_OPERATION_ERRORS, operation=operation)
+
+
+class RabbitmqConsumer(QueueConsumer):
+    """
+    Consumes a queue on a dedicated blocking connection, see `RabbitmqService.open_consumer`.
+
+    Messages pushed by the broker (up to the prefetch count) are buffered by the consumer callback
+    and handed out by `fetch`; `settle` acknowledges a batch with a single `basic_ack(multiple=True)`
+    whenever the acknowledged tags are all the unsettled tags up to the last one.
+    """
+
+    def __init__(self, parameters: pika.ConnectionParameters, queue_name: str, prefetch_count: int) -> None:
+        """
+        :param parameters: The connection parameters used to reach the broker.
+        :type parameters: pika.ConnectionParameters
+        :param queue_name: The queue to consume.
+        :type queue_name: str
+        :param prefetch_count: The maximum number of unsettled messages.
+        :type prefetch_count: int
+        :raises pika.exceptions.AMQPError: If the broker cannot be reached or the queue does not exist.
+        """
+        self._connection = pika.BlockingConnection(parameters)
+        RABBITMQ_CONNECTIONS_OPENED.inc(kind="consumer")
+        self._buffer = deque()
+        self._unsettled = set()
+        try:
+            self._channel = self._connection.channel()
+            self._channel.basic_qos(prefetch_count=prefetch_count)
+            self._channel.basic_consume(queue_name, self._on_message)
+        except Exception:
+            self.close()
+            raise
+
+    def _on_message(self, channel, method, properties, body) -> None:
+        self._unsettled.add(method.delivery_tag)
+        self._buffer.append(Delivery(method.delivery_tag, body, method.redelivered, properties.headers or {}))
+
+    def fetch(self, max_count: int, timeout: float) -> List[Delivery]:
+        deadline = time.monotonic() + timeout
+        while len(self._buffer) < max_count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._connection.process_data_events(time_limit=remaining)
+        return [self._buffer.popleft() for _ in range(min(max_count, len(self._buffer)))]
+
+    def settle(self, acked: List[int], rejected: List[int]) -> None:
+        for tag in rejected:
+            self._channel.basic_nack(delivery_tag=tag, requeue=False)
+            self._unsettled.discard(tag)
+        if not acked:
+            return
+        last = max(acked)
+        acked = set(acked)
+        if all(tag in acked for tag in self._unsettled if tag <= last):
+            self._channel.basic_ack(delivery_tag=last, multiple=True)
+        else:
+            for tag in sorted(acked):
+                self._channel.basic_ack(delivery_tag=tag)
+        self._unsettled -= acked
+
+    def close(self) -> None:
+        if self._connection.is_open:
+            try:
+                self._connection.close()
+            except pika.exceptions.AMQPError:
+                pass
+
+
+class RabbitmqService(BrokerBackend):
     """
     A class to interact with RabbitMQ server for creating exchanges, queues, and sending messages.
+
+    This is the default broker backend (see `api.services.broker`).
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        management_client: Optional[ManagementApiClient] = None,
+    ) -> None:
         """
-        Initializes the RabbitmqService class, setting up the connection parameters and creating a channel.
+        Initializes the RabbitmqService class.
 
-        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        No connection is opened here: AMQP operations run on channels borrowed from the
+        process-wide connection pool, which opens connections on demand and keeps them alive.
+
+        :param pool: The connection pool to use instead of the process-wide one.
+        :type pool: Optional[ConnectionPool]
+        :param management_client: The management API client to use instead of the process-wide one.
+        :type management_client: Optional[ManagementApiClient]
         """
-        self.__host = RABBIT_MQ_HOST
-        self.__port = RABBIT_MQ_PORT
-        self.__user = RABBIT_MQ_USER
-        self.__password = RABBIT_MQ_PASSWORD
+        self._pool = pool
+        self._management_client = management_client
 
-    def create_channel(self):
+    @property
+    def management_client(self) -> ManagementApiClient:
         """
-        Creates a new channel for communication with RabbitMQ.
+        The management API client used by this service.
 
-        :return: The created channel for communication with RabbitMQ.
-        :rtype: pika.BlockingChannel
+        :rtype: ManagementApiClient
         """
-        connection_parameters = pika.ConnectionParameters(
-            host=self.__host,
-            port=self.__port,
-            credentials=pika.PlainCredentials(
-                username=self.__user,
-                password=self.__password
-            )
-        )
-        channel = pika.BlockingConnection(connection_parameters).channel()
-        return channel
+        return self._management_client or get_management_client()
+
+    def run(self, operation):
+        """
+        Runs an operation on a pooled channel, transparently reconnecting once if the connection was lost.
 
+        :param operation: A callable receiving an open `pika.BlockingChannel`.
+        :type operation: Callable
+        :return: Whatever the operation returns.
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        """
+        return (self._pool or get_connection_pool()).run(operation)
+
+    @_tracked("create_exchange")
     def create_exchange(self, exchange_name: str) -> None:
         """
         Creates an exchange on the RabbitMQ server.
@@ -47,10 +179,10 @@ class RabbitmqService:
         :type exchange_name: str
         :raises pika.exceptions.AMQPChannelError: If the channel creation fails.
         """
-        channel = self.create_channel()
-        channel.exchange_declare(exchange=exchange_name, durable=True)
-        channel.close()
+        self.run(lambda channel: channel.exchange_declare(exchange=exchange_name, durable=True))
+        self.management_client.invalidate("exchanges")
 
+    @_tracked("create_queue")
     def create_queue(self, queue_name: str) -> None:
         """
         Creates a queue on the RabbitMQ server.
@@ -59,10 +191,10 @@ class RabbitmqService:
         :type queue_name: str
         :raises pika.exceptions.AMQPChannelError: If the queue creation fails.
         """
-        channel = self.create_channel()
-        channel.queue_declare(queue=queue_name, durable=True)
-        channel.close()
+        self.run(lambda channel: channel.queue_declare(queue=queue_name, durable=True))
+        self.management_client.invalidate("queues")
 
+    @_tracked("queue_bind")
     def queue_bind(
         self, exchange_name: str, queue_name: str, rout_key_name: str
     ) -> None:
@@ -77,12 +209,43 @@ class RabbitmqService:
         :type rout_key_name: str
         :raises pika.exceptions.AMQPChannelError: If the binding fails.
         """
-        channel = self.create_channel()
-        channel.queue_bind(
-            exchange=exchange_name, queue=queue_name, routing_key=rout_key_name
+        self.run(
+            lambda channel: channel.queue_bind(
+                exchange=exchange_name, queue=queue_name, routing_key=rout_key_name
+            )
         )
-        channel.close()
+        self.management_client.invalidate("bindings")
 
+    @_tracked("declare_topology")
+    def declare_topology(self, declarations: List) -> List[Optional[str]]:
+        """
+        Declares exchanges, queues and bindings in order, over a single pooled channel.
+
+        A declaration refused by the broker closes the channel; the channel is reopened on the same
+        connection and the following declarations still go through.
+
+        :param declarations: `ExchangeSpec`, `QueueSpec` and `BindingSpec` instances, see `api.services.topology`.
+        :type declarations: List
+        :return: For each declaration, None if it succeeded, otherwise the error of the broker.
+        :rtype: List[Optional[str]]
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
+        """
+        errors = []
+        try:
+            with (self._pool or get_connection_pool()).connection() as connection:
+                for declaration in declarations:
+                    try:
+                        _declare(connection.channel(), declaration)
+                    except ChannelClosedByBroker as exc:
+                        errors.append(f"{exc.reply_code} - {exc.reply_text}")
+                    else:
+                        errors.append(None)
+        finally:
+            for path in ("exchanges", "queues", "bindings"):
+                self.management_client.invalidate(path)
+        return errors
+
+    @_tracked("send_message")
     def send_message(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
         """
         Sends a message to an exchange with a specific routing key.
@@ -95,45 +258,127 @@ class RabbitmqService:
         :type body: Dict
         :raises pika.exceptions.AMQPChannelError: If sending the message fails.
         """
-        channel = self.create_channel()
-        channel.basic_publish(
-            exchange=exchange_name,
-            routing_key=rout_key_name,
-            body=json.dumps(body),
-            properties=pika.BasicProperties(delivery_mode=2),
+        self.run(
+            lambda channel: channel.basic_publish(
+                exchange=exchange_name,
+                routing_key=rout_key_name,
+                body=json.dumps(body),
+                properties=pika.BasicProperties(delivery_mode=2),
+            )
         )
-        channel.close()
 
-    def list_exchanges(self) -> list:
+    @_tracked("send_messages")
+    def send_messages(self, messages: Iterable[Tuple[str, str, Dict]]) -> int:
         """
-        Retrieves the list of exchanges from the RabbitMQ server.
+        Sends several messages over a single pooled channel.
 
-        :return: A list of exchanges on the RabbitMQ server.
-        :rtype: list
-        :raises Exception: If the request to retrieve exchanges fails.
+        :param messages: Tuples of (exchange name, routing key, body) to be published in order.
+        :type messages: Iterable[Tuple[str, str, Dict]]
+        :return: The number of messages published.
+        :rtype: int
+        :raises pika.exceptions.AMQPChannelError: If sending the messages fails.
         """
-        url = f'http://{self.__host}:15672/api/exchanges'
-        response = requests.get(url, auth=(self.__user, self.__password))
+        messages = list(messages)
+        properties = pika.BasicProperties(delivery_mode=2)
 
-        if response.status_code == 200:
-            exchanges = response.json()
-            return exchanges
-        else:
-            raise Exception(f"Failed to retrieve exchanges: {response.status_code} - {response.text}")
+        def publish(channel):
+            for exchange_name, rout_key_name, body in messages:
+                channel.basic_publish(
+                    exchange=exchange_name,
+                    routing_key=rout_key_name,
+                    body=json.dumps(body),
+                    properties=properties,
+                )
+            return len(messages)
+
+        return self.run(publish)
 
-    def list_queues(self) -> list:
+    @_tracked("send_messages_confirmed")
+    def send_messages_confirmed(
+        self, messages: Iterable[Tuple], mandatory: bool = False
+    ) -> List[Optional[bool]]:
         """
-        Retrieves the list of queues from the RabbitMQ server.
+        Sends several messages with publisher confirms, keeping many unconfirmed messages in flight.
 
-        :return: A list of queues on the RabbitMQ server.
-        :rtype: list
-        :raises Exception: If the request to retrieve queues fails.
+        The messages go through the process-wide asyncio connection, so acks and nacks are pipelined
+        instead of costing a round trip per message; see `AsyncRabbitmqPublisher.publish_confirmed`.
+
+        :param messages: Tuples of (exchange name, routing key, body), optionally followed by the
+            message headers, to be published in order.
+        :type messages: Iterable[Tuple]
+        :param mandatory: Treat messages the broker cannot route to any queue as refused.
+        :type mandatory: bool
+        :return: For each message, True if the broker confirmed it, False if it refused it (nack,
+            unroutable with `mandatory`, or missing exchange), None if its fate is unknown, e.g. the
+            connection was lost or the confirm did not arrive in time; publishing it again may succeed.
+        :rtype: List[Optional[bool]]
+        :raises pika.exceptions.AMQPConnectionError: If the connection to RabbitMQ fails.
         """
-        url = f'http://{self.__host}:15672/api/queues'
-        response = requests.get(url, auth=(self.__user, self.__password))
+        messages = list(messages)
 
-        if response.status_code == 200:
-            queues = response.json()
-            return queues
-        else:
-            raise Exception(f"Failed to retrieve queues: {response.status_code} - {response.text}")
+        async def publish():
+            return await get_async_publisher().publish_confirmed(
+                messages, mandatory=mandatory, timeout=RABBIT_MQ_CONFIRM_TIMEOUT
+            )
+
+        return run_in_background_loop(publish())
+
+    @_tracked("apublish")
+    async def apublish(self, exchange_name: str, rout_key_name: str, body: Dict) -> None:
+        """
+        Sends a message from async code through the event loop's own AMQP connection, without a worker thread.
+
+        :param exchange_name: The name of the exchange where the message will be sent.
+        :type exchange_name: str
+        :param rout_key_name: The routing key used to route the message.
+        :type rout_key_name: str
+        :param body: The message body to be sent, which will be serialized to JSON.
+        :type body: Dict
+        :raises pika.exceptions.AMQPError: If the message cannot be published.
+        """
+        await get_async_publisher().publish(exchange_name, rout_key_name, body)
+
+    @_tracked("open_consumer")
+    def open_consumer(self, queue_name: str, prefetch_count: int) -> QueueConsumer:
+        """
+        Starts consuming a queue on a connection of its own, so a slow consumer never holds a pooled connection.
+
+        :param queue_name: The queue to consume.
+        :type queue_name: str
+        :param prefetch_count: The maximum number of unsettled messages the broker sends (`basic_qos`).
+        :type prefetch_count: int
+        :rtype: QueueConsumer
+        :raises pika.exceptions.AMQPError: If the broker cannot be reached or the queue does not exist.
+        """
+        return RabbitmqConsumer(build_connection_parameters(), queue_name, prefetch_count)
+
+    @_tracked("peek_messages")
+    def peek_messages(self, queue_name: str, count: int) -> List[Dict]:
+        """
+        Returns messages from the head of a queue through the management API, with the `ack_requeue_true`
+        ack mode: the broker requeues them in place, so they stay in the queue (flagged as redelivered).
+
+        :param queue_name: The queue to read.
+        :type queue_name: str
+        :param count: The maximum number of messages.
+        :type count: int
+        :rtype: List[Dict]
+        :raises ManagementApiError: If the request to the management API fails.
+        """
+        return self.management_client.post(
+            f"queues/{quote(MANAGEMENT_VHOST, safe='')}/{quote(queue_name, safe='')}/get",
+            {"count": count, "ackmode": "ack_requeue_true", "encoding": "auto", "truncate": PEEK_TRUNCATE},
+        )
+
+    @_tracked("management_get")
+    def management_get(self, path: str) -> ManagementResponse:
+        """
+        Retrieves a resource of the RabbitMQ management API through the cached, pooled client.
+
+        :param path: The path below `/api`, e.g. "queues".
+        :type path: str
+        :return: The response, with its data and ETag.
+        :rtype: ManagementResponse
+        :raises ManagementApiError: If the request to the management API fails.
+        """
+        return self.management_client.get(path)
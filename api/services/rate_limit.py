@@ -0,0 +1,197 @@
+import math
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.services.reference_data import channels
+
+
+class TokenBucket:
+    """
+    Token bucket of a channel: it holds up to `burst` tokens and gains `rate` tokens per second.
+
+    Tokens may go negative: `reserve` hands out future send slots instead of refusing, which
+    spreads a burst of messages over time at the channel rate rather than dropping any.
+    """
+
+    def __init__(self, rate: float, burst: int, tokens: Optional[float] = None, updated: float = 0.0) -> None:
+        """
+        :param rate: Tokens gained per second.
+        :type rate: float
+        :param burst: Maximum tokens held, i.e. messages sent back to back after an idle period.
+        :type burst: int
+        :param tokens: The current tokens, by default a full bucket.
+        :type tokens: Optional[float]
+        :param updated: The timestamp at which `tokens` was current.
+        :type updated: float
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst) if tokens is None else tokens
+        self.updated = updated
+
+    def configure(self, rate: float, burst: int) -> None:
+        """
+        Applies a changed limit, keeping the tokens already accumulated up to the new burst.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = min(self.tokens, float(burst))
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, count: int, now: float) -> float:
+        """
+        Takes tokens for `count` messages if the bucket allows it.
+
+        A request larger than the burst is let through once the bucket is full and leaves the
+        bucket in debt, so it is delayed rather than refused forever.
+
+        :param count: The number of messages.
+        :type count: int
+        :param now: The current timestamp.
+        :type now: float
+        :return: 0 if the tokens were taken, otherwise the seconds to wait before retrying.
+        :rtype: float
+        """
+        self._refill(now)
+        needed = min(float(count), float(self.burst))
+        if self.tokens >= needed:
+            self.tokens -= count
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def reserve(self, now: float) -> float:
+        """
+        Reserves the next send slot of one message.
+
+        :param now: The current timestamp.
+        :type now: float
+        :return: The timestamp at which the message may be sent, `now` if it may be sent right away.
+        :rtype: float
+        """
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return now
+        return now + -self.tokens / self.rate
+
+
+def channel_limit(channel_id: int):
+    """
+    The limit of a channel, read through the reference data cache so changes apply at runtime.
+
+    :param channel_id: The id of the channel.
+    :type channel_id: int
+    :return: The (rate, burst) of the channel, or None if it is not limited.
+    """
+    channel = channels.get_by_id(channel_id)
+    if channel is None or not channel.rate_limit:
+        return None
+    return channel.rate_limit, max(1, channel.burst)
+
+
+class ChannelRateLimiter:
+    """
+    Paces the messages of each channel with an in-process token bucket per channel.
+
+    Used by the dispatcher. When `share` dispatchers split the schedules (see `ScheduleDispatcher`),
+    each one paces at `rate / share`, so together they respect the channel rate.
+    """
+
+    def __init__(self, share: int = 1) -> None:
+        """
+        :param share: The number of processes sharing each channel limit.
+        :type share: int
+        """
+        self.share = max(1, share)
+        self._buckets: Dict[int, TokenBucket] = {}
+
+    def reserve(self, channel_id: int, now: float) -> float:
+        """
+        Reserves the send slot of one message of a channel.
+
+        :param channel_id: The id of the channel.
+        :type channel_id: int
+        :param now: The current timestamp.
+        :type now: float
+        :return: The timestamp at which the message may be sent, `now` if it may be sent right away.
+        :rtype: float
+        """
+        limit = channel_limit(channel_id)
+        if limit is None:
+            self._buckets.pop(channel_id, None)
+            return now
+        rate, burst = limit[0] / self.share, max(1, limit[1] // self.share)
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = TokenBucket(rate, burst, updated=now)
+        elif (bucket.rate, bucket.burst) != (rate, burst):
+            bucket.configure(rate, burst)
+        return bucket.reserve(now)
+
+
+def _cache_key(channel_id: int) -> str:
+    return f"channel-rate:{channel_id}"
+
+
+def admit(channel_names, now: Optional[float] = None) -> float:
+    """
+    Takes the tokens of an API request creating schedules, in the bucket of each channel.
+
+    The buckets live in the `CHANNEL_RATE_LIMIT_CACHE` cache so every API process shares them;
+    like DRF's own throttles, concurrent requests may occasionally both read the same state.
+    Either every channel of the request has tokens and all of them are taken, or none is.
+
+    :param channel_names: The channel name of each schedule in the request; unknown names are ignored.
+    :type channel_names: Iterable[str]
+    :param now: The current timestamp, defaults to `time.time()`.
+    :type now: Optional[float]
+    :return: 0 if the request is admitted, otherwise the seconds to wait before retrying.
+    :rtype: float
+    """
+    now = time.time() if now is None else now
+    counts = Counter(channel_names)
+    limited = {}
+    for name, count in counts.items():
+        channel = channels.get(name) if isinstance(name, str) else None
+        limit = channel_limit(channel.pk) if channel is not None else None
+        if limit is not None:
+            limited[_cache_key(channel.pk)] = (limit, count)
+    if not limited:
+        return 0.0
+    cache = caches[settings.CHANNEL_RATE_LIMIT_CACHE]
+    states = cache.get_many(list(limited))
+    buckets = {}
+    wait = 0.0
+    for key, ((rate, burst), count) in limited.items():
+        tokens, updated = states.get(key, (None, now))
+        bucket = buckets[key] = TokenBucket(rate, burst, tokens, updated)
+        if tokens is not None:
+            bucket.configure(rate, burst)
+        wait = max(wait, bucket.take(count, now))
+    if wait:
+        return wait
+    cache.set_many(
+        {key: (bucket.tokens, bucket.updated) for key, bucket in buckets.items()},
+        # Past this point the bucket is full again, so losing the entry changes nothing.
+        max(1, math.ceil(max((bucket.burst - bucket.tokens) / bucket.rate for bucket in buckets.values()))),
+    )
+    return 0.0
+
+
+def request_channels(data):
+    """
+    The channel names of the schedules in a create or bulk create request body.
+
+    :param data: The parsed request body, one schedule or a list of schedules.
+    :rtype: List[str]
+    """
+    items = data if isinstance(data, list) else [data]
+    return [item.get("channel") for item in items if isinstance(item, dict)]
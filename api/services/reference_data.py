@@ -0,0 +1,117 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from api.models import Channel, Status
+
+
+class ReferenceDataCache:
+    """
+    In-process cache of a small reference table (channels, statuses) keyed by name and by id.
+
+    The table is loaded with a single query on first use and served from memory afterwards.
+    Saves and deletes of the model invalidate the cache of the current process (see `api.signals`);
+    the optional `REFERENCE_DATA_CACHE_TTL` bounds how long other processes keep serving stale rows.
+    """
+
+    def __init__(self, model) -> None:
+        """
+        :param model: The reference model, which must have a unique `name` field.
+        :type model: django.db.models.Model
+        """
+        self.model = model
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Tuple[Dict[str, object], Dict[int, object]]] = None
+        self._loaded_at = 0.0
+
+    def __deepcopy__(self, memo):
+        # Serializer fields are deep-copied per serializer instance; the cache is shared on purpose.
+        return self
+
+    def _expired(self) -> bool:
+        ttl = settings.REFERENCE_DATA_CACHE_TTL
+        return bool(ttl) and time.monotonic() - self._loaded_at > ttl
+
+    def _entries(self) -> Tuple[Dict[str, object], Dict[int, object]]:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._expired():
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._expired():
+                rows = list(self.model.objects.order_by("id"))
+                self._snapshot = ({row.name: row for row in rows}, {row.pk: row for row in rows})
+                self._loaded_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached rows; the next lookup reloads the table.
+        """
+        with self._lock:
+            self._snapshot = None
+
+    def all(self) -> List:
+        """
+        Returns every row of the table, ordered by id.
+
+        :rtype: list
+        """
+        return list(self._entries()[1].values())
+
+    def get(self, name: str):
+        """
+        Returns the row with the given name.
+
+        :param name: The unique name of the row.
+        :type name: str
+        :return: The model instance, or None if no row has this name.
+        """
+        return self._entries()[0].get(name)
+
+    def get_by_id(self, pk: int):
+        """
+        Returns the row with the given id.
+
+        :param pk: The primary key of the row.
+        :type pk: int
+        :return: The model instance, or None if no row has this id.
+        """
+        return self._entries()[1].get(pk)
+
+    def id_for(self, name: str) -> int:
+        """
+        Translates a name into its id.
+
+        :param name: The unique name of the row.
+        :type name: str
+        :rtype: int
+        :raises DoesNotExist: If no row has this name.
+        """
+        row = self.get(name)
+        if row is None:
+            raise self.model.DoesNotExist(f"{self.model.__name__} with name '{name}' not found.")
+        return row.pk
+
+    def name_for(self, pk: int) -> Optional[str]:
+        """
+        Translates an id into its name.
+
+        An unknown id reloads the table once, since it usually points at a row created by another
+        process after the cache was loaded.
+
+        :param pk: The primary key of the row.
+        :type pk: int
+        :return: The name, or None if no row has this id.
+        :rtype: Optional[str]
+        """
+        row = self.get_by_id(pk)
+        if row is None and pk is not None:
+            self.invalidate()
+            row = self.get_by_id(pk)
+        return row.name if row is not None else None
+
+
+channels = ReferenceDataCache(Channel)
+statuses = ReferenceDataCache(Status)
@@ -0,0 +1,145 @@
+from collections import Counter
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Sum
+
+from api.models import ScheduleStat
+
+# (day, channel id, status id) of a schedule, the key of ScheduleStat.
+StatKey = Tuple[date, int, int]
+
+# Rows per upsert statement; 4 parameters each keeps SQLite under its variable limit.
+UPSERT_BATCH_SIZE = 200
+
+GROUP_BY_FIELDS = ("day", "channel", "status")
+
+
+def day_of(value: datetime) -> date:
+    """
+    The UTC day of a scheduled datetime, as counted by ScheduleStat.
+
+    :param value: The datetime.
+    :type value: datetime
+    :rtype: date
+    """
+    return value.astimezone(dt_timezone.utc).date()
+
+
+def key_of(schedule) -> StatKey:
+    """
+    The ScheduleStat key of a schedule.
+
+    :param schedule: A CommunicationSchedule, with its `scheduled_datetime`, `channel_id` and `status_id`.
+    :rtype: StatKey
+    """
+    return day_of(schedule.scheduled_datetime), schedule.channel_id, schedule.status_id
+
+
+def apply_deltas(deltas: Dict[StatKey, int]) -> None:
+    """
+    Adds the deltas to the counters with `INSERT ... ON CONFLICT DO UPDATE SET count = count + delta`.
+
+    Runs in the transaction of the caller, so the counters change together with the schedules.
+    Keys are sorted, so concurrent transactions lock the counter rows in the same order and do not deadlock.
+
+    :param deltas: The change of each counter; zero deltas are skipped.
+    :type deltas: Dict[StatKey, int]
+    """
+    rows = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not rows:
+        return
+    table = connection.ops.quote_name(ScheduleStat._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} (day, channel_id, status_id, count) VALUES "
+                + ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+                + f" ON CONFLICT (day, channel_id, status_id) DO UPDATE SET count = {table}.count + EXCLUDED.count",
+                [
+                    value
+                    for (day, channel_id, status_id), delta in batch
+                    for value in (connection.ops.adapt_datefield_value(day), channel_id, status_id, delta)
+                ],
+            )
+
+
+def record_created(schedules: Iterable) -> None:
+    """
+    Counts new schedules, with one batched upsert for all of them.
+
+    :param schedules: The CommunicationSchedule instances created.
+    :type schedules: Iterable
+    """
+    apply_deltas(Counter(key_of(schedule) for schedule in schedules))
+
+
+def record_transition(keys: Iterable[StatKey], target_status_id: int) -> None:
+    """
+    Moves schedules from their current status counter to the counter of their new status.
+
+    :param keys: The keys of the schedules before the change, one per schedule.
+    :type keys: Iterable[StatKey]
+    :param target_status_id: The id of the new status.
+    :type target_status_id: int
+    """
+    deltas = Counter()
+    for day, channel_id, status_id in keys:
+        if status_id != target_status_id:
+            deltas[(day, channel_id, status_id)] -= 1
+            deltas[(day, channel_id, target_status_id)] += 1
+    apply_deltas(deltas)
+
+
+def record_change(before: StatKey, after: StatKey) -> None:
+    """
+    Moves one schedule between counters after an update of its day, channel or status.
+
+    :param before: The key of the schedule before the update.
+    :type before: StatKey
+    :param after: The key of the schedule after the update.
+    :type after: StatKey
+    """
+    if before != after:
+        apply_deltas({before: -1, after: 1})
+
+
+def summary(
+    group_by: Iterable[str] = GROUP_BY_FIELDS,
+    day_from: Optional[date] = None,
+    day_to: Optional[date] = None,
+    channel_id: Optional[int] = None,
+    status_id: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Sums the counters, reading only the ScheduleStat table.
+
+    :param group_by: Any of "day", "channel" and "status"; nothing groups everything into one total.
+    :type group_by: Iterable[str]
+    :param day_from: The first day counted, inclusive.
+    :type day_from: Optional[date]
+    :param day_to: The last day counted, inclusive.
+    :type day_to: Optional[date]
+    :param channel_id: Only count this channel.
+    :type channel_id: Optional[int]
+    :param status_id: Only count this status.
+    :type status_id: Optional[int]
+    :return: One dict per group, with the grouped fields (channel and status as ids) and `count`.
+    :rtype: List[Dict]
+    """
+    queryset = ScheduleStat.objects.all()
+    if day_from is not None:
+        queryset = queryset.filter(day__gte=day_from)
+    if day_to is not None:
+        queryset = queryset.filter(day__lte=day_to)
+    if channel_id is not None:
+        queryset = queryset.filter(channel_id=channel_id)
+    if status_id is not None:
+        queryset = queryset.filter(status_id=status_id)
+    columns = [{"day": "day", "channel": "channel_id", "status": "status_id"}[field] for field in group_by]
+    if not columns:
+        return [{"count": queryset.aggregate(count=Sum("count"))["count"] or 0}]
+    rows = queryset.values(*columns).annotate(total=Sum("count")).filter(total__gt=0).order_by(*columns)
+    return [{**{column: row[column] for column in columns}, "count": row["total"]} for row in rows]
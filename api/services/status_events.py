@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from api.services.reference_data import channels, statuses
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL channel carrying the status events between processes, see SCHEDULE_STATUS_EVENTS.
+NOTIFY_CHANNEL = "schedule_status"
+
+# Events per NOTIFY; a payload must stay under 8000 bytes.
+NOTIFY_BATCH_SIZE = 200
+
+# Seconds the listener waits for notifications before checking whether it should stop.
+LISTEN_POLL_INTERVAL = 5.0
+
+
+class StatusEvent(NamedTuple):
+    """
+    A schedule that moved to a new status.
+    """
+
+    id: int
+    channel_id: int
+    status_id: int
+
+
+def render(event: StatusEvent) -> str:
+    """
+    Formats an event as a Server-Sent Events message.
+
+    Channel and status names come from the reference data cache, which may query the database, so
+    this runs in the publishing thread rather than on the event loop, once per event whatever the
+    number of subscribers.
+
+    :param event: The event.
+    :type event: StatusEvent
+    :rtype: str
+    """
+    data = {
+        "id": event.id,
+        "channel": channels.name_for(event.channel_id),
+        "status": statuses.name_for(event.status_id),
+    }
+    return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """
+    One subscriber to the status events, usually an open stream.
+
+    Matching events are queued for the event loop of the subscriber. A subscriber that does not
+    keep up overflows: its queue is replaced by a single `None`, telling it to resubscribe.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        ids: Optional[Iterable[int]] = None,
+        channel_id: Optional[int] = None,
+        status_id: Optional[int] = None,
+        max_queued: int = 1000,
+    ) -> None:
+        """
+        :param loop: The event loop reading the queue.
+        :type loop: asyncio.AbstractEventLoop
+        :param ids: Only the events of these schedules, or every schedule if empty.
+        :type ids: Optional[Iterable[int]]
+        :param channel_id: Only the events of this channel.
+        :type channel_id: Optional[int]
+        :param status_id: Only the events moving to this status.
+        :type status_id: Optional[int]
+        :param max_queued: Publishes queued before the subscriber overflows.
+        :type max_queued: int
+        """
+        self.loop = loop
+        self.ids = frozenset(ids or ())
+        self.channel_id = channel_id
+        self.status_id = status_id
+        self.queue: asyncio.Queue = asyncio.Queue(max_queued)
+        self.overflowed = False
+
+    def matches(self, event: StatusEvent) -> bool:
+        """
+        Whether the event passes the filters of the subscription.
+
+        :rtype: bool
+        """
+        return (
+            (not self.ids or event.id in self.ids)
+            and (self.channel_id is None or event.channel_id == self.channel_id)
+            and (self.status_id is None or event.status_id == self.status_id)
+        )
+
+    def _deliver(self, events: List) -> None:
+        # Runs on the loop of the subscriber.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(events)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class StatusHub:
+    """
+    In-process fan-out of status events to subscriptions.
+
+    Subscriptions to schedule ids are indexed by id, so an event only visits the subscribers of
+    its schedule and the filter-only subscribers. `publish` may be called from any thread; the
+    events reach each subscriber through `call_soon_threadsafe` on its own loop.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, Set[Subscription]] = {}
+        self._unkeyed: Set[Subscription] = set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._unkeyed) + len({sub for subs in self._by_id.values() for sub in subs})
+
+    def subscribe(self, subscription: Subscription) -> None:
+        """
+        Starts delivering the matching events to a subscription.
+        """
+        with self._lock:
+            if not subscription.ids:
+                self._unkeyed.add(subscription)
+            for pk in subscription.ids:
+                self._by_id.setdefault(pk, set()).add(subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Stops delivering events to a subscription; unknown subscriptions are ignored.
+        """
+        with self._lock:
+            self._unkeyed.discard(subscription)
+            for pk in subscription.ids:
+                subscribers = self._by_id.get(pk)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_id[pk]
+
+    def publish(self, events: Iterable[StatusEvent]) -> None:
+        """
+        Delivers events to the subscriptions they match.
+
+        :param events: The events, in the order they happened.
+        :type events: Iterable[StatusEvent]
+        """
+        deliveries: Dict[Subscription, List] = {}
+        with self._lock:
+            if not self._by_id and not self._unkeyed:
+                return
+            for event in events:
+                subscribers = [sub for sub in self._by_id.get(event.id, ()) if sub.matches(event)]
+                subscribers += [sub for sub in self._unkeyed if sub.matches(event)]
+                if subscribers:
+                    message = render(event)
+                    for subscriber in subscribers:
+                        deliveries.setdefault(subscriber, []).append((event, message))
+        for subscriber, delivered in deliveries.items():
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._deliver, delivered)
+            except RuntimeError:
+                # The loop of the subscriber was closed without unsubscribing.
+                self.unsubscribe(subscriber)
+
+
+hub = StatusHub()
+
+
+def emit(events: List[StatusEvent]) -> None:
+    """
+    Publishes status changes once the current transaction commits.
+
+    With SCHEDULE_STATUS_EVENTS set to "postgres" (on PostgreSQL) the events are sent with
+    `pg_notify`, which PostgreSQL delivers on commit to the listener of every process; otherwise
+    they go straight to the hub of this process.
+
+    :param events: The schedules that changed status.
+    :type events: List[StatusEvent]
+    """
+    mode = settings.SCHEDULE_STATUS_EVENTS
+    if not events or mode == "off":
+        return
+    if mode == "postgres" and connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            for start in range(0, len(events), NOTIFY_BATCH_SIZE):
+                payload = json.dumps([list(event) for event in events[start:start + NOTIFY_BATCH_SIZE]])
+                cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, payload])
+        return
+    transaction.on_commit(lambda: hub.publish(events))
+
+
+class NotificationListener(threading.Thread):
+    """
+    Thread relaying the PostgreSQL status notifications of every process to the hub of this one.
+
+    It holds its own database connection, listening on NOTIFY_CHANNEL, and reconnects after errors.
+    """
+
+    def __init__(self, target_hub: StatusHub, retry_delay: float = 1.0) -> None:
+        """
+        :param target_hub: The hub the events are published to.
+        :type target_hub: StatusHub
+        :param retry_delay: Seconds before reconnecting after an error.
+        :type retry_delay: float
+        """
+        super().__init__(name="schedule-status-listener", daemon=True)
+        self.hub = target_hub
+        self.retry_delay = retry_delay
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            db = connections.create_connection("default")
+            try:
+                self._listen(db)
+            except Exception:
+                logger.exception("Listening to %s failed, retrying in %ss.", NOTIFY_CHANNEL, self.retry_delay)
+                self.stop_event.wait(self.retry_delay)
+            finally:
+                db.close()
+
+    def _listen(self, db) -> None:
+        with db.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        raw = db.connection
+        while not self.stop_event.is_set():
+            if not select.select([raw], [], [], LISTEN_POLL_INTERVAL)[0]:
+                continue
+            raw.poll()
+            events = []
+            while raw.notifies:
+                notification = raw.notifies.pop(0)
+                events.extend(StatusEvent(*values) for values in json.loads(notification.payload))
+            self.hub.publish(events)
+
+
+_listener: Optional[NotificationListener] = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener() -> None:
+    """
+    Starts the notification listener of this process, if SCHEDULE_STATUS_EVENTS is "postgres" and
+    it is not running yet. Called by the streams, so only processes serving them listen.
+    """
+    global _listener
+    if settings.SCHEDULE_STATUS_EVENTS != "postgres" or connection.vendor != "postgresql":
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = NotificationListener(hub)
+            _listener.start()
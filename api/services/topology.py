@@ -0,0 +1,191 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Outcome of each entity of a topology spec, see `plan` and `apply`.
+CREATED = "created"
+UNCHANGED = "unchanged"
+CONFLICT = "conflict"
+FAILED = "failed"
+
+EXCHANGE_TYPES = ("direct", "fanout", "topic", "headers")
+
+
+class ExchangeSpec(NamedTuple):
+    """
+    An exchange of a topology spec.
+    """
+
+    name: str
+    type: str = "direct"
+    durable: bool = True
+    auto_delete: bool = False
+    internal: bool = False
+    arguments: Dict = {}
+
+
+class QueueSpec(NamedTuple):
+    """
+    A queue of a topology spec.
+    """
+
+    name: str
+    durable: bool = True
+    auto_delete: bool = False
+    arguments: Dict = {}
+
+
+class BindingSpec(NamedTuple):
+    """
+    A binding of a queue to an exchange in a topology spec.
+    """
+
+    exchange: str
+    queue: str
+    routing_key: str = ""
+    arguments: Dict = {}
+
+
+class TopologyResult(NamedTuple):
+    """
+    What happened to one entity of a topology spec.
+
+    Attributes:
+        kind (str): "exchange", "queue" or "binding".
+        name (str): The name of the exchange or queue, or "exchange -> queue [routing key]".
+        result (str): CREATED, UNCHANGED, CONFLICT or FAILED.
+        detail (str): Why the entity conflicts or failed.
+    """
+
+    kind: str
+    name: str
+    result: str
+    detail: str = ""
+
+
+class Topology(NamedTuple):
+    """
+    A full topology spec.
+    """
+
+    exchanges: List[ExchangeSpec]
+    queues: List[QueueSpec]
+    bindings: List[BindingSpec]
+
+
+def binding_name(binding: BindingSpec) -> str:
+    """
+    Names a binding in results, e.g. "schedule_data -> emails [email]".
+    """
+    return f"{binding.exchange} -> {binding.queue} [{binding.routing_key}]"
+
+
+def _current_value(current: Dict, field: str):
+    value = current.get(field)
+    if field == "arguments":
+        value = dict(value or {})
+        # Recent RabbitMQ versions list the implicit queue type of classic queues.
+        if value.get("x-queue-type") == "classic":
+            del value["x-queue-type"]
+    return value
+
+
+def _differences(current: Dict, wanted: Dict) -> List[str]:
+    return [
+        f"{field} is {_current_value(current, field)!r}, not {value!r}"
+        for field, value in wanted.items()
+        if field != "name" and _current_value(current, field) != value
+    ]
+
+
+def _binding_key(exchange: str, queue: str, routing_key: str, arguments: Optional[Dict]) -> Tuple:
+    return exchange, queue, routing_key, tuple(sorted((arguments or {}).items()))
+
+
+def plan(spec: Topology, exchanges: List[Dict], queues: List[Dict], bindings: List[Dict]):
+    """
+    Diffs a topology spec against the current state of the broker.
+
+    Entities missing from the broker are to be declared. Exchanges and queues existing with other
+    attributes are conflicts: the broker refuses to redeclare them (PRECONDITION_FAILED), so they
+    are reported instead of being sent, and must be deleted first to change them.
+
+    :param spec: The wanted topology.
+    :type spec: Topology
+    :param exchanges: The exchanges of the broker, as listed by the management API.
+    :type exchanges: List[Dict]
+    :param queues: The queues of the broker, as listed by the management API.
+    :type queues: List[Dict]
+    :param bindings: The bindings of the broker, as listed by the management API.
+    :type bindings: List[Dict]
+    :return: The declarations to send, in order (exchanges, queues, then bindings), and the result
+        of every entity of the spec, where the declarations to send are provisionally CREATED.
+    :rtype: Tuple[List, List[TopologyResult]]
+    """
+    current_exchanges = {exchange["name"]: exchange for exchange in exchanges}
+    current_queues = {queue["name"]: queue for queue in queues}
+    current_bindings = {
+        _binding_key(binding["source"], binding["destination"], binding["routing_key"], binding.get("arguments"))
+        for binding in bindings
+        if binding.get("destination_type", "queue") == "queue"
+    }
+    declarations = []
+    results = []
+
+    for kind, specs, current in (
+        ("exchange", spec.exchanges, current_exchanges),
+        ("queue", spec.queues, current_queues),
+    ):
+        for entity in specs:
+            existing = current.get(entity.name)
+            if existing is None:
+                declarations.append(entity)
+                results.append(TopologyResult(kind, entity.name, CREATED))
+                continue
+            differences = _differences(existing, entity._asdict())
+            if differences:
+                results.append(TopologyResult(kind, entity.name, CONFLICT, "; ".join(differences)))
+            else:
+                results.append(TopologyResult(kind, entity.name, UNCHANGED))
+
+    for binding in spec.bindings:
+        key = _binding_key(binding.exchange, binding.queue, binding.routing_key, binding.arguments)
+        if key in current_bindings:
+            results.append(TopologyResult("binding", binding_name(binding), UNCHANGED))
+        else:
+            declarations.append(binding)
+            results.append(TopologyResult("binding", binding_name(binding), CREATED))
+    return declarations, results
+
+
+def apply(broker, spec: Topology) -> List[TopologyResult]:
+    """
+    Brings the broker to a topology spec, declaring only what is missing.
+
+    The current state comes from the (cached) management API, and every missing entity is then
+    declared over a single channel by `BrokerBackend.declare_topology`.
+
+    :param broker: The broker backend, see `get_broker()`.
+    :param spec: The wanted topology.
+    :type spec: Topology
+    :return: The result of every entity of the spec, in the order of the spec.
+    :rtype: List[TopologyResult]
+    :raises ManagementApiError: If the current state cannot be retrieved.
+    :raises pika.exceptions.AMQPConnectionError: If the broker cannot be reached.
+    """
+    declarations, results = plan(
+        spec,
+        broker.management_get("exchanges").data,
+        broker.management_get("queues").data,
+        broker.management_get("bindings").data,
+    )
+    if not declarations:
+        return results
+    # Declarations are in the order of the CREATED results.
+    errors = iter(broker.declare_topology(declarations))
+    applied = []
+    for result in results:
+        if result.result == CREATED:
+            error = next(errors)
+            if error:
+                result = result._replace(result=FAILED, detail=error)
+        applied.append(result)
+    return applied
@@ -0,0 +1,173 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q, QuerySet
+
+from api.models import CommunicationSchedule
+from api.services import stats, status_events
+from api.services.reference_data import statuses
+
+# Statuses a schedule may move to, by current status. Sent and canceled schedules are final.
+ALLOWED_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    "scheduled": ("sent", "canceled", "failed"),
+    "failed": ("scheduled", "canceled"),
+    "sent": (),
+    "canceled": (),
+}
+
+
+def allowed_sources(target: str) -> List[str]:
+    """
+    Returns the statuses from which a schedule may move to `target`.
+
+    :param target: The name of the new status.
+    :type target: str
+    :rtype: List[str]
+    """
+    return [source for source, targets in ALLOWED_TRANSITIONS.items() if target in targets]
+
+
+def apply_transition(queryset: QuerySet, target: str, **fields) -> int:
+    """
+    Moves the schedules of the queryset to `target` with a single UPDATE.
+
+    The UPDATE is restricted to rows whose current status allows the transition, so rows that
+    changed concurrently (e.g. sent by the dispatcher meanwhile) are left alone. The rows are
+    locked and read first, so the status counters (see `api.services.stats`) are moved by exactly
+    the rows updated, with one batched upsert, and a status event is emitted for each of them
+    (see `api.services.status_events`).
+
+    :param queryset: The CommunicationSchedule rows to update.
+    :type queryset: QuerySet
+    :param target: The name of the new status.
+    :type target: str
+    :param fields: Other columns to set in the same UPDATE, e.g. `dispatched_at`.
+    :return: The number of schedules updated.
+    :rtype: int
+    """
+    sources = [statuses.id_for(name) for name in allowed_sources(target)]
+    target_id = statuses.id_for(target)
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(status_id__in=sources)
+            .select_for_update()
+            .values_list("id", "scheduled_datetime", "channel_id", "status_id")
+        )
+        if not rows:
+            return 0
+        updated = CommunicationSchedule.objects.filter(id__in=[row[0] for row in rows]).update(
+            status_id=target_id, **fields
+        )
+        keys = [(stats.day_of(scheduled), channel_id, status_id) for _, scheduled, channel_id, status_id in rows]
+        stats.record_transition(keys, target_id)
+        status_events.emit([status_events.StatusEvent(row[0], row[2], target_id) for row in rows])
+    return updated
+
+
+class TransitionResult:
+    """
+    Counts of a bulk transition.
+
+    Attributes:
+        requested (Optional[int]): Distinct ids sent by the client, or None for a filter.
+        matched (int): Schedules found (for ids) or eligible schedules scanned (for a filter).
+        updated (int): Schedules moved to the new status.
+    """
+
+    def __init__(self, target: str, requested: Optional[int] = None) -> None:
+        self.target = target
+        self.requested = requested
+        self.matched = 0
+        self.updated = 0
+
+    @property
+    def skipped(self) -> int:
+        """
+        Matched schedules whose status did not allow the transition.
+
+        :rtype: int
+        """
+        return self.matched - self.updated
+
+    def as_dict(self) -> Dict:
+        """
+        The counts, as returned by the bulk endpoints.
+
+        :rtype: Dict
+        """
+        result = {"status": self.target, "matched": self.matched, "updated": self.updated, "skipped": self.skipped}
+        if self.requested is not None:
+            result["requested"] = self.requested
+            result["not_found"] = self.requested - self.matched
+        return result
+
+
+def _chunks(ids: List[int], chunk_size: int) -> Iterator[List[int]]:
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+
+def _eligible_chunks(queryset: QuerySet, target: str, chunk_size: int) -> Iterator[List[int]]:
+    # Keyset scan over (scheduled_datetime, id), the order of the composite indexes, restricted to
+    # the statuses the transition can start from.
+    eligible = queryset.filter(status_id__in=[statuses.id_for(name) for name in allowed_sources(target)])
+    eligible = eligible.order_by("scheduled_datetime", "id")
+    last = None
+    while True:
+        page = eligible
+        if last is not None:
+            page = page.filter(
+                Q(scheduled_datetime__gt=last[0]) | Q(scheduled_datetime=last[0], id__gt=last[1])
+            )
+        rows = list(page.values_list("scheduled_datetime", "id")[:chunk_size])
+        if not rows:
+            return
+        yield [pk for _, pk in rows]
+        last = rows[-1]
+
+
+def transition_ids(ids: Iterable[int], target: str, chunk_size: int, **fields) -> TransitionResult:
+    """
+    Moves the given schedules to `target`, one chunk of ids per UPDATE and transaction.
+
+    :param ids: The ids of the schedules.
+    :type ids: Iterable[int]
+    :param target: The name of the new status.
+    :type target: str
+    :param chunk_size: Ids updated per statement.
+    :type chunk_size: int
+    :param fields: Other columns to set in the same UPDATE.
+    :rtype: TransitionResult
+    """
+    ids = sorted(set(ids))
+    result = TransitionResult(target, requested=len(ids))
+    for chunk in _chunks(ids, chunk_size):
+        with transaction.atomic():
+            rows = CommunicationSchedule.objects.filter(id__in=chunk)
+            result.matched += rows.count()
+            result.updated += apply_transition(rows, target, **fields)
+    return result
+
+
+def transition_filtered(queryset: QuerySet, target: str, chunk_size: int, **fields) -> TransitionResult:
+    """
+    Moves every schedule of the queryset that may legally move to `target`, `chunk_size` rows at a time.
+
+    Each chunk is committed on its own, so locks are held on at most `chunk_size` rows at once and
+    concurrent writers are never blocked for the length of the whole operation.
+
+    :param queryset: The filtered CommunicationSchedule queryset.
+    :type queryset: QuerySet
+    :param target: The name of the new status.
+    :type target: str
+    :param chunk_size: Rows updated per statement.
+    :type chunk_size: int
+    :param fields: Other columns to set in the same UPDATE.
+    :rtype: TransitionResult
+    """
+    result = TransitionResult(target)
+    for chunk in _eligible_chunks(queryset, target, chunk_size):
+        with transaction.atomic():
+            result.matched += len(chunk)
+            result.updated += apply_transition(CommunicationSchedule.objects.filter(id__in=chunk), target, **fields)
+    return result
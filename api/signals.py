@@ -0,0 +1,60 @@
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Campaign, Channel, Status
+from api.services.broker import reset_broker
+from api.services.campaigns import campaign_messages
+from api.services.metrics import count_queries
+from api.services.reference_data import channels, statuses
+
+
+@receiver(post_save, sender=Channel)
+@receiver(post_delete, sender=Channel)
+def invalidate_channels(sender, **kwargs):
+    """
+    Drops the cached channels when a channel changes, and again once the change is committed.
+    """
+    channels.invalidate()
+    transaction.on_commit(channels.invalidate)
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Status)
+def invalidate_statuses(sender, **kwargs):
+    """
+    Drops the cached statuses when a status changes, and again once the change is committed.
+    """
+    statuses.invalidate()
+    transaction.on_commit(statuses.invalidate)
+
+
+@receiver(post_save, sender=Campaign)
+@receiver(post_delete, sender=Campaign)
+def invalidate_campaign_message(sender, instance, **kwargs):
+    """
+    Drops the cached message of a campaign when the campaign changes, and again once the change is committed.
+    """
+    pk = instance.pk
+    campaign_messages.invalidate(pk)
+    transaction.on_commit(lambda: campaign_messages.invalidate(pk))
+
+
+@receiver(setting_changed)
+def switch_broker(setting, **kwargs):
+    """
+    Rebuilds the broker backend when `BROKER_BACKEND` is overridden, e.g. by `override_settings` in tests.
+    """
+    if setting == "BROKER_BACKEND":
+        reset_broker()
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    """
+    Lets the metrics middleware count the queries of each request, see `api.services.metrics.counting_queries`.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from api.services.rate_limit import admit, request_channels
+
+
+class ChannelRateThrottle(BaseThrottle):
+    """
+    Admits requests creating schedules only while their channels are within their rate limit.
+
+    Active when `CHANNEL_RATE_LIMIT_ADMISSION` is set. A throttled request gets HTTP 429 with a
+    `Retry-After` header telling when the channel has tokens again.
+    """
+
+    def allow_request(self, request, view):
+        """
+        Takes one token per schedule of the request from the bucket of its channel.
+
+        Args:
+            request: The HTTP request object, with one schedule or a list of schedules.
+            view: The view handling the request.
+
+        Returns:
+            bool: Whether the request is admitted.
+        """
+        self.wait_seconds = 0.0
+        if not settings.CHANNEL_RATE_LIMIT_ADMISSION:
+            return True
+        self.wait_seconds = admit(request_channels(request.data))
+        return not self.wait_seconds
+
+    def wait(self):
+        """
+        Returns:
+            float: Seconds before the request may be retried.
+        """
+        return self.wait_seconds
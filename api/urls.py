@@ -3,6 +3,8 @@ from django.views.generic import RedirectView
 from rest_framework.routers import DefaultRouter
 from api.views.schedule_view import CommunicationScheduleViewSet
 from api.views.rabbitmq_view import RabbitMqViewSet
+from api.views.campaign_view import CampaignViewSet
+from api.views import async_schedule_view, metrics_view
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -24,9 +26,18 @@ schema_view = get_schema_view(
 router = DefaultRouter()
 router.register(r"schedules", CommunicationScheduleViewSet, basename='communication-schedule')
 router.register(r'rabbitmq', RabbitMqViewSet, basename='rabbitmq')
+router.register(r"campaigns", CampaignViewSet, basename="campaign")
 
 urlpatterns = [
     path("api/v1/", include(router.urls)),
+    path(
+        "api/v1/async/schedules/create_schedule/",
+        async_schedule_view.create_schedule,
+        name="async-schedule-create-schedule",
+    ),
+    path("api/v1/async/schedules/<int:pk>/check/", async_schedule_view.check, name="async-schedule-check"),
+    path("api/v1/async/schedules/<int:pk>/cancel/", async_schedule_view.cancel, name="async-schedule-cancel"),
+    path("api/v1/async/schedules/stream/", async_schedule_view.stream, name="async-schedule-stream"),
     path(
         "api/v1/swagger<format>/",
         schema_view.without_ui(cache_timeout=0),
@@ -37,6 +48,7 @@ urlpatterns = [
         schema_view.with_ui("swagger", cache_timeout=0),
         name="schema-swagger-ui",
     ),
+    path("metrics", metrics_view.metrics, name="metrics"),
     # path('api/v1/rabbitmq/', RabbitMqViewSet.as_view(), name='rabbitmq-publisher'),
     path("", RedirectView.as_view(url="api/v1/swagger/", permanent=True)),
 ]
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import math
+from typing import FrozenSet, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from pika.exceptions import AMQPError
+
+from api.models import CommunicationSchedule, OutboxMessage
+from api.serializers import CommunicationScheduleSerializer, ScheduleDetailSerializer
+from api.services import idempotency, outbox, rate_limit, stats, status_events
+from api.services.broker import get_broker
+from api.services.reference_data import channels, statuses
+from api.services.transitions import ALLOWED_TRANSITIONS, apply_transition
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the create_schedule, check and cancel actions of CommunicationScheduleViewSet,
+# and the status stream. They are meant to be served by an ASGI server (core/asgi.py), where every
+# request runs on the same event loop and shares its AMQP connection, and an open stream costs a queue.
+
+
+def _schedule_from(validated_data, scheduled) -> CommunicationSchedule:
+    return CommunicationSchedule(
+        recipient=validated_data["recipient"],
+        message=validated_data["message"],
+        scheduled_datetime=validated_data["scheduled_datetime"],
+        channel=validated_data["channel"],
+        status=scheduled,
+        exchange=validated_data["exchange"],
+        routing_key=validated_data.get("rout_key_name", ""),
+    )
+
+
+async def _detail(schedule: CommunicationSchedule) -> dict:
+    # The channel and status names come from the reference data cache, which may reload from the database.
+    return await sync_to_async(lambda: ScheduleDetailSerializer(schedule).data)()
+
+
+def _save(schedule: CommunicationSchedule) -> Optional[OutboxMessage]:
+    # Saves the schedule with its counter and, in "immediate" or "delayed" mode, its outbox message.
+    with transaction.atomic():
+        schedule.save()
+        stats.record_created([schedule])
+        messages = outbox.enqueue_schedules([schedule])
+    return messages[0] if messages else None
+
+
+@csrf_exempt
+@require_POST
+async def create_schedule(request):
+    """
+    Create a new communication schedule without blocking a worker thread.
+
+    In "immediate" dispatch mode the schedule and its outbox message are committed together and the
+    message is then published right away with publisher confirms (`outbox.relay_messages`, which
+    claims the row like the relay does); the outbox row is only left for the `relay_outbox` command
+    if the broker does not confirm it. In "delayed" mode the same happens when the message is due to
+    enter the delay tiers right away; otherwise the relay publishes it when it becomes available.
+
+    Args:
+        request: The HTTP request object containing the schedule data as JSON.
+
+    Returns:
+        JsonResponse: The created schedule and HTTP status 201, error details with HTTP status 400,
+                      or HTTP status 429 when the channel is over its rate limit.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+    if settings.CHANNEL_RATE_LIMIT_ADMISSION:
+        # Same admission control as ChannelRateThrottle on the synchronous endpoint.
+        wait = await sync_to_async(rate_limit.admit)(rate_limit.request_channels(data))
+        if wait:
+            retry_after = math.ceil(wait)
+            response = JsonResponse(
+                {"detail": f"Request was throttled. Expected available in {retry_after} seconds."}, status=429
+            )
+            response["Retry-After"] = str(retry_after)
+            return response
+    key = request.headers.get(idempotency.HEADER)
+    if key is not None:
+        return await _create_schedule_idempotent(key, data)
+
+    serializer = CommunicationScheduleSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    scheduled = await sync_to_async(statuses.get)("scheduled")
+    schedule = _schedule_from(serializer.validated_data, scheduled)
+    message = await sync_to_async(_save)(schedule)
+    if message is not None:
+        await _publish_eagerly([message])
+    return JsonResponse(await _detail(schedule), status=201)
+
+
+async def _publish_eagerly(messages: List[OutboxMessage]) -> None:
+    try:
+        published = await sync_to_async(outbox.relay_messages)(get_broker(), [message.pk for message in messages])
+    except AMQPError:
+        published = 0
+    if published < len(messages):
+        logger.warning(
+            "Eager publish of schedules %s was not confirmed, leaving it to the outbox relay.",
+            [message.body["id"] for message in messages],
+        )
+
+
+async def _create_schedule_idempotent(key: str, data) -> JsonResponse:
+    # Same as the synchronous create_schedule with an Idempotency-Key, sharing its keys: a replay
+    # returns the stored response and publishes nothing.
+    if not 0 < len(key) <= idempotency.MAX_KEY_LENGTH:
+        return JsonResponse(
+            {"detail": f"The {idempotency.HEADER} header must have 1 to {idempotency.MAX_KEY_LENGTH} characters."},
+            status=400,
+        )
+    messages = []
+
+    def operation():
+        serializer = CommunicationScheduleSerializer(data=data)
+        if not serializer.is_valid():
+            return 400, serializer.errors, None
+        schedule = _schedule_from(serializer.validated_data, statuses.get("scheduled"))
+        message = _save(schedule)
+        if message is not None:
+            messages.append(message)
+        return 201, ScheduleDetailSerializer(schedule).data, schedule.id
+
+    try:
+        stored, replayed = await sync_to_async(idempotency.run)("create_schedule", key, data, operation)
+    except idempotency.IdempotencyConflict as exc:
+        return JsonResponse({"detail": str(exc)}, status=422)
+    if not replayed:
+        # A request losing a race for its key was rolled back and has nothing to publish.
+        if messages:
+            await _publish_eagerly(messages)
+    response = JsonResponse(stored.body, status=stored.status_code)
+    if replayed:
+        response[idempotency.REPLAYED_HEADER] = "true"
+    return response
+
+
+@require_GET
+async def check(request, pk):
+    """
+    Retrieve the status of a specific schedule by ID.
+
+    Args:
+        request: The HTTP request object.
+        pk (int): Primary key of the schedule.
+
+    Returns:
+        JsonResponse: The schedule details and HTTP status 200, or HTTP status 404 if it does not exist.
+    """
+    try:
+        schedule = await CommunicationSchedule.objects.aget(pk=pk)
+    except CommunicationSchedule.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(await _detail(schedule))
+
+
+@csrf_exempt
+@require_POST
+async def cancel(request, pk):
+    """
+    Cancel a specific schedule by setting its status to "canceled".
+
+    Args:
+        request: The HTTP request object.
+        pk (int): Primary key of the schedule.
+
+    Returns:
+        JsonResponse: The canceled schedule details and HTTP status 200, HTTP status 404 if it does not exist,
+                      or 409 if it can no longer be canceled.
+    """
+    await sync_to_async(apply_transition)(CommunicationSchedule.objects.filter(pk=pk), "canceled")
+    try:
+        schedule = await CommunicationSchedule.objects.aget(pk=pk)
+    except CommunicationSchedule.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    data = await _detail(schedule)
+    if data["status"] != "canceled":
+        return JsonResponse({"detail": f"A {data['status']} schedule cannot be canceled."}, status=409)
+    return JsonResponse(data)
+
+
+def _stream_filters(params):
+    # Parses the stream parameters into the errors, the schedule ids, the channel id and the status id.
+    errors = {}
+    ids = []
+    for value in params.getlist("id"):
+        for part in value.split(","):
+            if not part.strip().isdigit() or int(part) < 1:
+                errors["id"] = ["Schedule ids must be positive integers."]
+            else:
+                ids.append(int(part))
+    if len(ids) > settings.SCHEDULE_STREAM_MAX_IDS:
+        errors["id"] = [f"At most {settings.SCHEDULE_STREAM_MAX_IDS} schedule ids."]
+    found = {}
+    for name, cache in (("channel", channels), ("status", statuses)):
+        value = params.get(name)
+        if value:
+            instance = cache.get(value)
+            if instance is None:
+                errors[name] = [f"Unknown {name} '{value}'."]
+            else:
+                found[name] = instance.pk
+    return errors, ids, found.get("channel"), found.get("status")
+
+
+def _snapshot(subscription: status_events.Subscription) -> Tuple[List, FrozenSet[int], set]:
+    # The current status of the subscribed schedules, the ids of the final statuses and the schedules
+    # still able to change.
+    final = frozenset(statuses.id_for(name) for name, targets in ALLOWED_TRANSITIONS.items() if not targets)
+    if not subscription.ids:
+        return [], final, set()
+    rows = CommunicationSchedule.objects.filter(id__in=subscription.ids).values_list("id", "channel_id", "status_id")
+    events = [status_events.StatusEvent(*row) for row in rows]
+    pending = {event.id for event in events if event.status_id not in final}
+    return [(event, status_events.render(event)) for event in events if subscription.matches(event)], final, pending
+
+
+async def _stream_events(subscription: status_events.Subscription):
+    status_events.hub.subscribe(subscription)
+    try:
+        # Subscribed before reading the current statuses, so no change falls in between.
+        snapshot, final, pending = await sync_to_async(_snapshot)(subscription)
+        batch = snapshot
+        while True:
+            if batch:
+                yield "".join(message for _, message in batch)
+                pending.difference_update(event.id for event, _ in batch if event.status_id in final)
+            if subscription.ids and not pending:
+                return
+            try:
+                batch = await asyncio.wait_for(subscription.queue.get(), settings.SCHEDULE_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                batch = []
+                yield ": keep-alive\n\n"
+                continue
+            if batch is None:
+                yield "event: overflow\ndata: {}\n\n"
+                return
+    finally:
+        status_events.hub.unsubscribe(subscription)
+
+
+@require_GET
+async def stream(request):
+    """
+    Stream the status changes of schedules as Server-Sent Events, instead of polling `check`.
+
+    Filters are `id` (repeated or comma-separated), `channel` and `status` names; without any, every
+    change is streamed. A stream of ids starts with their current status and ends once all of them
+    reached a final status. A comment is sent every `SCHEDULE_STREAM_HEARTBEAT` seconds to keep idle
+    connections open, and an `overflow` event ends a stream that fell too far behind; clients should
+    then reconnect.
+
+    Args:
+        request: The HTTP request object.
+
+    Returns:
+        StreamingHttpResponse: The `text/event-stream` of `status` events, or a JsonResponse with the
+                               parameter errors and HTTP status 400.
+    """
+    errors, ids, channel_id, status_id = await sync_to_async(_stream_filters)(request.GET)
+    if errors:
+        return JsonResponse(errors, status=400)
+    status_events.ensure_listener()
+    subscription = status_events.Subscription(
+        asyncio.get_running_loop(), ids, channel_id, status_id, settings.SCHEDULE_STREAM_QUEUE_SIZE
+    )
+    response = StreamingHttpResponse(_stream_events(subscription), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Keeps reverse proxies such as nginx from buffering the events.
+    response["X-Accel-Buffering"] = "no"
+    return response
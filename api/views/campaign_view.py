@@ -0,0 +1,100 @@
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+from api.models import Campaign
+from api.serializers import CampaignCreateSerializer, CampaignRecipientsSerializer, CampaignSerializer
+from api.services.campaigns import add_recipients, create_campaign
+from drf_yasg.utils import swagger_auto_schema
+
+
+class CampaignViewSet(viewsets.ViewSet):
+    """
+    ViewSet for campaigns: one message sent to many recipients.
+
+    The message is stored once on the campaign and each recipient becomes a communication schedule
+    referencing it, listed, exported and canceled through the schedule endpoints with the `campaign` filter.
+    """
+    permission_classes = []
+
+    @swagger_auto_schema(
+        method="post",
+        request_body=CampaignCreateSerializer,
+        responses={201: CampaignSerializer, 400: "Bad Request"},
+        operation_description=(
+            "Creates a campaign and one schedule per recipient. `$name` placeholders of the message are "
+            "replaced by the variables of each recipient."
+        )
+    )
+    @action(detail=False, methods=["post"])
+    def create_campaign(self, request):
+        """
+        Create a campaign and the schedules of its recipients with batched inserts.
+
+        Args:
+            request: The HTTP request object containing the campaign and its recipients.
+
+        Returns:
+            Response: JSON response with the campaign and HTTP status 201,
+                      or error details with HTTP status 400 if validation fails.
+        """
+        serializer = CampaignCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        campaign, created = create_campaign(
+            data["name"], data["message"], data["recipients"], data, settings.SCHEDULE_BULK_CREATE_BATCH_SIZE
+        )
+        campaign.recipients = created
+        return Response(CampaignSerializer(campaign).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        method="post",
+        request_body=CampaignRecipientsSerializer,
+        responses={200: CampaignSerializer, 400: "Bad Request", 404: "Not Found"},
+        operation_description="Adds recipients to a campaign, e.g. to load a large list in several requests."
+    )
+    @action(detail=True, methods=["post"])
+    def add_recipients(self, request, pk=None):
+        """
+        Create schedules for more recipients of an existing campaign.
+
+        Args:
+            request: The HTTP request object containing the recipients.
+            pk (int): Primary key of the campaign.
+
+        Returns:
+            Response: JSON response with the campaign and HTTP status 200, HTTP status 400 if validation
+                      fails, or HTTP status 404 if the campaign does not exist.
+        """
+        campaign = get_object_or_404(Campaign, pk=pk)
+        serializer = CampaignRecipientsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        add_recipients(campaign, data["recipients"], data, settings.SCHEDULE_BULK_CREATE_BATCH_SIZE)
+        campaign.recipients = campaign.schedules.count()
+        return Response(CampaignSerializer(campaign).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        method="get",
+        responses={200: CampaignSerializer, 404: "Not Found"},
+        operation_description="Retrieves a campaign and its number of recipients."
+    )
+    @action(detail=True, methods=["get"])
+    def check(self, request, pk=None):
+        """
+        Retrieve a campaign by ID.
+
+        Args:
+            request: The HTTP request object.
+            pk (int): Primary key of the campaign.
+
+        Returns:
+            Response: JSON response with the campaign and HTTP status 200,
+                      or HTTP status 404 if the campaign does not exist.
+        """
+        campaign = get_object_or_404(Campaign.objects.annotate(recipients=Count("schedules")), pk=pk)
+        return Response(CampaignSerializer(campaign).data, status=status.HTTP_200_OK)
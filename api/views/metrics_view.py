@@ -0,0 +1,20 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from api.services.metrics import registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@require_GET
+def metrics(request):
+    """
+    Expose the metrics of every process of the deployment in the Prometheus text format.
+
+    Args:
+        request: The HTTP request object.
+
+    Returns:
+        HttpResponse: The metrics, with HTTP status 200.
+    """
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
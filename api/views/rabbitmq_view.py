@@ -1,18 +1,36 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from api.services.rabbitmq import RabbitmqService
+from api.services.broker import BrokerBackend, get_broker
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.response import Response
 from drf_yasg import openapi
+from django.utils.http import parse_etags
+from api.services.management import ManagementApiError, ManagementResponse
+from api.services import dead_letters, delay_tiers, topology
+from api.serializers import (
+    DeadLetterPageSerializer,
+    DeadLetterReplayRequestSerializer,
+    DeadLetterReplaySerializer,
+    DelayTiersSerializer,
+    TopologySerializer,
+)
+from collections import Counter
+from pika.exceptions import AMQPConnectionError
 
 
 class RabbitMqViewSet(viewsets.ViewSet):
     """
     ViewSet for managing RabbitMQ resources such as exchanges and queues.
     """
-    rabbit_service = RabbitmqService()
     permission_classes = []
 
+    @property
+    def broker(self) -> BrokerBackend:
+        """
+        The broker backend selected by the `BROKER_BACKEND` setting.
+        """
+        return get_broker()
+
     @swagger_auto_schema(
         method="post",
         operation_description="Creates an exchange in RabbitMQ",
@@ -46,7 +64,7 @@ class RabbitMqViewSet(viewsets.ViewSet):
             if not exchange_name:
                 return Response({"detail": "All fields are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            self.rabbit_service.create_exchange(exchange_name)
+            self.broker.create_exchange(exchange_name)
 
             return Response({"detail": f"Exchange {exchange_name} created successfully!"}, status=status.HTTP_200_OK)
         
@@ -55,30 +73,40 @@ class RabbitMqViewSet(viewsets.ViewSet):
 
     @swagger_auto_schema(
         method="post",
-        operation_description="Creates a queue in RabbitMQ",
+        operation_description=(
+            "Creates a queue in RabbitMQ. With dead_letter, its rejected and expired messages are routed "
+            "through the fanout exchange '<queue>.dlx' to the queue '<queue>.dlq', and the entities are "
+            "reported like apply_topology."
+        ),
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
                 'queue_name': openapi.Schema(type=openapi.TYPE_STRING, description="Name of the queue"),
+                'dead_letter': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN, description="Also create its dead-letter queue", default=False
+                ),
             },
             required=['queue_name']
         ),
         responses={
             200: openapi.Response('Queue created successfully!', None),
+            207: openapi.Response('Some entities conflict or failed, see the per-entity results', None),
             400: openapi.Response('Parameter error!', None),
-            500: openapi.Response('Internal server error!', None)
+            500: openapi.Response('Internal server error!', None),
+            503: openapi.Response('Broker unavailable', None),
         }
     )
     @action(detail=False, methods=["post"])
     def create_queue(self, request):
         """
-        Creates a new queue in RabbitMQ.
+        Creates a new queue in RabbitMQ, optionally with a dead-letter queue.
 
         Args:
-            request: The HTTP request containing the queue name.
+            request: The HTTP request containing the queue name and the `dead_letter` flag.
 
         Returns:
-            Response: A response indicating the result of the queue creation.
+            Response: A response indicating the result of the queue creation, or with `dead_letter`
+                      the result of each entity as returned by `apply_topology`.
         """
         try:
             queue_name = request.data.get("queue_name")
@@ -86,7 +114,13 @@ class RabbitMqViewSet(viewsets.ViewSet):
             if not queue_name:
                 return Response({"detail": "All fields are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            self.rabbit_service.create_queue(queue_name)
+            if str(request.data.get("dead_letter", "")).lower() in ("1", "true"):
+                try:
+                    return self._topology_response(dead_letters.provision(self.broker, queue_name))
+                except (AMQPConnectionError, ManagementApiError) as e:
+                    return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            self.broker.create_queue(queue_name)
 
             return Response({"detail": f"Queue {queue_name} created successfully!"}, status=status.HTTP_200_OK)
         
@@ -131,16 +165,218 @@ class RabbitMqViewSet(viewsets.ViewSet):
             if not queue_name:
                 return Response({"detail": "All fields are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            self.rabbit_service.queue_bind(exchange_name, queue_name, rout_key_name)
+            self.broker.queue_bind(exchange_name, queue_name, rout_key_name)
 
             return Response({"detail": f"Bind completed successfully!"}, status=status.HTTP_200_OK)
         
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+    @swagger_auto_schema(
+        method="post",
+        operation_description=(
+            "Applies a full topology (exchanges, queues, bindings). Only the entities missing from the "
+            "broker are declared, over a single channel; each entity is reported as created, unchanged, "
+            "conflict (exists with other attributes) or failed."
+        ),
+        request_body=TopologySerializer,
+        responses={
+            200: openapi.Response("Every entity is created or unchanged", None),
+            207: openapi.Response("Some entities conflict or failed, see the per-entity results", None),
+            400: openapi.Response("Parameter error!", None),
+            503: openapi.Response("Broker unavailable", None),
+        }
+    )
+    @action(detail=False, methods=["post"])
+    def apply_topology(self, request):
+        """
+        Brings RabbitMQ to the given topology, declaring only what it lacks.
+
+        The current state is read from the cached management API, so provisioning hundreds of queues
+        costs three management reads and one AMQP channel instead of a request and a connection per entity.
+
+        Args:
+            request: The HTTP request containing the exchanges, queues and bindings.
+
+        Returns:
+            Response: The result of each entity and a count per result, with HTTP status 200 when
+                      nothing conflicts or fails, 207 otherwise, 400 for an invalid spec, or 503
+                      when the broker cannot be reached.
+        """
+        serializer = TopologySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            results = topology.apply(self.broker, serializer.to_topology())
+        except (AMQPConnectionError, ManagementApiError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return self._topology_response(results)
+
+    @swagger_auto_schema(
+        method="post",
+        operation_description=(
+            "Provisions the delay tiers of an exchange, used when SCHEDULE_DISPATCH_MODE is 'delayed': for each "
+            "delay, a fanout exchange and a queue '<exchange>.delay.<delay>s' whose messages expire after the delay "
+            "and are dead-lettered to the router queue 'schedule_delay.router', which the route_delays command "
+            "forwards to the next tier or to the exchange. Results are reported like apply_topology."
+        ),
+        request_body=DelayTiersSerializer,
+        responses={
+            200: openapi.Response("Every entity is created or unchanged", None),
+            207: openapi.Response("Some entities conflict or failed, see the per-entity results", None),
+            400: openapi.Response("Parameter error!", None),
+            503: openapi.Response("Broker unavailable", None),
+        }
+    )
+    @action(detail=False, methods=["post"])
+    def delay_tiers(self, request):
+        """
+        Declares the TTL/dead-letter delay tiers of an exchange, and their router queue, that RabbitMQ lacks.
+
+        Args:
+            request: The HTTP request containing the exchange name and, optionally, the tier delays in seconds.
+
+        Returns:
+            Response: The result of each entity and a count per result, with HTTP status 200 when
+                      nothing conflicts or fails, 207 otherwise, 400 for invalid parameters, or 503
+                      when the broker cannot be reached.
+        """
+        serializer = DelayTiersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            results = delay_tiers.provision(
+                self.broker, serializer.validated_data["exchange_name"], serializer.validated_data.get("delays")
+            )
+        except (AMQPConnectionError, ManagementApiError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return self._topology_response(results)
+
     @swagger_auto_schema(
         method="get",
-        operation_description="Lists all exchanges in RabbitMQ",
+        operation_description=(
+            "Lists a page of the messages of a dead-letter queue without consuming them: the messages are "
+            "read through the management API and requeued in place. Each message has a fingerprint, used "
+            "to select it for a replay, and the exchange and routing key it was dead-lettered from."
+        ),
+        query_serializer=DeadLetterPageSerializer,
+        responses={
+            200: openapi.Response("A page of messages", None),
+            400: openapi.Response("Parameter error!", None),
+            503: openapi.Response("Broker unavailable or queue not found", None),
+        }
+    )
+    @action(detail=False, methods=["get"])
+    def dead_letters(self, request):
+        """
+        Peeks at a page of dead-lettered messages.
+
+        Args:
+            request: The HTTP request with the `queue_name`, `page` and `page_size` query parameters.
+
+        Returns:
+            Response: The number of messages in the queue and the messages of the page, HTTP status
+                      400 for invalid parameters, or 503 when the management API fails.
+        """
+        serializer = DeadLetterPageSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        try:
+            total, messages = dead_letters.peek(
+                self.broker, params["queue_name"], (params["page"] - 1) * params["page_size"], params["page_size"]
+            )
+        except ManagementApiError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(
+            {"count": total, "page": params["page"], "page_size": params["page_size"], "results": messages},
+            status=status.HTTP_200_OK,
+        )
+
+    @swagger_auto_schema(
+        method="post",
+        operation_description=(
+            "Republishes the selected (by fingerprint) or all messages of a dead-letter queue to the exchange "
+            "and routing key they were dead-lettered from, in batches with publisher confirms. A message "
+            "leaves the queue only once its copy is confirmed. The replayed and failed counts are recorded."
+        ),
+        request_body=DeadLetterReplayRequestSerializer,
+        responses={
+            200: DeadLetterReplaySerializer,
+            400: openapi.Response("Parameter error!", None),
+            503: openapi.Response("Broker unavailable, see the error of the recorded replay", None),
+        }
+    )
+    @action(detail=False, methods=["post"])
+    def replay_dead_letters(self, request):
+        """
+        Replays dead-lettered messages to their original exchange and routing key.
+
+        Args:
+            request: The HTTP request containing the queue name and the `fingerprints` to replay, or `all`.
+
+        Returns:
+            Response: The recorded replay with HTTP status 200, 400 for invalid parameters, or 503
+                      when the broker failed, with the replay recorded up to the failure if it started.
+        """
+        serializer = DeadLetterReplayRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        try:
+            replay = dead_letters.replay(
+                self.broker, params["queue_name"], params.get("fingerprints"), limit=params.get("limit")
+            )
+        except (AMQPConnectionError, ManagementApiError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(
+            DeadLetterReplaySerializer(replay).data,
+            status=status.HTTP_503_SERVICE_UNAVAILABLE if replay.error else status.HTTP_200_OK,
+        )
+
+    @staticmethod
+    def _topology_response(results) -> Response:
+        """
+        Answers with the result of each entity of a topology and a count per result.
+
+        Args:
+            results: The `TopologyResult` list returned by `api.services.topology.apply`.
+
+        Returns:
+            Response: HTTP status 200 when nothing conflicts or fails, 207 otherwise.
+        """
+        summary = Counter(result.result for result in results)
+        ok = set(summary) <= {topology.CREATED, topology.UNCHANGED}
+        return Response(
+            {"results": [result._asdict() for result in results], "summary": dict(summary)},
+            status=status.HTTP_200_OK if ok else status.HTTP_207_MULTI_STATUS,
+        )
+
+    def _conditional_response(self, request, resource: ManagementResponse) -> Response:
+        """
+        Answers with the resource, or with 304 Not Modified when the client already holds its current version.
+
+        Args:
+            request: The HTTP request, possibly carrying an If-None-Match header.
+            resource: The cached management API response.
+
+        Returns:
+            Response: HTTP status 200 with the data, or 304 without a body; both carry the ETag.
+        """
+        etags = parse_etags(request.headers.get("If-None-Match", ""))
+        if "*" in etags or resource.etag in etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(resource.data, status=status.HTTP_200_OK)
+        response["ETag"] = resource.etag
+        return response
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description=(
+            "Lists all exchanges in RabbitMQ. Send the returned ETag in If-None-Match to get 304 when nothing changed."
+        ),
+        responses={200: "The exchanges", 304: "Not Modified"},
     )
     @action(detail=False, methods=["get"])
     def list_exchanges(self, request):
@@ -151,14 +387,16 @@ class RabbitMqViewSet(viewsets.ViewSet):
             request: The HTTP request to list exchanges.
 
         Returns:
-            Response: A response containing the list of exchanges.
+            Response: A response containing the list of exchanges, or 304 if the client's copy is current.
         """
-        return Response(self.rabbit_service.list_exchanges(), status=status.HTTP_200_OK)
-    
+        return self._conditional_response(request, self.broker.management_get("exchanges"))
 
     @swagger_auto_schema(
         method="get",
-        operation_description="Lists all queues in RabbitMQ",
+        operation_description=(
+            "Lists all queues in RabbitMQ. Send the returned ETag in If-None-Match to get 304 when nothing changed."
+        ),
+        responses={200: "The queues", 304: "Not Modified"},
     )
     @action(detail=False, methods=["get"])
     def list_queues(self, request):
@@ -169,6 +407,6 @@ class RabbitMqViewSet(viewsets.ViewSet):
             request: The HTTP request to list queues.
 
         Returns:
-            Response: A response containing the list of queues.
+            Response: A response containing the list of queues, or 304 if the client's copy is current.
         """
-        return Response(self.rabbit_service.list_queues(), status=status.HTTP_200_OK)
+        return self._conditional_response(request, self.broker.management_get("queues"))
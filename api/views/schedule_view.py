@@ -1,18 +1,41 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from api.models import CommunicationSchedule, Channel, Status
 from api.serializers import (
+    BulkSelectionSerializer,
+    BulkTransitionSerializer,
     CommunicationScheduleSerializer,
+    ChannelRateLimitSerializer,
     ChannelSerializer,
     ScheduleDetailSerializer,
+    ScheduleStatSerializer,
+    ScheduleStatsQuerySerializer,
     ScheduleUpdateSerializer,
     StatusSerializer,
 )
-from api.services.rabbitmq import RabbitmqService
+from api.exports import EXPORT_FORMATS
+from api.filters import CommunicationScheduleFilter
+from api.pagination import ScheduleKeysetPagination
+from api.parsers import NDJSONParser
+from api.services import idempotency, outbox, stats, status_events
+from api.services.metrics import SERIALIZER_SECONDS
+from api.services.reference_data import channels, statuses
+from api.services.transitions import apply_transition, transition_filtered, transition_ids
+from api.throttling import ChannelRateThrottle
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    idempotency.HEADER, openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+    description="Unique key of the request; retries with the same key replay the first response.",
+)
+
 
 class CommunicationScheduleViewSet(viewsets.ViewSet):
     """
@@ -41,9 +64,37 @@ class CommunicationScheduleViewSet(viewsets.ViewSet):
         Returns:
             Response: JSON response with a list of channels and HTTP status 200.
         """
-        serializer = ChannelSerializer(self.channel_queryset, many=True)
+        serializer = ChannelSerializer(channels.all(), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        method="put",
+        request_body=ChannelRateLimitSerializer,
+        responses={200: ChannelSerializer, 400: "Bad Request", 404: "Not Found"},
+        operation_description="Changes the rate limit of a channel; dispatchers and the API apply it without a restart."
+    )
+    @action(detail=False, methods=["put"], url_path=r"channels/(?P<name>[^/.]+)/rate_limit")
+    def update_channel_rate_limit(self, request, name=None):
+        """
+        Update the token bucket limit of a channel.
+
+        The other processes pick the change up when their channel cache expires (`REFERENCE_DATA_CACHE_TTL`).
+
+        Args:
+            request: The HTTP request object with `rate_limit` (messages per second, null for no limit) and `burst`.
+            name (str): The name of the channel.
+
+        Returns:
+            Response: JSON response with the channel and HTTP status 200, or HTTP status 400 if
+                      validation fails, or HTTP status 404 if the channel does not exist.
+        """
+        channel = get_object_or_404(Channel, name=name)
+        serializer = ChannelRateLimitSerializer(channel, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save()
+        return Response(ChannelSerializer(channel).data)
+
     @swagger_auto_schema(
         method="get",
         responses={200: StatusSerializer(many=True)},
@@ -60,19 +111,86 @@ class CommunicationScheduleViewSet(viewsets.ViewSet):
         Returns:
             Response: JSON response with a list of statuses and HTTP status 200.
         """
-        serializer = StatusSerializer(self.status_queryset, many=True)
+        serializer = StatusSerializer(statuses.all(), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        method="get",
+        manual_parameters=[
+            openapi.Parameter(
+                "day_from", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                description="First UTC day counted",
+            ),
+            openapi.Parameter(
+                "day_to", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                description="Last UTC day counted",
+            ),
+            openapi.Parameter("channel", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Channel name"),
+            openapi.Parameter("status", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Status name"),
+            openapi.Parameter(
+                "group_by", openapi.IN_QUERY, type=openapi.TYPE_STRING, default="day,channel,status",
+                description="Comma-separated fields among day, channel and status; empty for one total",
+            ),
+        ],
+        responses={200: ScheduleStatSerializer(many=True), 400: "Bad Request"},
+        operation_description="Counts schedules per day, channel and status from the precomputed counters."
+    )
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        """
+        Count schedules by (UTC) day of their scheduled datetime, channel and status.
+
+        Reads only the `ScheduleStat` counters, kept up to date by every write, so the cost does not
+        grow with the number of schedules.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: JSON response with one count per group and HTTP status 200,
+                      or the parameter errors with HTTP status 400.
+        """
+        serializer = ScheduleStatsQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        query = serializer.validated_data
+        rows = stats.summary(
+            group_by=query["group_by"],
+            day_from=query.get("day_from"),
+            day_to=query.get("day_to"),
+            channel_id=query["channel"].pk if "channel" in query else None,
+            status_id=query["status"].pk if "status" in query else None,
+        )
+        return Response(ScheduleStatSerializer(rows, many=True).data)
+
     @swagger_auto_schema(
         method="post",
         request_body=CommunicationScheduleSerializer,
-        responses={201: CommunicationScheduleSerializer, 400: "Bad Request"},
-        operation_description="Creates a communication schedule and sends a message to the specified exchange."
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: CommunicationScheduleSerializer,
+            400: "Bad Request",
+            422: "Idempotency key reused",
+            429: "Channel over its rate limit, retry after Retry-After seconds",
+        },
+        operation_description=(
+            "Creates a communication schedule. Its message is published to the specified exchange "
+            "at the scheduled datetime by the dispatcher, right away when SCHEDULE_DISPATCH_MODE is 'immediate', "
+            "or through the broker delay tiers when it is 'delayed'. "
+            "A request retried with the same Idempotency-Key returns the original response without creating "
+            "the schedule again."
+        )
     )
-    @action(detail=False, methods=["post"])
+    @action(detail=False, methods=["post"], throttle_classes=[ChannelRateThrottle])
     def create_schedule(self, request):
         """
-        Create a new communication schedule and send a message to the RabbitMQ exchange.
+        Create a new communication schedule whose message is sent to the RabbitMQ exchange.
+
+        By default the `dispatch_schedules` command publishes the message at the scheduled datetime.
+        When `SCHEDULE_DISPATCH_MODE` is "immediate", an outbox message is written in the same
+        transaction and published by the `relay_outbox` command. When it is "delayed", that message
+        waits in the delay tiers until the scheduled datetime (see `api.services.delay_tiers`).
+        Either way the request does not wait on the broker.
 
         Args:
             request: The HTTP request object containing the schedule data.
@@ -81,41 +199,235 @@ class CommunicationScheduleViewSet(viewsets.ViewSet):
             Response: JSON response with the created schedule data and HTTP status 201, 
                       or error details with HTTP status 400 if validation fails.
         """
-        serializer = CommunicationScheduleSerializer(data=request.data)
-        if serializer.is_valid():
+        return self._idempotent(request, "create_schedule", lambda: self._create_schedule(request.data))
+
+    def _create_schedule(self, data):
+        serializer = CommunicationScheduleSerializer(data=data)
+        if not serializer.is_valid():
+            return status.HTTP_400_BAD_REQUEST, serializer.errors, None
+        validated_data = serializer.validated_data
+        with transaction.atomic():
             schedule = CommunicationSchedule.objects.create(
-                recipient=request.data["recipient"],
-                message=request.data["message"],
-                scheduled_datetime=request.data["scheduled_datetime"],
-                channel=Channel.objects.get(name=request.data["channel"]),
-                status=Status.objects.get(name="scheduled"),
+                recipient=validated_data["recipient"],
+                message=validated_data["message"],
+                scheduled_datetime=validated_data["scheduled_datetime"],
+                channel=validated_data["channel"],
+                status=statuses.get("scheduled"),
+                exchange=validated_data["exchange"],
+                routing_key=validated_data.get("rout_key_name", ""),
             )
-            exchange = serializer.validated_data["exchange"]
-            rout_key_name = serializer.validated_data.get("rout_key_name", "")
-            RabbitmqService().send_message(
-                exchange, rout_key_name, {"id": schedule.id}
+            stats.record_created([schedule])
+            outbox.enqueue_schedules([schedule])
+        return status.HTTP_201_CREATED, ScheduleDetailSerializer(schedule).data, schedule.id
+
+    def _idempotent(self, request, scope, operation):
+        # Runs `operation` once per Idempotency-Key; requests without the header always run it.
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            status_code, body, _ = operation()
+            return Response(body, status=status_code)
+        if not 0 < len(key) <= idempotency.MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"The {idempotency.HEADER} header must have 1 to {idempotency.MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            stored, replayed = idempotency.run(scope, key, request.data, operation)
+        except idempotency.IdempotencyConflict as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = Response(stored.body, status=stored.status_code)
+        if replayed:
+            response[idempotency.REPLAYED_HEADER] = "true"
+        return response
+
+    @swagger_auto_schema(
+        method="post",
+        request_body=CommunicationScheduleSerializer(many=True),
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: "All items created",
+            207: "Some items created, see the per-item results",
+            400: "Bad Request",
+            422: "Idempotency key reused",
+            429: "Channel over its rate limit, retry after Retry-After seconds",
+        },
+        operation_description=(
+            "Creates many communication schedules at once. Accepts a JSON array or an NDJSON stream "
+            "(`application/x-ndjson`) and reports a result for each item."
+        )
+    )
+    @action(
+        detail=False, methods=["post"], parser_classes=[JSONParser, NDJSONParser], throttle_classes=[ChannelRateThrottle]
+    )
+    def bulk_create(self, request):
+        """
+        Create many communication schedules with batched inserts. Messages are published like in `create_schedule`.
+
+        Every item is validated independently: invalid items are reported with their errors while
+        the valid ones are still created.
+
+        Args:
+            request: The HTTP request object containing a list of schedules.
+
+        Returns:
+            Response: JSON response with a result per item and HTTP status 201 if every item was created,
+                      207 if only some of them were, or 400 if none was.
+        """
+        return self._idempotent(request, "bulk_create", lambda: self._bulk_create(request.data))
+
+    def _bulk_create(self, data):
+        serializer = CommunicationScheduleSerializer(
+            data=data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.SCHEDULE_BULK_CREATE_MAX_ITEMS,
+        )
+        if not serializer.is_valid():
+            return status.HTTP_400_BAD_REQUEST, serializer.errors, None
+
+        scheduled = statuses.get("scheduled")
+        valid_items = [item for item in serializer.validated_data if item is not None]
+        schedules = [
+            CommunicationSchedule(
+                recipient=item["recipient"],
+                message=item["message"],
+                scheduled_datetime=item["scheduled_datetime"],
+                channel=item["channel"],
+                status=scheduled,
+                exchange=item["exchange"],
+                routing_key=item.get("rout_key_name", ""),
             )
-            return Response(ScheduleDetailSerializer(schedule).data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            for item in valid_items
+        ]
+        if schedules:
+            with transaction.atomic():
+                CommunicationSchedule.objects.bulk_create(
+                    schedules, batch_size=settings.SCHEDULE_BULK_CREATE_BATCH_SIZE
+                )
+                stats.record_created(schedules)
+                outbox.enqueue_schedules(schedules, batch_size=settings.SCHEDULE_BULK_CREATE_BATCH_SIZE)
+
+        created = iter(schedules)
+        results = []
+        for index, errors in enumerate(serializer.item_errors):
+            if errors:
+                results.append({"index": index, "status": "invalid", "errors": errors})
+            else:
+                results.append(
+                    {"index": index, "status": "created", "data": ScheduleDetailSerializer(next(created)).data}
+                )
+
+        if not schedules:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(schedules) < len(results):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        body = {"created": len(schedules), "failed": len(results) - len(schedules), "results": results}
+        return response_status, body, None
 
     @swagger_auto_schema(
         method="get",
+        manual_parameters=[
+            openapi.Parameter("status", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Status name"),
+            openapi.Parameter("channel", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Channel name"),
+            openapi.Parameter("recipient", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Recipient"),
+            openapi.Parameter("campaign", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Campaign id"),
+            openapi.Parameter(
+                "scheduled_after", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                description="Only schedules at or after this datetime",
+            ),
+            openapi.Parameter(
+                "scheduled_before", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                description="Only schedules before this datetime",
+            ),
+            openapi.Parameter("cursor", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Pagination cursor"),
+            openapi.Parameter("page_size", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Rows per page"),
+        ],
         responses={200: ScheduleDetailSerializer(many=True)},
-        operation_description="Lists all schedules."
+        operation_description="Lists schedules ordered by scheduled datetime, one page at a time."
     )
     @action(detail=False, methods=["get"])
     def get_schedules(self, request):
         """
-        Retrieve all communication schedules.
+        Retrieve a page of communication schedules, optionally filtered.
+
+        Pages are ordered by (scheduled_datetime, id); the `next` link carries the cursor of the following page.
+        Rows are read with `.values()` and serialized by `ScheduleDetailSerializer.from_values`.
 
         Args:
             request: The HTTP request object.
 
         Returns:
-            Response: JSON response with a list of schedules and HTTP status 200.
+            Response: JSON response with the `next` link and the page `results` and HTTP status 200,
+                      or the filter errors with HTTP status 400.
         """
-        serializer = ScheduleDetailSerializer(CommunicationSchedule.objects.all(), many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        filterset = CommunicationScheduleFilter(request.query_params, queryset=CommunicationSchedule.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        paginator = ScheduleKeysetPagination()
+        paginator.values_fields = ScheduleDetailSerializer.values_fields
+        page = paginator.paginate_queryset(filterset.qs, request, view=self)
+        with SERIALIZER_SECONDS.time(serializer="ScheduleDetailSerializer", phase="values"):
+            results = list(ScheduleDetailSerializer.from_values(page))
+        return paginator.get_paginated_response(results)
+
+    @swagger_auto_schema(
+        method="get",
+        manual_parameters=[
+            openapi.Parameter(
+                "export_format", openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS),
+                default="ndjson", description="Output format",
+            ),
+            openapi.Parameter("status", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Status name"),
+            openapi.Parameter("channel", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Channel name"),
+            openapi.Parameter("recipient", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Recipient"),
+            openapi.Parameter("campaign", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Campaign id"),
+            openapi.Parameter(
+                "scheduled_after", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                description="Only schedules at or after this datetime",
+            ),
+            openapi.Parameter(
+                "scheduled_before", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                description="Only schedules before this datetime",
+            ),
+        ],
+        responses={200: "The schedules as NDJSON or CSV", 400: "Bad Request"},
+        operation_description=(
+            "Streams every schedule matching the filters, ordered by scheduled datetime, as NDJSON or CSV."
+        )
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream all communication schedules matching the filters of `get_schedules`.
+
+        Rows are read from the database in chunks of `SCHEDULE_EXPORT_CHUNK_SIZE` and written to the
+        response as they arrive, so memory use stays flat whatever the number of schedules.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            StreamingHttpResponse: The schedules as NDJSON (default) or CSV with HTTP status 200,
+                                   or a JSON response with the errors and HTTP status 400.
+        """
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"export_format": [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        filterset = CommunicationScheduleFilter(request.query_params, queryset=CommunicationSchedule.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, stream = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream(filterset.qs, settings.SCHEDULE_EXPORT_CHUNK_SIZE), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="schedules.{export_format}"'
+        return response
 
     @swagger_auto_schema(
         method="get",
@@ -141,7 +453,7 @@ class CommunicationScheduleViewSet(viewsets.ViewSet):
 
     @swagger_auto_schema(
         method="post",
-        responses={200: ScheduleDetailSerializer, 404: "Not Found"},
+        responses={200: ScheduleDetailSerializer, 404: "Not Found", 409: "The schedule was already sent"},
         operation_description="Cancel a schedule by ID."
     )
     @action(detail=True, methods=["post"])
@@ -149,20 +461,88 @@ class CommunicationScheduleViewSet(viewsets.ViewSet):
         """
         Cancel a specific schedule by setting its status to "canceled".
 
+        Canceling an already canceled schedule is a no-op; sent schedules cannot be canceled.
+
         Args:
             request: The HTTP request object.
             pk (int): Primary key of the schedule.
 
         Returns:
             Response: JSON response with the canceled schedule details and HTTP status 200,
-                      or HTTP status 404 if the schedule does not exist.
+                      HTTP status 404 if the schedule does not exist, or 409 if it can no longer be canceled.
         """
+        apply_transition(CommunicationSchedule.objects.filter(pk=pk), "canceled")
         schedule = get_object_or_404(CommunicationSchedule, pk=pk)
-        schedule.status = Status.objects.get(name="canceled")
-        schedule.save()
+        current = statuses.name_for(schedule.status_id)
+        if current != "canceled":
+            return Response(
+                {"detail": f"A {current} schedule cannot be canceled."},
+                status=status.HTTP_409_CONFLICT,
+            )
         serializer = ScheduleDetailSerializer(schedule)
         return Response(serializer.data)
 
+    def _bulk_transition(self, selection, target):
+        chunk_size = settings.SCHEDULE_BULK_UPDATE_CHUNK_SIZE
+        if "ids" in selection:
+            result = transition_ids(selection["ids"], target, chunk_size)
+        else:
+            queryset = CommunicationScheduleFilter(selection["filter"], queryset=CommunicationSchedule.objects.all()).qs
+            result = transition_filtered(queryset, target, chunk_size)
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        method="post",
+        request_body=BulkSelectionSerializer,
+        responses={200: "Counts of matched, updated and skipped schedules", 400: "Bad Request"},
+        operation_description=(
+            "Cancels many schedules at once, selected by `ids` or by a `filter` with the filters of get_schedules. "
+            "Only schedules that can still be canceled are updated."
+        )
+    )
+    @action(detail=False, methods=["post"])
+    def bulk_cancel(self, request):
+        """
+        Cancel many schedules with set-based UPDATEs, `SCHEDULE_BULK_UPDATE_CHUNK_SIZE` rows at a time.
+
+        Args:
+            request: The HTTP request object containing `ids` or `filter`.
+
+        Returns:
+            Response: JSON response with the counts and HTTP status 200,
+                      or error details with HTTP status 400 if validation fails.
+        """
+        serializer = BulkSelectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self._bulk_transition(serializer.validated_data, "canceled")
+
+    @swagger_auto_schema(
+        method="post",
+        request_body=BulkTransitionSerializer,
+        responses={200: "Counts of matched, updated and skipped schedules", 400: "Bad Request"},
+        operation_description=(
+            "Moves many schedules to another status, selected by `ids` or by a `filter`. "
+            "Schedules whose current status does not allow the transition are skipped."
+        )
+    )
+    @action(detail=False, methods=["post"])
+    def bulk_transition(self, request):
+        """
+        Move many schedules to a new status with set-based UPDATEs, `SCHEDULE_BULK_UPDATE_CHUNK_SIZE` rows at a time.
+
+        Args:
+            request: The HTTP request object containing `status` and `ids` or `filter`.
+
+        Returns:
+            Response: JSON response with the counts and HTTP status 200,
+                      or error details with HTTP status 400 if validation fails.
+        """
+        serializer = BulkTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self._bulk_transition(serializer.validated_data, serializer.validated_data["status"])
+
     @swagger_auto_schema(
         method="put",
         request_body=ScheduleUpdateSerializer,
@@ -186,10 +566,17 @@ class CommunicationScheduleViewSet(viewsets.ViewSet):
             Response: JSON response with the updated schedule details and HTTP status 200,
                       or HTTP status 400 if validation fails, or HTTP status 404 if the schedule does not exist.
         """
-        schedule = get_object_or_404(CommunicationSchedule, pk=pk)
-        serializer = ScheduleUpdateSerializer(schedule, data=request.data, partial=True)
-        if serializer.is_valid():
+        with transaction.atomic():
+            # Locked so a concurrent transition cannot move the schedule between reading and counting it.
+            schedule = get_object_or_404(CommunicationSchedule.objects.select_for_update(), pk=pk)
+            before = stats.key_of(schedule)
+            serializer = ScheduleUpdateSerializer(schedule, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             serializer.save()
-            serializer = ScheduleDetailSerializer(schedule)
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            after = stats.key_of(schedule)
+            stats.record_change(before, after)
+            if after[2] != before[2]:
+                status_events.emit([status_events.StatusEvent(schedule.id, schedule.channel_id, schedule.status_id)])
+        serializer = ScheduleDetailSerializer(schedule)
+        return Response(serializer.data)
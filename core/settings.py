@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 from django.core.management.utils import get_random_secret_key
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     # DRF
     "rest_framework",
+    "django_filters",
     # API
     "api",
     # DRF YASG
@@ -48,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -140,4 +143,120 @@ REST_FRAMEWORK = {
 RABBIT_MQ_HOST = os.getenv("RABBIT_MQ_HOST", "rabbitmq")
 RABBIT_MQ_PORT = os.getenv("RABBIT_MQ_PORT", "5672")
 RABBIT_MQ_USER = os.getenv("RABBIT_MQ_USER", 'guest')
-RABBIT_MQ_PASSWORD = os.getenv("RABBIT_MQ_PASSWORD", 'guest')
\ No newline at end of file
+RABBIT_MQ_PASSWORD = os.getenv("RABBIT_MQ_PASSWORD", 'guest')
+
+# RABBIT_MQ connection pool
+RABBIT_MQ_POOL_SIZE = int(os.getenv("RABBIT_MQ_POOL_SIZE", "10"))
+RABBIT_MQ_POOL_TIMEOUT = float(os.getenv("RABBIT_MQ_POOL_TIMEOUT", "5"))
+RABBIT_MQ_HEARTBEAT = int(os.getenv("RABBIT_MQ_HEARTBEAT", "60"))
+RABBIT_MQ_BLOCKED_CONNECTION_TIMEOUT = float(os.getenv("RABBIT_MQ_BLOCKED_CONNECTION_TIMEOUT", "300"))
+RABBIT_MQ_CONNECTION_ATTEMPTS = int(os.getenv("RABBIT_MQ_CONNECTION_ATTEMPTS", "3"))
+RABBIT_MQ_RETRY_DELAY = float(os.getenv("RABBIT_MQ_RETRY_DELAY", "1"))
+
+# Broker backend: "api.services.rabbitmq.RabbitmqService" (AMQP) or
+# "api.services.memory_broker.InMemoryBroker" (in-process, for tests and load tests)
+BROKER_BACKEND = os.getenv("BROKER_BACKEND", "api.services.rabbitmq.RabbitmqService")
+
+# RABBIT_MQ management API
+RABBIT_MQ_MANAGEMENT_PORT = int(os.getenv("RABBIT_MQ_MANAGEMENT_PORT", "15672"))
+RABBIT_MQ_MANAGEMENT_CACHE_TTL = float(os.getenv("RABBIT_MQ_MANAGEMENT_CACHE_TTL", "5"))
+RABBIT_MQ_MANAGEMENT_TIMEOUT = float(os.getenv("RABBIT_MQ_MANAGEMENT_TIMEOUT", "10"))
+RABBIT_MQ_MANAGEMENT_POOL_SIZE = int(os.getenv("RABBIT_MQ_MANAGEMENT_POOL_SIZE", "4"))
+
+# RABBIT_MQ publisher confirms
+RABBIT_MQ_CONFIRM_WINDOW = int(os.getenv("RABBIT_MQ_CONFIRM_WINDOW", "1000"))
+RABBIT_MQ_CONFIRM_TIMEOUT = float(os.getenv("RABBIT_MQ_CONFIRM_TIMEOUT", "30"))
+
+# SCHEDULES
+SCHEDULE_BULK_CREATE_BATCH_SIZE = int(os.getenv("SCHEDULE_BULK_CREATE_BATCH_SIZE", "1000"))
+SCHEDULE_BULK_CREATE_MAX_ITEMS = int(os.getenv("SCHEDULE_BULK_CREATE_MAX_ITEMS", "50000"))
+SCHEDULE_PAGE_SIZE = int(os.getenv("SCHEDULE_PAGE_SIZE", "100"))
+SCHEDULE_MAX_PAGE_SIZE = int(os.getenv("SCHEDULE_MAX_PAGE_SIZE", "1000"))
+SCHEDULE_EXPORT_CHUNK_SIZE = int(os.getenv("SCHEDULE_EXPORT_CHUNK_SIZE", "2000"))
+SCHEDULE_BULK_UPDATE_CHUNK_SIZE = int(os.getenv("SCHEDULE_BULK_UPDATE_CHUNK_SIZE", "5000"))
+SCHEDULE_BULK_UPDATE_MAX_IDS = int(os.getenv("SCHEDULE_BULK_UPDATE_MAX_IDS", "100000"))
+
+# IDEMPOTENCY: cache alias and seconds keys stay in it, hours keys are kept in the database
+IDEMPOTENCY_CACHE = os.getenv("IDEMPOTENCY_CACHE", "default")
+IDEMPOTENCY_CACHE_TTL = int(os.getenv("IDEMPOTENCY_CACHE_TTL", "300"))
+IDEMPOTENCY_KEY_RETENTION_HOURS = int(os.getenv("IDEMPOTENCY_KEY_RETENTION_HOURS", "24"))
+
+# PARTITIONS (PostgreSQL): months created ahead, full months kept before the current one
+# (0 keeps everything) and where expired partitions are archived
+SCHEDULE_PARTITION_MONTHS_AHEAD = int(os.getenv("SCHEDULE_PARTITION_MONTHS_AHEAD", "3"))
+SCHEDULE_RETENTION_MONTHS = int(os.getenv("SCHEDULE_RETENTION_MONTHS", "0"))
+SCHEDULE_ARCHIVE_DIR = os.getenv("SCHEDULE_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+
+# Seconds before the in-process Channel/Status cache is reloaded (0 disables expiry)
+REFERENCE_DATA_CACHE_TTL = float(os.getenv("REFERENCE_DATA_CACHE_TTL", "60"))
+
+# CAMPAIGNS
+CAMPAIGN_MAX_RECIPIENTS = int(os.getenv("CAMPAIGN_MAX_RECIPIENTS", "100000"))
+# Campaign messages kept in memory per process to render the messages of their schedules
+CAMPAIGN_MESSAGE_CACHE_SIZE = int(os.getenv("CAMPAIGN_MESSAGE_CACHE_SIZE", "1024"))
+
+# OUTBOX
+OUTBOX_RELAY_BATCH_SIZE = int(os.getenv("OUTBOX_RELAY_BATCH_SIZE", "500"))
+OUTBOX_RELAY_POLL_INTERVAL = float(os.getenv("OUTBOX_RELAY_POLL_INTERVAL", "0.5"))
+# Messages the broker does not confirm are retried after OUTBOX_RETRY_DELAY seconds, doubled on
+# each attempt up to OUTBOX_RETRY_MAX_DELAY; messages refused OUTBOX_MAX_ATTEMPTS times are dropped
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "1"))
+OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+
+# DISPATCHER
+# "dispatcher" publishes schedules at their scheduled datetime (dispatch_schedules command);
+# "immediate" publishes them through the outbox as soon as they are created;
+# "delayed" publishes them through the outbox to the RabbitMQ delay tiers, TTL queues whose expired
+# messages the route_delays command forwards to the next tier, or to their exchange when due
+# (see SCHEDULE_DELAY_TIERS); only the wait beyond the largest tier is spent in the outbox.
+SCHEDULE_DISPATCH_MODE = os.getenv("SCHEDULE_DISPATCH_MODE", "dispatcher")
+# Delays, in seconds, of the delay tiers provisioned with rabbitmq/delay_tiers/.
+SCHEDULE_DELAY_TIERS = [
+    int(delay) for delay in os.getenv("SCHEDULE_DELAY_TIERS", "1,5,30,120,600,3600").split(",") if delay.strip()
+]
+DISPATCHER_LOOKAHEAD = float(os.getenv("DISPATCHER_LOOKAHEAD", "60"))
+DISPATCHER_REFILL_INTERVAL = float(os.getenv("DISPATCHER_REFILL_INTERVAL", "1"))
+DISPATCHER_BATCH_SIZE = int(os.getenv("DISPATCHER_BATCH_SIZE", "500"))
+DISPATCHER_MAX_PENDING = int(os.getenv("DISPATCHER_MAX_PENDING", "100000"))
+
+# DELAY ROUTER (route_delays command): max wait is the latency added to each hop between two tiers
+DELAY_ROUTER_PREFETCH = int(os.getenv("DELAY_ROUTER_PREFETCH", "500"))
+DELAY_ROUTER_BATCH_SIZE = int(os.getenv("DELAY_ROUTER_BATCH_SIZE", "200"))
+DELAY_ROUTER_MAX_WAIT = float(os.getenv("DELAY_ROUTER_MAX_WAIT", "0.05"))
+
+# RATE LIMITS: the dispatcher always paces channels with a rate limit (Channel.rate_limit/burst);
+# with admission enabled the schedule creation endpoints also answer 429 while a channel is over
+# its rate, sharing their token buckets through the given cache
+CHANNEL_RATE_LIMIT_ADMISSION = os.getenv("CHANNEL_RATE_LIMIT_ADMISSION", "false").lower() in ("1", "true", "yes")
+CHANNEL_RATE_LIMIT_CACHE = os.getenv("CHANNEL_RATE_LIMIT_CACHE", "default")
+
+# CONSUMER (consume command): delivery handler class by channel name, as JSON, e.g.
+# {"sms": "myproject.handlers.SmsHandler"}; other channels use the default handler
+CONSUMER_HANDLERS = json.loads(os.getenv("CONSUMER_HANDLERS", "{}"))
+CONSUMER_DEFAULT_HANDLER = os.getenv("CONSUMER_DEFAULT_HANDLER", "api.services.consumer.LoggingHandler")
+CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", "500"))
+CONSUMER_BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "200"))
+CONSUMER_MAX_WAIT = float(os.getenv("CONSUMER_MAX_WAIT", "0.5"))
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "1"))
+
+# STATUS EVENTS streamed by async/schedules/stream/: "local" streams the changes made by the same
+# process, "postgres" relays them through LISTEN/NOTIFY so streams see the changes of every process
+# (dispatcher included), "off" disables them
+SCHEDULE_STATUS_EVENTS = os.getenv("SCHEDULE_STATUS_EVENTS", "local")
+SCHEDULE_STREAM_HEARTBEAT = float(os.getenv("SCHEDULE_STREAM_HEARTBEAT", "15"))
+SCHEDULE_STREAM_QUEUE_SIZE = int(os.getenv("SCHEDULE_STREAM_QUEUE_SIZE", "1000"))
+SCHEDULE_STREAM_MAX_IDS = int(os.getenv("SCHEDULE_STREAM_MAX_IDS", "1000"))
+
+# DEAD LETTERS: peeking reads up to DEAD_LETTER_PEEK_MAX messages from the head of a dead-letter
+# queue (they are requeued in place); a replay takes at most DEAD_LETTER_REPLAY_LIMIT messages
+# (at most 65535, the largest prefetch count) and republishes them in batches of DEAD_LETTER_REPLAY_BATCH_SIZE
+DEAD_LETTER_PAGE_SIZE = int(os.getenv("DEAD_LETTER_PAGE_SIZE", "50"))
+DEAD_LETTER_PEEK_MAX = int(os.getenv("DEAD_LETTER_PEEK_MAX", "1000"))
+DEAD_LETTER_REPLAY_BATCH_SIZE = int(os.getenv("DEAD_LETTER_REPLAY_BATCH_SIZE", "1000"))
+DEAD_LETTER_REPLAY_LIMIT = int(os.getenv("DEAD_LETTER_REPLAY_LIMIT", "50000"))
+
+# METRICS: with a directory set, each process writes its metrics there every METRICS_FLUSH_INTERVAL
+# seconds and /metrics adds up the files of every process (use one directory per deployment)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
@@ -2,7 +2,7 @@ from datetime import datetime
 from django.test import TestCase
 from django.utils import timezone
 from model_bakery import baker
-from api.models import Channel, Status, CommunicationSchedule
+from api.models import Campaign, Channel, Status, CommunicationSchedule
 
 
 class ChannelModelTest(TestCase):
@@ -71,9 +71,27 @@ class CommunicationScheduleModelTest(TestCase):
         self.assertEqual(schedule.status, self.status)
         self.assertEqual(str(schedule), f"{schedule.pk} -- {self.channel} to {schedule.recipient}")
 
+    def test_no_foreign_key_references_schedules(self):
+        """
+        Teste para garantir que nenhum modelo referencia CommunicationSchedule, particionada no PostgreSQL.
+        """
+        self.assertEqual(CommunicationSchedule._meta.related_objects, ())
+
     def test_communication_schedule_default_values(self):
         """
         Teste para verificar se os valores padrão são aplicados corretamente.
         """
         schedule = baker.make(CommunicationSchedule, recipient="jane.doe@example.com", message="Hello!")
         self.assertIsNotNone(schedule.created_at)
+
+
+class CampaignModelTest(TestCase):
+    def test_render_replaces_placeholders(self):
+        """
+        Teste para verificar se a mensagem da campanha é personalizada com as variáveis do destinatário.
+        """
+        campaign = baker.make(Campaign, name="Black Friday", message="Olá $name, use ${code}! Custa $$10.")
+        self.assertEqual(campaign.render({"name": "Ana", "code": "BF10"}), "Olá Ana, use BF10! Custa $10.")
+        self.assertEqual(campaign.render({"name": "Ana"}), "Olá Ana, use ${code}! Custa $10.")
+        self.assertEqual(campaign.render(None), campaign.message)
+        self.assertEqual(str(campaign), f"{campaign.pk} -- Black Friday")
@@ -0,0 +1,1066 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from importlib import import_module
+from io import StringIO
+from unittest.mock import MagicMock, patch
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from pika import spec
+from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker, StreamLostError
+from api.benchmarks import compare, run_suite
+from api.models import (
+    Campaign, Channel, CommunicationSchedule, DeadLetterReplay, IdempotencyKey, OutboxMessage, ScheduleStat, Status,
+)
+from api.serializers import ScheduleDetailSerializer
+from api.services import consumer as consumer_service, dead_letters, delay_tiers, idempotency, outbox, stats
+from api.services import status_events
+from api.services.async_rabbitmq import AsyncRabbitmqPublisher
+from api.services.connection_pool import ConnectionPool, PoolExhaustedError, build_connection_parameters
+from api.services.dispatcher import ScheduleDispatcher
+from api.services import metrics, partitions, topology
+from api.services.memory_broker import InMemoryBroker, topic_matches
+from api.services.management import ManagementApiClient, ManagementApiError
+from api.services.rabbitmq import RabbitmqConsumer, RabbitmqService
+from api.services.rate_limit import TokenBucket
+from api.services.reference_data import channels
+from api.services.transitions import apply_transition
+
+@patch("api.services.connection_pool.pika.BlockingConnection")
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(build_connection_parameters(), max_size=2, acquire_timeout=0.01)
+
+    def test_connection_and_channel_are_reused(self, mock_connection):
+        for _ in range(5):
+            self.pool.run(lambda channel: channel.basic_publish(exchange="", routing_key="q", body="{}"))
+        self.assertEqual(mock_connection.call_count, 1)
+        self.assertEqual(mock_connection.return_value.channel.call_count, 1)
+
+    def test_reconnects_when_connection_is_lost(self, mock_connection):
+        first, second = MagicMock(), MagicMock()
+        first.channel.return_value.basic_publish.side_effect = StreamLostError("lost")
+        mock_connection.side_effect = [first, second]
+        self.pool.run(lambda channel: channel.basic_publish(exchange="", routing_key="q", body="{}"))
+        self.assertEqual(mock_connection.call_count, 2)
+        second.channel.return_value.basic_publish.assert_called_once()
+
+    def test_stale_idle_connection_is_discarded(self, mock_connection):
+        stale, fresh = MagicMock(), MagicMock()
+        stale.process_data_events.side_effect = StreamLostError("lost")
+        mock_connection.side_effect = [stale, fresh]
+        self.pool.run(lambda channel: None)
+        self.pool.run(lambda channel: None)
+        self.assertEqual(mock_connection.call_count, 2)
+        fresh.channel.assert_called_once()
+
+    def test_nested_use_shares_the_thread_connection(self, mock_connection):
+        with self.pool.connection() as outer:
+            with self.pool.connection() as inner:
+                self.assertIs(outer, inner)
+        self.assertEqual(mock_connection.call_count, 1)
+
+    def test_pool_size_is_enforced(self, mock_connection):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        with self.assertRaises(PoolExhaustedError):
+            self.pool.acquire()
+        self.pool.release(first)
+        self.pool.release(second)
+
+
+class ReferenceDataCacheTest(TestCase):
+    def setUp(self):
+        channels.invalidate()
+
+    def tearDown(self):
+        # Rows created here are rolled back without firing signals.
+        channels.invalidate()
+
+    def test_lookups_are_served_from_memory(self):
+        with self.assertNumQueries(1):
+            email_id = channels.id_for("email")
+            self.assertEqual(channels.name_for(email_id), "email")
+            self.assertEqual(len(channels.all()), 4)
+            self.assertIsNone(channels.get("pigeon"))
+
+    def test_save_invalidates_the_cache(self):
+        channels.get("email")
+        Channel.objects.create(name="telegram", description="Telegram")
+        self.assertIsNotNone(channels.get("telegram"))
+
+    @override_settings(REFERENCE_DATA_CACHE_TTL=0.01)
+    def test_ttl_reloads_the_table(self):
+        channels.get("email")
+        Channel.objects.filter(name="email").update(description="Changed")
+        time.sleep(0.02)
+        self.assertEqual(channels.get("email").description, "Changed")
+
+
+@override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+class OutboxRelayTest(TestCase):
+    def setUp(self):
+        self.broker = InMemoryBroker()
+        self.broker.create_exchange("schedule_data")
+        self.broker.create_queue("schedules")
+        self.broker.queue_bind("schedule_data", "schedules", "")
+
+    def enqueue(self, *exchanges):
+        schedules = [
+            CommunicationSchedule.objects.create(
+                recipient="test@example.com",
+                message="Test message",
+                scheduled_datetime=timezone.now(),
+                channel=Channel.objects.get(name="email"),
+                status=Status.objects.get(name="scheduled"),
+                exchange=exchange_name,
+            )
+            for exchange_name in exchanges
+        ]
+        outbox.enqueue_schedules(schedules)
+        return [{"id": schedule.id} for schedule in schedules]
+
+    def test_relay_publishes_and_deletes_a_batch(self):
+        bodies = self.enqueue("schedule_data", "schedule_data", "schedule_data")
+        self.assertEqual(outbox.relay_batch(self.broker, batch_size=2), 2)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], bodies[:2])
+        self.assertEqual(list(OutboxMessage.objects.values_list("body", flat=True)), bodies[2:])
+
+    def test_nacked_messages_stay_in_the_outbox(self):
+        bodies = self.enqueue("schedule_data", "missing_exchange")
+        self.assertEqual(outbox.relay_batch(self.broker, batch_size=10), 1)
+        self.assertEqual(list(OutboxMessage.objects.values_list("body", flat=True)), bodies[1:])
+
+    def test_refused_message_is_backed_off_without_holding_up_the_batch(self):
+        bodies = self.enqueue("missing_exchange", "schedule_data", "schedule_data")
+        self.assertEqual(outbox.relay_batch(self.broker, batch_size=10), 2)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], bodies[1:])
+        row = OutboxMessage.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.available_at, timezone.now())
+        self.enqueue("schedule_data")
+        self.assertEqual(outbox.relay_batch(self.broker, batch_size=1), 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_message_refused_too_often_is_dropped_and_its_schedule_failed(self):
+        (body,) = self.enqueue("missing_exchange")
+        for _ in range(2):
+            OutboxMessage.objects.update(available_at=timezone.now())
+            self.assertEqual(outbox.relay_batch(self.broker, batch_size=10), 0)
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(CommunicationSchedule.objects.get(pk=body["id"]).status.name, "failed")
+
+    def test_unconfirmed_messages_are_retried_without_limit(self):
+        self.enqueue("schedule_data")
+        service = MagicMock()
+        service.send_messages_confirmed.return_value = [None]
+        with override_settings(OUTBOX_MAX_ATTEMPTS=1):
+            self.assertEqual(outbox.relay_batch(service, batch_size=10), 0)
+        self.assertEqual(OutboxMessage.objects.get().attempts, 1)
+        self.assertEqual(outbox.retry_delay(3), timedelta(seconds=4))
+
+    def test_relay_messages_publishes_only_the_given_available_messages(self):
+        bodies = self.enqueue("schedule_data", "schedule_data", "schedule_data")
+        ids = list(OutboxMessage.objects.order_by("id").values_list("id", flat=True))
+        OutboxMessage.objects.filter(id=ids[1]).update(available_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(outbox.relay_messages(self.broker, ids[:2]), 1)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], bodies[:1])
+        self.assertEqual(list(OutboxMessage.objects.order_by("id").values_list("id", flat=True)), ids[1:])
+
+    def test_relay_skips_messages_not_available_yet(self):
+        bodies = self.enqueue("schedule_data", "schedule_data")
+        OutboxMessage.objects.filter(body=bodies[0]).update(available_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(outbox.relay_batch(self.broker, batch_size=10), 1)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], bodies[1:])
+        self.assertEqual(list(OutboxMessage.objects.values_list("body", flat=True)), bodies[:1])
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="delayed", SCHEDULE_DELAY_TIERS=[5, 60, 600])
+    def test_delayed_messages_wait_in_the_outbox_only_beyond_the_largest_tier(self):
+        delay_tiers.provision(self.broker, "schedule_data")
+        now = timezone.now()
+        schedules = [
+            CommunicationSchedule.objects.create(
+                recipient="test@example.com",
+                message="Test message",
+                scheduled_datetime=now + timedelta(seconds=delay),
+                channel=Channel.objects.get(name="email"),
+                status=Status.objects.get(name="scheduled"),
+                exchange="schedule_data",
+            )
+            for delay in (90, 7200)
+        ]
+        soon, later = outbox.enqueue_schedules(schedules, broker=self.broker)
+        self.assertLessEqual(soon.available_at, timezone.now())
+        self.assertEqual(later.available_at, schedules[1].scheduled_datetime - timedelta(seconds=600))
+        self.assertEqual(later.exchange, "schedule_data.delay.600s")
+        self.assertEqual(outbox.relay_batch(self.broker, batch_size=10), 1)
+        held = self.broker.peek_messages("schedule_data.delay.60s", 10)
+        self.assertEqual(held[0]["properties"]["headers"], soon.headers)
+        self.assertEqual(list(OutboxMessage.objects.values_list("exchange", flat=True)), ["schedule_data.delay.600s"])
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="delayed", SCHEDULE_DELAY_TIERS=[5, 60, 600])
+    def test_schedules_of_exchanges_without_tiers_wait_in_the_outbox(self):
+        due = timezone.now() + timedelta(seconds=90)
+        schedule = CommunicationSchedule.objects.create(
+            recipient="test@example.com",
+            message="Test message",
+            scheduled_datetime=due,
+            channel=Channel.objects.get(name="email"),
+            status=Status.objects.get(name="scheduled"),
+            exchange="schedule_data",
+        )
+        (message,) = outbox.enqueue_schedules([schedule], broker=self.broker)
+        self.assertEqual((message.exchange, message.available_at, message.headers), ("schedule_data", due, None))
+
+    def test_failed_publish_keeps_the_messages(self):
+        self.enqueue("schedule_data")
+        self.broker.disconnect()
+        with self.assertRaises(AMQPConnectionError):
+            outbox.relay_batch(self.broker, batch_size=10)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+
+@override_settings(SCHEDULE_DELAY_TIERS=[60, 5, 600])
+class DelayTiersTest(SimpleTestCase):
+    def test_route_waits_in_the_outbox_only_beyond_the_largest_tier(self):
+        now = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        cases = [(2, "schedule_data", 0), (3, "schedule_data.delay.5s", 0), (59, "schedule_data.delay.5s", 0),
+                 (61, "schedule_data.delay.60s", 0), (600, "schedule_data.delay.600s", 0),
+                 (7200, "schedule_data.delay.600s", 6600)]
+        for delay, exchange, hold in cases:
+            with self.subTest(delay=delay):
+                due = now + timedelta(seconds=delay)
+                exchange_name, available_at, headers = delay_tiers.route("schedule_data", due, now)
+                self.assertEqual((exchange_name, available_at), (exchange, now + timedelta(seconds=hold)))
+                self.assertEqual(
+                    headers,
+                    {delay_tiers.DUE_HEADER: int(due.timestamp() * 1000), delay_tiers.EXCHANGE_HEADER: "schedule_data"},
+                )
+
+    def test_tiers_chain_to_the_exchange_within_half_the_smallest_tier(self):
+        now = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        for delay in (3, 59, 61, 599, 3500, 7200):
+            with self.subTest(delay=delay):
+                due = now + timedelta(seconds=delay)
+                exchange_name, clock, _ = delay_tiers.route("schedule_data", due, now)
+                while exchange_name != "schedule_data":
+                    clock += timedelta(seconds=int(exchange_name.rsplit(".", 1)[1][:-1]))
+                    exchange_name = delay_tiers.next_hop("schedule_data", due, clock)
+                self.assertLessEqual(abs((clock - due).total_seconds()), 2.5)
+
+    def test_tier_topology_dead_letters_to_the_router(self):
+        spec = delay_tiers.tier_topology("schedule_data")
+        self.assertEqual([exchange.type for exchange in spec.exchanges], ["fanout"] * 4)
+        self.assertEqual(
+            [(queue.name, queue.arguments.get("x-message-ttl")) for queue in spec.queues],
+            [("schedule_delay.router", None), ("schedule_data.delay.5s", 5000),
+             ("schedule_data.delay.60s", 60000), ("schedule_data.delay.600s", 600000)],
+        )
+        self.assertEqual(
+            {queue.arguments["x-dead-letter-exchange"] for queue in spec.queues[1:]}, {"schedule_delay.router"}
+        )
+
+
+@override_settings(SCHEDULE_DELAY_TIERS=[60, 5, 600])
+class DelayRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.broker = InMemoryBroker()
+        self.broker.create_exchange("schedule_data")
+        self.broker.create_queue("schedules")
+        self.broker.queue_bind("schedule_data", "schedules", "email")
+        delay_tiers.provision(self.broker, "schedule_data")
+        self.router = delay_tiers.DelayRouter(self.broker, max_wait=0)
+
+    def expire(self, queue_name):
+        # Stands in for the TTL: the broker dead-letters rejected and expired messages alike.
+        consumer = self.broker.open_consumer(queue_name, 10)
+        consumer.settle([], [delivery.tag for delivery in consumer.fetch(10, 0)])
+
+    def headers(self, due, exchange_name="schedule_data"):
+        return {delay_tiers.DUE_HEADER: int(due.timestamp() * 1000), delay_tiers.EXCHANGE_HEADER: exchange_name}
+
+    def test_router_forwards_to_the_next_tier_or_to_the_exchange(self):
+        now = timezone.now()
+        self.broker.send_messages_confirmed([
+            ("schedule_data.delay.5s", "email", {"id": 1}, self.headers(now - timedelta(seconds=1))),
+            ("schedule_data.delay.5s", "email", {"id": 2}, self.headers(now + timedelta(seconds=90))),
+            ("schedule_data.delay.5s", "email", {"id": 3}),
+        ])
+        self.expire("schedule_data.delay.5s")
+        consumer = self.broker.open_consumer(delay_tiers.ROUTER_NAME, 10)
+        self.assertEqual(self.router.run_once(consumer), 3)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], [{"id": 1}, {"id": 3}])
+        forwarded = self.broker.peek_messages("schedule_data.delay.60s", 10)
+        self.assertEqual(
+            [(message["routing_key"], message["payload"]) for message in forwarded], [("email", '{"id": 2}')]
+        )
+        self.assertEqual(forwarded[0]["properties"]["headers"], self.headers(now + timedelta(seconds=90)))
+        self.assertEqual(self.broker.peek_messages(delay_tiers.ROUTER_NAME, 10), [])
+
+    def test_refused_hops_do_not_hold_up_the_batch(self):
+        now = timezone.now()
+        self.broker.send_messages_confirmed([
+            ("schedule_data.delay.5s", "email", {"id": 1}, self.headers(now, "missing_exchange")),
+            ("schedule_data.delay.5s", "email", {"id": 2}, self.headers(now + timedelta(seconds=90))),
+            ("schedule_data.delay.5s", "email", {"id": 3}, self.headers(now)),
+        ])
+        self.expire("schedule_data.delay.5s")
+        # Tiers deleted after the message entered them: it goes straight to its exchange.
+        del self.broker.exchanges["schedule_data.delay.60s"]
+        consumer = self.broker.open_consumer(delay_tiers.ROUTER_NAME, 10)
+        self.assertEqual(self.router.run_once(consumer), 3)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], [{"id": 3}, {"id": 2}])
+        consumer.close()
+        self.assertEqual(self.broker.peek_messages(delay_tiers.ROUTER_NAME, 10), [])
+
+    def test_unconfirmed_messages_go_back_to_the_router_queue(self):
+        self.broker.send_messages_confirmed(
+            [("schedule_data.delay.5s", "email", {"id": i}, self.headers(timezone.now())) for i in range(2)]
+        )
+        self.expire("schedule_data.delay.5s")
+        consumer = self.broker.open_consumer(delay_tiers.ROUTER_NAME, 10)
+        self.router.broker = MagicMock()
+        self.router.broker.send_messages_confirmed.return_value = [True, None]
+        with self.assertRaises(delay_tiers.DelayRoutingError):
+            self.router.run_once(consumer)
+        consumer.close()
+        requeued = self.broker.peek_messages(delay_tiers.ROUTER_NAME, 10)
+        self.assertEqual([message["payload"] for message in requeued], ['{"id": 1}'])
+
+    def test_provisioned_exchanges_have_every_tier(self):
+        self.broker.create_exchange("other")
+        self.assertEqual(delay_tiers.provisioned(self.broker, ["schedule_data", "other"]), {"schedule_data"})
+        del self.broker.exchanges["schedule_data.delay.600s"]
+        self.assertEqual(delay_tiers.provisioned(self.broker, ["schedule_data"]), set())
+
+
+class ScheduleDispatcherTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.broker = InMemoryBroker()
+        self.broker.create_exchange("schedule_data")
+        self.broker.create_queue("schedules")
+        self.broker.queue_bind("schedule_data", "schedules", "")
+        self.dispatcher = ScheduleDispatcher(self.broker, lookahead=60)
+        self.due = self.make_schedule(self.now - timedelta(seconds=5))
+        self.upcoming = self.make_schedule(self.now + timedelta(seconds=30))
+        self.later = self.make_schedule(self.now + timedelta(hours=1))
+
+    def make_schedule(self, scheduled_datetime):
+        return CommunicationSchedule.objects.create(
+            recipient="test@example.com",
+            message="Test message",
+            scheduled_datetime=scheduled_datetime,
+            channel=Channel.objects.get(name="email"),
+            status=Status.objects.get(name="scheduled"),
+            exchange="schedule_data",
+        )
+
+    def test_refill_loads_only_the_lookahead_window(self):
+        self.assertEqual(self.dispatcher.refill(self.now), 2)
+        self.assertEqual(self.dispatcher.refill(self.now), 0)
+        self.assertEqual(self.dispatcher.pending, 2)
+
+    def test_schedule_moved_earlier_fires_at_the_new_time(self):
+        self.dispatcher.refill(self.now)
+        CommunicationSchedule.objects.filter(pk=self.upcoming.pk).update(
+            scheduled_datetime=self.now + timedelta(seconds=10)
+        )
+        self.assertEqual(self.dispatcher.refill(self.now), 0)
+        self.assertEqual(self.dispatcher.pending, 2)
+        self.assertEqual(self.dispatcher.pop_due(self.now + timedelta(seconds=5)), [self.due.id])
+        self.assertEqual(self.dispatcher.pop_due(self.now + timedelta(seconds=10)), [self.upcoming.id])
+        # The entry at the old datetime is stale and dropped.
+        self.assertEqual(self.dispatcher.pop_due(self.now + timedelta(seconds=30)), [])
+        self.assertEqual(self.dispatcher.pending, 0)
+
+    def test_fires_due_schedules_and_marks_them_sent(self):
+        self.assertEqual(self.dispatcher.run_once(self.now), 1)
+        self.assertEqual([message["body"] for message in self.broker.drain("schedules")], [{"id": self.due.id}])
+        self.due.refresh_from_db()
+        self.assertEqual(self.due.status.name, "sent")
+        self.assertIsNotNone(self.due.dispatched_at)
+        self.assertEqual(self.dispatcher.lag.summary()["count"], 1)
+        self.assertEqual(self.dispatcher.pending, 1)
+
+    def test_does_not_fire_twice(self):
+        other = ScheduleDispatcher(self.broker)
+        self.assertEqual(self.dispatcher.fire([self.due.id], self.now), 1)
+        self.assertEqual(other.fire([self.due.id], self.now), 0)
+        self.assertEqual(self.broker.published, 1)
+
+    def test_skips_canceled_schedules(self):
+        self.due.status = Status.objects.get(name="canceled")
+        self.due.save()
+        self.assertEqual(self.dispatcher.fire([self.due.id], self.now), 0)
+        self.assertEqual(self.broker.published, 0)
+
+    def test_unroutable_schedules_are_marked_failed(self):
+        self.broker.reset()
+        self.broker.create_exchange("schedule_data")
+        self.assertEqual(self.dispatcher.fire([self.due.id], self.now), 0)
+        self.due.refresh_from_db()
+        self.assertEqual(self.due.status.name, "failed")
+        self.assertIsNone(self.due.dispatched_at)
+
+    def test_missing_exchange_fails_only_its_schedules(self):
+        other = self.make_schedule(self.now - timedelta(seconds=4))
+        missing = self.make_schedule(self.now - timedelta(seconds=10))
+        CommunicationSchedule.objects.filter(pk=missing.pk).update(exchange="missing")
+        self.assertEqual(self.dispatcher.fire([missing.id, self.due.id, other.id], self.now), 2)
+        statuses = dict(CommunicationSchedule.objects.values_list("id", "status__name"))
+        self.assertEqual(
+            [statuses[pk] for pk in (missing.id, self.due.id, other.id)], ["failed", "sent", "sent"]
+        )
+
+    def test_unconfirmed_schedules_stay_scheduled_and_are_retried(self):
+        service = MagicMock()
+        service.send_messages_confirmed.return_value = [None]
+        dispatcher = ScheduleDispatcher(service, lookahead=60)
+        dispatcher.refill(self.now)
+        self.assertEqual(dispatcher.run_once(self.now), 0)
+        self.due.refresh_from_db()
+        self.assertEqual(self.due.status.name, "scheduled")
+        dispatcher.service = self.broker
+        self.assertEqual(dispatcher.refill(self.now), 1)
+        self.assertEqual(dispatcher.run_once(self.now), 1)
+
+    def test_shards_split_the_schedules(self):
+        shards = [ScheduleDispatcher(self.broker, lookahead=7200, shard_index=i, shard_count=2) for i in range(2)]
+        self.assertEqual(sum(shard.refill(self.now) for shard in shards), 3)
+
+    def test_rate_limited_channel_is_spread_over_time(self):
+        Channel.objects.filter(name="email").update(rate_limit=2, burst=1)
+        channels.invalidate()
+        self.addCleanup(channels.invalidate)
+        burst = [self.make_schedule(self.now - timedelta(seconds=5)) for _ in range(3)]
+        self.dispatcher.refill(self.now)
+        self.assertEqual(self.dispatcher.pop_due(self.now), [self.due.id])
+        # The others wait for their slot, 0.5s apart, instead of being dropped.
+        self.assertEqual(self.dispatcher.pending, 4)
+        self.assertEqual(self.dispatcher.pop_due(self.now + timedelta(seconds=0.6)), [burst[0].id])
+        self.assertEqual(self.dispatcher.pop_due(self.now + timedelta(seconds=0.9)), [])
+        self.assertEqual(self.dispatcher.pop_due(self.now + timedelta(seconds=1.6)), [burst[1].id, burst[2].id])
+
+
+class ScheduleStatsTest(TestCase):
+    def setUp(self):
+        self.email = Channel.objects.get(name="email").pk
+        self.scheduled = Status.objects.get(name="scheduled").pk
+        self.canceled = Status.objects.get(name="canceled").pk
+        self.day = date(2024, 12, 1)
+
+    def counts(self):
+        return {
+            (row.day, row.channel_id, row.status_id): row.count
+            for row in ScheduleStat.objects.all()
+        }
+
+    def test_deltas_are_upserted(self):
+        stats.apply_deltas({(self.day, self.email, self.scheduled): 2})
+        stats.apply_deltas({(self.day, self.email, self.scheduled): 3, (self.day, self.email, self.canceled): 0})
+        self.assertEqual(self.counts(), {(self.day, self.email, self.scheduled): 5})
+
+    def test_transitions_move_only_the_updated_rows(self):
+        schedules = [
+            CommunicationSchedule.objects.create(
+                recipient="test@example.com",
+                message="Test message",
+                scheduled_datetime=datetime(2024, 12, 1, 10, tzinfo=dt_timezone.utc),
+                channel_id=self.email,
+                status_id=status_id,
+            )
+            for status_id in (self.scheduled, self.scheduled, Status.objects.get(name="sent").pk)
+        ]
+        stats.record_created(schedules)
+        apply_transition(CommunicationSchedule.objects.all(), "canceled")
+        self.assertEqual(
+            {key: count for key, count in self.counts().items() if count},
+            {(self.day, self.email, self.canceled): 2, (self.day, self.email, schedules[2].status_id): 1},
+        )
+
+    def test_backfill_counts_the_existing_schedules(self):
+        CommunicationSchedule.objects.create(
+            recipient="test@example.com",
+            message="Test message",
+            scheduled_datetime=datetime(2024, 12, 1, 23, tzinfo=dt_timezone(timedelta(hours=-3))),
+            channel_id=self.email,
+            status_id=self.scheduled,
+        )
+        migration = import_module("api.migrations.0010_schedule_stat")
+        migration.backfill_schedule_stats(django_apps, None)
+        self.assertEqual(self.counts(), {(date(2024, 12, 2), self.email, self.scheduled): 1})
+
+
+class StatusHubTest(TestCase):
+    def setUp(self):
+        self.email = Channel.objects.get(name="email").pk
+        self.sms = Channel.objects.get(name="sms").pk
+        self.sent = Status.objects.get(name="sent").pk
+
+    def test_events_reach_the_matching_subscriptions_from_any_thread(self):
+        hub = status_events.StatusHub()
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            by_id = status_events.Subscription(loop, ids=[1])
+            by_channel = status_events.Subscription(loop, channel_id=self.sms)
+            hub.subscribe(by_id)
+            hub.subscribe(by_channel)
+            events = [
+                status_events.StatusEvent(1, self.email, self.sent), status_events.StatusEvent(2, self.sms, self.sent)
+            ]
+            await asyncio.to_thread(hub.publish, events)
+            received = [
+                [event.id for event, _ in await asyncio.wait_for(sub.queue.get(), 1)] for sub in (by_id, by_channel)
+            ]
+            hub.unsubscribe(by_id)
+            hub.unsubscribe(by_channel)
+            return received
+
+        self.assertEqual(asyncio.run(run()), [[1], [2]])
+        self.assertEqual(len(hub), 0)
+
+    def test_a_slow_subscription_overflows(self):
+        hub = status_events.StatusHub()
+
+        async def run():
+            subscription = status_events.Subscription(asyncio.get_running_loop(), max_queued=2)
+            hub.subscribe(subscription)
+            for pk in range(3):
+                await asyncio.to_thread(hub.publish, [status_events.StatusEvent(pk, self.email, self.sent)])
+            await asyncio.sleep(0)
+            return subscription.queue.get_nowait(), subscription.queue.empty()
+
+        self.assertEqual(asyncio.run(run()), (None, True))
+
+    def test_transitions_are_published_on_commit(self):
+        schedule = CommunicationSchedule.objects.create(
+            recipient="test@example.com",
+            message="Test message",
+            scheduled_datetime=timezone.now(),
+            channel_id=self.email,
+            status=Status.objects.get(name="scheduled"),
+        )
+        with patch.object(status_events.hub, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                apply_transition(CommunicationSchedule.objects.filter(pk=schedule.pk), "sent")
+                publish.assert_not_called()
+        publish.assert_called_once_with([status_events.StatusEvent(schedule.pk, self.email, self.sent)])
+
+
+class FailingHandler(consumer_service.DeliveryHandler):
+    def deliver(self, schedule, message):
+        raise RuntimeError("provider down")
+
+
+@override_settings(CONSUMER_HANDLERS={"sms": "test_services.FailingHandler"})
+class ScheduleConsumerTest(TestCase):
+    def setUp(self):
+        consumer_service.reset_handlers()
+        self.addCleanup(consumer_service.reset_handlers)
+        self.broker = InMemoryBroker()
+        self.broker.create_exchange("schedule_data")
+        self.broker.create_queue("schedules")
+        self.broker.queue_bind("schedule_data", "schedules", "")
+        self.worker = consumer_service.ScheduleConsumer(self.broker, "schedules", prefetch_count=10, batch_size=10)
+
+    def make_schedule(self, channel="email", status="scheduled"):
+        return CommunicationSchedule.objects.create(
+            recipient="test@example.com",
+            message="Test message",
+            scheduled_datetime=timezone.now() - timedelta(seconds=5),
+            channel=Channel.objects.get(name=channel),
+            status=Status.objects.get(name=status),
+        )
+
+    def publish(self, *bodies):
+        self.broker.send_messages(("schedule_data", "", body) for body in bodies)
+
+    def test_batch_is_delivered_and_settled(self):
+        delivered = self.make_schedule()
+        canceled = self.make_schedule(status="canceled")
+        failing = self.make_schedule("sms")
+        self.publish({"id": delivered.id}, {"id": canceled.id}, {"id": failing.id}, {"id": 999999}, {"no": "id"})
+        consumer = self.broker.open_consumer("schedules", 10)
+        with patch.object(consumer, "settle", wraps=consumer.settle) as settle:
+            self.assertEqual(self.worker.run_once(consumer), 5)
+        acked, rejected = settle.call_args.args
+        self.assertEqual((len(acked), len(rejected)), (3, 2))
+        self.assertEqual(
+            {schedule.id: schedule.status.name for schedule in CommunicationSchedule.objects.all()},
+            {delivered.id: "sent", canceled.id: "canceled", failing.id: "failed"},
+        )
+        self.assertEqual(self.worker.lag.summary()["count"], 1)
+        self.assertEqual(self.broker.queues["schedules"], deque())
+        self.assertEqual(CommunicationSchedule.objects.get(pk=failing.pk).delivery_error, "provider down")
+
+    def test_failures_are_recorded_apart_from_the_status(self):
+        # The dispatcher marks schedules `sent` when it publishes them, and `sent` is final.
+        failing = self.make_schedule("sms", status="sent")
+        redelivered = self.make_schedule(status="sent")
+        CommunicationSchedule.objects.filter(pk=redelivered.pk).update(delivery_error="provider down")
+        self.publish({"id": failing.id}, {"id": redelivered.id})
+        result = self.worker.process(self.broker.open_consumer("schedules", 10).fetch(10, 0))
+        self.assertEqual((result.counts["delivered"], result.counts["failed"]), (1, 1))
+        self.assertEqual(
+            dict(CommunicationSchedule.objects.values_list("id", "delivery_error")),
+            {failing.id: "provider down", redelivered.id: ""},
+        )
+        self.assertEqual(set(CommunicationSchedule.objects.values_list("status__name", flat=True)), {"sent"})
+
+    def test_missing_handler_results_fail_the_whole_channel(self):
+        schedules = [self.make_schedule() for _ in range(2)]
+        self.publish(*({"id": schedule.id} for schedule in schedules))
+        with patch.object(consumer_service.LoggingHandler, "deliver_many", return_value=[None]):
+            result = self.worker.process(self.broker.open_consumer("schedules", 10).fetch(10, 0))
+        self.assertEqual((len(result.acked), len(result.rejected)), (0, 2))
+        self.assertEqual(
+            set(CommunicationSchedule.objects.values_list("status__name", "delivery_error")),
+            {("failed", "handler returned 1 results for 2 messages")},
+        )
+
+    def test_schedules_are_loaded_with_one_query(self):
+        canceled = [self.make_schedule(status="canceled") for _ in range(3)]
+        self.publish(*({"id": schedule.id} for schedule in canceled))
+        deliveries = self.broker.open_consumer("schedules", 10).fetch(10, 0)
+        with self.assertNumQueries(1):
+            result = self.worker.process(deliveries)
+        self.assertEqual(result.counts["skipped"], 3)
+
+    def test_closing_requeues_unsettled_messages(self):
+        self.publish({"id": 1}, {"id": 2})
+        consumer = self.broker.open_consumer("schedules", 1)
+        self.assertEqual(len(consumer.fetch(10, 0)), 1)
+        consumer.close()
+        self.assertEqual(len(self.broker.queues["schedules"]), 2)
+
+
+class RabbitmqConsumerTest(SimpleTestCase):
+    def test_contiguous_acks_are_sent_as_one_frame(self):
+        with patch("pika.BlockingConnection") as connection:
+            consumer = RabbitmqConsumer(build_connection_parameters(), "schedules", 100)
+        channel = connection.return_value.channel.return_value
+        channel.basic_qos.assert_called_once_with(prefetch_count=100)
+        def receive(tag):
+            method = MagicMock(delivery_tag=tag, redelivered=False)
+            consumer._on_message(channel, method, MagicMock(headers=None), b"{}")
+
+        for tag in range(1, 6):
+            receive(tag)
+        self.assertEqual([delivery.tag for delivery in consumer.fetch(4, 0)], [1, 2, 3, 4])
+        consumer.settle([1, 2, 4], [3])
+        channel.basic_nack.assert_called_once_with(delivery_tag=3, requeue=False)
+        channel.basic_ack.assert_called_once_with(delivery_tag=4, multiple=True)
+        # Tag 5 is still unsettled, so acknowledging 6 alone cannot use `multiple`.
+        receive(6)
+        consumer.fetch(2, 0)
+        consumer.settle([6], [])
+        channel.basic_ack.assert_called_with(delivery_tag=6)
+
+
+class DeadLettersTest(TestCase):
+    def setUp(self):
+        self.broker = InMemoryBroker()
+        self.broker.create_exchange("schedule_data")
+        dead_letters.provision(self.broker, "emails")
+        self.broker.queue_bind("schedule_data", "emails", "email")
+        self.broker.send_messages([("schedule_data", "email", {"id": i}) for i in range(3)])
+        consumer = self.broker.open_consumer("emails", 10)
+        consumer.settle([], [delivery.tag for delivery in consumer.fetch(10, 0)])
+
+    def test_rejected_messages_are_dead_lettered_with_their_origin(self):
+        total, page = dead_letters.peek(self.broker, "emails.dlq", offset=1, limit=1)
+        self.assertEqual(total, 3)
+        self.assertEqual(len(page), 1)
+        message = page[0]
+        self.assertEqual((message["position"], message["payload"]), (1, '{"id": 1}'))
+        self.assertEqual((message["exchange"], message["routing_key"]), ("schedule_data", "email"))
+        self.assertEqual((message["dead_lettered_from"], message["reason"]), ("emails", "rejected"))
+        self.assertEqual(message["fingerprint"], dead_letters.fingerprint(b'{"id": 1}'))
+        self.assertEqual(len(self.broker.queues["emails.dlq"]), 3)
+
+    def test_replay_of_selected_messages(self):
+        selected = [dead_letters.fingerprint(b'{"id": 0}'), dead_letters.fingerprint(b'{"id": 2}')]
+        replay = dead_letters.replay(self.broker, "emails.dlq", selected, batch_size=1)
+        self.assertEqual((replay.replayed, replay.failed, replay.error), (2, 0, ""))
+        self.assertEqual([m["body"] for m in self.broker.drain("emails")], [{"id": 0}, {"id": 2}])
+        self.assertEqual([m["body"] for m in self.broker.drain("emails.dlq")], [{"id": 1}])
+
+    def test_replay_keeps_the_messages_it_cannot_republish(self):
+        self.broker.queues["emails.dlq"].append(
+            ("emails.dlx", "", '{"id": 9}', {"x-death": [{"exchange": "missing", "routing-keys": [""]}]})
+        )
+        replay = dead_letters.replay(self.broker, "emails.dlq")
+        self.assertEqual((replay.replayed, replay.failed), (3, 1))
+        self.assertEqual(DeadLetterReplay.objects.get().pk, replay.pk)
+        self.assertEqual([m["body"] for m in self.broker.drain("emails.dlq")], [{"id": 9}])
+        self.assertEqual(len(self.broker.drain("emails")), 3)
+
+    def test_rabbitmq_peeks_through_the_management_api(self):
+        client = MagicMock()
+        client.post.return_value = []
+        RabbitmqService(pool=MagicMock(), management_client=client).peek_messages("emails.dlq", 20)
+        path, payload = client.post.call_args[0]
+        self.assertEqual(path, "queues/%2F/emails.dlq/get")
+        self.assertEqual((payload["count"], payload["ackmode"]), (20, "ack_requeue_true"))
+
+
+class TokenBucketTest(SimpleTestCase):
+    def test_take_refills_at_the_rate(self):
+        bucket = TokenBucket(rate=10, burst=2, updated=0)
+        self.assertEqual(bucket.take(2, now=0), 0)
+        self.assertAlmostEqual(bucket.take(1, now=0), 0.1)
+        self.assertEqual(bucket.take(1, now=0.1), 0)
+
+    def test_requests_larger_than_the_burst_go_into_debt(self):
+        bucket = TokenBucket(rate=1, burst=2, updated=0)
+        self.assertEqual(bucket.take(5, now=0), 0)
+        self.assertAlmostEqual(bucket.take(1, now=0), 4)
+
+    def test_reserve_hands_out_consecutive_slots(self):
+        bucket = TokenBucket(rate=4, burst=1, updated=0)
+        self.assertEqual([bucket.reserve(now=0) for _ in range(3)], [0, 0.25, 0.5])
+
+
+class PublisherConfirmsTest(SimpleTestCase):
+    def confirm(self, publisher, method):
+        publisher._on_confirmation(MagicMock(method=method))
+
+    def test_acks_and_nacks_are_matched_to_messages(self):
+        async def scenario():
+            publisher = AsyncRabbitmqPublisher(build_connection_parameters(), asyncio.get_running_loop())
+            publisher._confirm_channel = MagicMock(is_open=True)
+            messages = [("schedule_data", "", {"id": i}) for i in range(4)]
+            publishing = asyncio.ensure_future(publisher.publish_confirmed(messages, timeout=1))
+            await asyncio.sleep(0)
+            self.assertEqual(publisher._confirm_channel.basic_publish.call_count, 4)
+            publisher._on_return(None, None, MagicMock(message_id="4"), b"")
+            self.confirm(publisher, spec.Basic.Ack(delivery_tag=2, multiple=True))
+            self.confirm(publisher, spec.Basic.Nack(delivery_tag=3))
+            self.confirm(publisher, spec.Basic.Ack(delivery_tag=4))
+            return await publishing
+
+        self.assertEqual(asyncio.run(scenario()), [True, True, False, False])
+
+    def test_unconfirmed_messages_time_out_as_unknown(self):
+        async def scenario():
+            publisher = AsyncRabbitmqPublisher(build_connection_parameters(), asyncio.get_running_loop())
+            publisher._confirm_channel = MagicMock(is_open=True)
+            return await publisher.publish_confirmed([("schedule_data", "", {"id": 1})], timeout=0.01)
+
+        self.assertEqual(asyncio.run(scenario()), [None])
+
+    def test_missing_exchange_refuses_only_its_messages(self):
+        async def scenario():
+            publisher = AsyncRabbitmqPublisher(build_connection_parameters(), asyncio.get_running_loop())
+            closed = publisher._confirm_channel = MagicMock(is_open=True)
+            messages = [("missing", "", {"id": 1}), ("schedule_data", "", {"id": 2}), ("missing", "", {"id": 3})]
+            publishing = asyncio.ensure_future(publisher.publish_confirmed(messages, timeout=1))
+            await asyncio.sleep(0)
+            self.assertEqual(closed.basic_publish.call_count, 2)
+            closed.is_open = False
+            # Stands in for the channel reopened for the next exchange.
+            reopened = publisher._confirm_channel = MagicMock(is_open=True)
+            publisher._on_confirm_channel_closed(
+                closed, ChannelClosedByBroker(404, "NOT_FOUND - no exchange 'missing' in vhost '/'")
+            )
+            for _ in range(3):
+                await asyncio.sleep(0)
+            self.assertEqual(reopened.basic_publish.call_args.kwargs["exchange"], "schedule_data")
+            self.confirm(publisher, spec.Basic.Ack(delivery_tag=3))
+            return await publishing
+
+        self.assertEqual(asyncio.run(scenario()), [False, True, False])
+
+    def test_lost_channel_leaves_messages_unknown(self):
+        async def scenario():
+            publisher = AsyncRabbitmqPublisher(build_connection_parameters(), asyncio.get_running_loop())
+            channel = publisher._confirm_channel = MagicMock(is_open=True)
+            publishing = asyncio.ensure_future(publisher.publish_confirmed([("schedule_data", "", {"id": 1})]))
+            await asyncio.sleep(0)
+            channel.is_open = False
+            publisher._on_confirm_channel_closed(channel, ChannelClosedByBroker(320, "CONNECTION_FORCED"))
+            return await publishing
+
+        self.assertEqual(asyncio.run(scenario()), [None])
+
+    def test_window_limits_messages_in_flight(self):
+        async def scenario():
+            publisher = AsyncRabbitmqPublisher(
+                build_connection_parameters(), asyncio.get_running_loop(), confirm_window=2
+            )
+            publisher._confirm_channel = MagicMock(is_open=True)
+            messages = [("schedule_data", "", {"id": i}) for i in range(3)]
+            publishing = asyncio.ensure_future(publisher.publish_confirmed(messages, timeout=1))
+            await asyncio.sleep(0)
+            self.assertEqual(publisher._confirm_channel.basic_publish.call_count, 2)
+            self.confirm(publisher, spec.Basic.Ack(delivery_tag=1))
+            for _ in range(3):
+                await asyncio.sleep(0)
+            self.assertEqual(publisher._confirm_channel.basic_publish.call_count, 3)
+            self.confirm(publisher, spec.Basic.Ack(delivery_tag=3, multiple=True))
+            return await publishing
+
+        self.assertEqual(asyncio.run(scenario()), [True, True, True])
+
+
+class ManagementApiClientTest(SimpleTestCase):
+    def setUp(self):
+        self.client = ManagementApiClient("http://rabbitmq:15672/api", auth=("guest", "guest"), ttl=60)
+        self.client.session = MagicMock()
+        self.upstream = self.client.session.get
+        self.upstream.return_value = MagicMock(status_code=200, headers={}, json=lambda: [{"name": "q"}])
+
+    def test_responses_are_cached(self):
+        first = self.client.get("queues")
+        self.assertIs(self.client.get("queues"), first)
+        self.assertEqual(first.data, [{"name": "q"}])
+        self.assertEqual(self.upstream.call_count, 1)
+        self.client.invalidate("queues")
+        self.client.get("queues")
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_concurrent_callers_share_one_fetch(self):
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            release.wait(1)
+            return MagicMock(status_code=200, headers={}, json=lambda: [])
+
+        self.upstream.side_effect = slow_get
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client.get("queues"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.upstream.call_count, 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_stale_entry_is_revalidated_with_the_upstream_etag(self):
+        self.client.ttl = 0
+        self.upstream.return_value.headers = {"ETag": '"v1"'}
+        first = self.client.get("queues")
+        self.upstream.return_value = MagicMock(status_code=304)
+        self.assertIs(self.client.get("queues"), first)
+        self.assertEqual(self.upstream.call_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+
+    def test_errors_are_not_cached(self):
+        self.upstream.return_value = MagicMock(status_code=401, text="unauthorized")
+        with self.assertRaises(ManagementApiError):
+            self.client.get("queues")
+        with self.assertRaises(ManagementApiError):
+            self.client.get("queues")
+        self.assertEqual(self.upstream.call_count, 2)
+
+
+class BenchmarkSuiteTest(TestCase):
+    def test_every_scenario_runs_against_the_stubbed_broker(self):
+        results = run_suite(iterations=2, rows=3)
+        self.assertIn("service.send_message", results)
+        self.assertIn("view.bulk_create_100", results)
+        for result in results.values():
+            self.assertEqual(set(result), {"iterations", "ops_per_sec", "p50_ms", "p99_ms"})
+
+    def test_compare_flags_throughput_drops(self):
+        results = {"fast": {"ops_per_sec": 90.0}, "slow": {"ops_per_sec": 50.0}, "new": {"ops_per_sec": 1.0}}
+        baseline = {"fast": {"ops_per_sec": 100.0}, "slow": {"ops_per_sec": 100.0}}
+        self.assertEqual(list(compare(results, baseline, tolerance=0.2)), ["slow"])
+        self.assertEqual(results["fast"]["change"], -0.1)
+        self.assertNotIn("change", results["new"])
+
+
+class InMemoryBrokerTest(SimpleTestCase):
+    def setUp(self):
+        self.broker = InMemoryBroker()
+        for name in ("emails", "sms", "all"):
+            self.broker.create_queue(name)
+
+    def test_direct_fanout_and_topic_routing(self):
+        self.broker.create_exchange("direct")
+        self.broker.queue_bind("direct", "emails", "email")
+        self.broker.queue_bind("amq.fanout", "emails", "")
+        self.broker.queue_bind("amq.fanout", "sms", "")
+        self.broker.queue_bind("amq.topic", "all", "notify.#")
+        self.broker.send_messages([
+            ("direct", "email", {"n": 1}),
+            ("direct", "sms", {"n": 2}),
+            ("amq.fanout", "anything", {"n": 3}),
+            ("amq.topic", "notify.sms.br", {"n": 4}),
+            ("", "sms", {"n": 5}),
+        ])
+        self.assertEqual([m["body"]["n"] for m in self.broker.drain("emails")], [1, 3])
+        self.assertEqual([m["body"]["n"] for m in self.broker.drain("sms")], [3, 5])
+        self.assertEqual([m["body"]["n"] for m in self.broker.drain("all")], [4])
+
+    def test_topic_patterns(self):
+        self.assertTrue(topic_matches("sms.*.br", "sms.promo.br"))
+        self.assertFalse(topic_matches("sms.*", "sms.promo.br"))
+        self.assertTrue(topic_matches("#", ""))
+        self.assertTrue(topic_matches("sms.#.br", "sms.br"))
+
+    def test_missing_exchange_refuses_only_its_messages(self):
+        with self.assertRaises(ChannelClosedByBroker):
+            self.broker.send_message("missing", "", {})
+        results = self.broker.send_messages_confirmed(
+            [("", "emails", {}), ("missing", "", {}), ("", "emails", {})]
+        )
+        self.assertEqual(results, [True, False, True])
+
+    def test_mandatory_unroutable_messages_are_not_confirmed(self):
+        self.assertEqual(self.broker.send_messages_confirmed([("", "nowhere", {})]), [True])
+        self.assertEqual(self.broker.send_messages_confirmed([("", "nowhere", {})], mandatory=True), [False])
+
+    def test_management_resources(self):
+        self.broker.send_message("", "emails", {"n": 1})
+        queues = {queue["name"]: queue["messages"] for queue in self.broker.list_queues()}
+        self.assertEqual(queues, {"emails": 1, "sms": 0, "all": 0})
+        self.assertIn("amq.topic", [exchange["name"] for exchange in self.broker.list_exchanges()])
+        with self.assertRaises(ManagementApiError):
+            self.broker.management_get("vhosts")
+
+
+class ScheduleDetailSerializerTest(TestCase):
+    def test_values_path_matches_the_serializer(self):
+        for channel in Channel.objects.all():
+            CommunicationSchedule.objects.create(
+                recipient="test@example.com",
+                message="Test message",
+                scheduled_datetime=timezone.now(),
+                channel=channel,
+                status=Status.objects.get(name="sent"),
+            )
+        campaign = Campaign.objects.create(name="Campaign", message="Hi $name")
+        CommunicationSchedule.objects.create(
+            recipient="ana@example.com",
+            scheduled_datetime=timezone.now(),
+            campaign=campaign,
+            variables={"name": "Ana"},
+        )
+        queryset = CommunicationSchedule.objects.order_by("id")
+        expected = ScheduleDetailSerializer(queryset, many=True).data
+        self.assertEqual(expected[-1]["message"], "Hi Ana")
+        rows = queryset.values(*ScheduleDetailSerializer.values_fields)
+        self.assertEqual(list(ScheduleDetailSerializer.from_values(rows)), [dict(item) for item in expected])
+
+
+class PartitionHelpersTest(SimpleTestCase):
+    def test_monthly_partitions(self):
+        # 02:30 UTC on March 1st is still February in São Paulo; partitions follow UTC months.
+        partition = partitions.partition_for(datetime(2024, 3, 1, 2, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition.name, "api_communicationschedule_p2024_03")
+        self.assertEqual(partition.end, datetime(2024, 4, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitions.parse_partition_name(partition.name), partition)
+        self.assertIsNone(partitions.parse_partition_name(partitions.DEFAULT_PARTITION))
+        december = datetime(2024, 12, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(partitions.add_months(december, 1), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitions.add_months(december, -12), datetime(2023, 12, 1, tzinfo=dt_timezone.utc))
+
+    def test_expired_keeps_the_retention_period(self):
+        months = [partitions.partition_for(datetime(2024, month, 1, tzinfo=dt_timezone.utc)) for month in range(1, 13)]
+        now = datetime(2024, 12, 15, tzinfo=dt_timezone.utc)
+        expired = partitions.expired(months, now, retention_months=3)
+        self.assertEqual([partition.start.month for partition in expired], list(range(1, 9)))
+
+    def test_command_is_a_no_op_without_partitioning(self):
+        out = StringIO()
+        call_command("manage_partitions", stdout=out)
+        self.assertIn("not partitioned", out.getvalue())
+
+
+class IdempotencyTest(TestCase):
+    def test_losing_a_race_replays_the_winner(self):
+        # The winner commits its key between the lookup and the insert of the loser.
+        data = {"recipient": "test@example.com"}
+        fingerprint = idempotency.fingerprint(data)
+        IdempotencyKey.objects.create(
+            scope="create_schedule", key="race", fingerprint=fingerprint,
+            schedule_id=1, status_code=201, response={"id": 1},
+        )
+        winner = idempotency.lookup("create_schedule", "race", fingerprint)
+        operation = MagicMock(return_value=(201, {"id": 2}, 2))
+        with patch.object(idempotency, "lookup", side_effect=[None, winner]):
+            stored, replayed = idempotency.run("create_schedule", "race", data, operation)
+        operation.assert_called_once()
+        self.assertTrue(replayed)
+        self.assertEqual(stored, idempotency.StoredResponse(201, {"id": 1}))
+
+    def test_fingerprint_ignores_key_order(self):
+        self.assertEqual(idempotency.fingerprint({"a": 1, "b": 2}), idempotency.fingerprint({"b": 2, "a": 1}))
+        self.assertNotEqual(idempotency.fingerprint({"a": 1}), idempotency.fingerprint({"a": 2}))
+
+
+class MetricsTest(SimpleTestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ["operation"], buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, operation='say "hi"')
+        lines = histogram.render(histogram.snapshot())
+        self.assertEqual(lines[:3], [
+            'test_seconds_bucket{operation="say \\"hi\\"",le="0.1"} 1',
+            'test_seconds_bucket{operation="say \\"hi\\"",le="1"} 2',
+            'test_seconds_bucket{operation="say \\"hi\\"",le="+Inf"} 3',
+        ])
+        self.assertEqual(lines[4], 'test_seconds_count{operation="say \\"hi\\""} 3')
+
+    def test_processes_are_added_up_from_the_metrics_dir(self):
+        directory = tempfile.mkdtemp()
+        with override_settings(METRICS_DIR=directory):
+            metrics.RABBITMQ_CONNECTIONS_OPENED.inc(kind="blocking")
+            # Another worker process, flushed earlier.
+            other = {"rabbitmq_connections_opened_total": {'["blocking"]': 2}}
+            with open(f"{directory}/metrics_1.json", "w") as metrics_file:
+                json.dump(other, metrics_file)
+            rendered = metrics.registry.render()
+        self.assertIn('rabbitmq_connections_opened_total{kind="blocking"} 3', rendered)
+
+    def test_rabbitmq_operations_are_timed_and_errors_counted(self):
+        pool = MagicMock()
+        pool.run.side_effect = AMQPConnectionError("down")
+        with self.assertRaises(AMQPConnectionError):
+            RabbitmqService(pool=pool).send_message("exchange", "key", {})
+        rendered = metrics.registry.render()
+        self.assertIn('rabbitmq_operation_errors_total{operation="send_message"} 1', rendered)
+        self.assertIn('rabbitmq_operation_duration_seconds_count{operation="send_message"} 1', rendered)
+
+
+class DeclareTopologyTest(SimpleTestCase):
+    def test_a_refused_declaration_does_not_stop_the_others(self):
+        pool = ConnectionPool(build_connection_parameters())
+        connection = MagicMock()
+        connection.channel.return_value.queue_declare.side_effect = [
+            ChannelClosedByBroker(406, "PRECONDITION_FAILED - inequivalent arg 'x-message-ttl'"), None,
+        ]
+        management = MagicMock()
+        with patch.object(pool, "_open", return_value=connection):
+            errors = RabbitmqService(pool=pool, management_client=management).declare_topology([
+                topology.ExchangeSpec("schedule_data", "topic"),
+                topology.QueueSpec("emails", arguments={"x-message-ttl": 1000}),
+                topology.QueueSpec("sms"),
+                topology.BindingSpec("schedule_data", "sms", "sms.#"),
+            ])
+        self.assertEqual(errors, [None, "406 - PRECONDITION_FAILED - inequivalent arg 'x-message-ttl'", None, None])
+        connection.channel.return_value.exchange_declare.assert_called_once_with(
+            exchange="schedule_data", exchange_type="topic", durable=True, auto_delete=False, internal=False,
+            arguments=None,
+        )
+        management.invalidate.assert_any_call("bindings")
+
+    def test_queue_bind_invalidates_the_cached_bindings(self):
+        pool, management = MagicMock(), MagicMock()
+        RabbitmqService(pool=pool, management_client=management).queue_bind("schedule_data", "sms", "sms.#")
+        pool.run.assert_called_once()
+        management.invalidate.assert_called_once_with("bindings")
@@ -1,13 +1,27 @@
+import csv
+import json
+from datetime import timedelta
+from asgiref.sync import sync_to_async
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse
-from api.models import CommunicationSchedule, Channel, Status
-from unittest.mock import patch
-from api.services.rabbitmq import RabbitmqService
+from django.utils import timezone
+from api.models import Campaign, CommunicationSchedule, Channel, DeadLetterReplay, IdempotencyKey, OutboxMessage, Status
+from api.serializers import ScheduleDetailSerializer
+from api.services import delay_tiers, metrics, status_events
+from api.services.broker import get_broker
+from api.services.reference_data import channels
 
+MEMORY_BROKER = "api.services.memory_broker.InMemoryBroker"
 
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER)
 class CommunicationScheduleViewSetTest(APITestCase):
     def setUp(self):
+        self.broker = get_broker()
+        self.broker.reset()
         # Criação de dados de teste
         self.channel = Channel.objects.get(name="email")
         self.status = Status.objects.get(name="scheduled")
@@ -38,20 +52,183 @@ class CommunicationScheduleViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 4)
 
-    @patch.object(RabbitmqService, "send_message", return_value=None)
-    def test_create_schedule(self, mock_send_message):
+    def test_create_schedule(self):
         url = reverse("communication-schedule-create-schedule")
         response = self.client.post(url, self.schedule_data, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        mock_send_message.assert_called_once_with(
-            self.schedule_data["exchange"], "", {"id": response.data["id"]}
+        self.assertEqual(self.broker.published, 0)
+        self.assertFalse(OutboxMessage.objects.exists())
+        schedule = CommunicationSchedule.objects.get(pk=response.data["id"])
+        self.assertEqual(schedule.exchange, self.schedule_data["exchange"])
+        self.assertEqual(schedule.status.name, "scheduled")
+
+    def test_create_schedule_requires_a_message(self):
+        url = reverse("communication-schedule-create-schedule")
+        missing = {key: value for key, value in self.schedule_data.items() if key != "message"}
+        for data in (missing, dict(self.schedule_data, message="")):
+            response = self.client.post(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("message", response.data)
+        response = self.client.post(reverse("communication-schedule-bulk-create"), [missing], format="json")
+        self.assertIn("message", response.data["results"][0]["errors"])
+        self.assertEqual(CommunicationSchedule.objects.count(), 1)
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_create_schedule_immediate(self):
+        url = reverse("communication-schedule-create-schedule")
+        response = self.client.post(url, self.schedule_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.broker.published, 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.exchange, self.schedule_data["exchange"])
+        self.assertEqual(message.routing_key, "")
+        self.assertEqual(message.body, {"id": response.data["id"]})
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="delayed", SCHEDULE_DELAY_TIERS=[60, 3600])
+    def test_create_schedule_delayed_goes_through_a_delay_tier(self):
+        delay_tiers.provision(self.broker, "test_exchange")
+        due = timezone.now() + timedelta(minutes=10)
+        data = dict(self.schedule_data, scheduled_datetime=due.isoformat())
+        response = self.client.post(reverse("communication-schedule-create-schedule"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.exchange, "test_exchange.delay.60s")
+        self.assertLessEqual(message.available_at, timezone.now())
+        self.assertEqual(
+            message.headers, {"x-delay-until": int(due.timestamp() * 1000), "x-delay-exchange": "test_exchange"}
+        )
+        self.assertEqual(message.body, {"id": response.data["id"]})
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_bulk_create_reports_each_item(self):
+        url = reverse("communication-schedule-bulk-create")
+        invalid = dict(self.schedule_data, channel="pigeon")
+        response = self.client.post(url, [self.schedule_data, invalid, self.schedule_data], format="json")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["failed"], 1)
+        self.assertEqual([item["status"] for item in response.data["results"]], ["created", "invalid", "created"])
+        self.assertIn("channel", response.data["results"][1]["errors"])
+        self.assertEqual(CommunicationSchedule.objects.count(), 3)
+        self.assertEqual(
+            list(OutboxMessage.objects.order_by("id").values_list("exchange", "routing_key", "body")),
+            [
+                (self.schedule_data["exchange"], "", {"id": response.data["results"][0]["data"]["id"]}),
+                (self.schedule_data["exchange"], "", {"id": response.data["results"][2]["data"]["id"]}),
+            ],
         )
 
+    def test_bulk_create_accepts_ndjson(self):
+        url = reverse("communication-schedule-bulk-create")
+        body = "\n".join(json.dumps(self.schedule_data) for _ in range(2)) + "\n"
+        response = self.client.post(url, body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+
+    def test_bulk_create_rejects_empty_list(self):
+        url = reverse("communication-schedule-bulk-create")
+        response = self.client.post(url, [], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_get_schedules(self):
         url = reverse("communication-schedule-get-schedules")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+    def test_get_schedules_query_count_does_not_grow_with_rows(self):
+        for day in range(1, 10):
+            CommunicationSchedule.objects.create(
+                recipient="page@example.com",
+                message="Test message",
+                scheduled_datetime=f"2024-11-0{day}T10:00:00Z",
+                channel=self.channel,
+                status=self.status,
+            )
+        self.client.get(reverse("communication-schedule-get-channels"))
+        self.client.get(reverse("communication-schedule-get-status"))
+        url = reverse("communication-schedule-get-schedules")
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 10)
+        with self.assertNumQueries(1):
+            self.client.get(reverse("communication-schedule-check", kwargs={"pk": self.schedule.id}))
+
+    def test_get_schedules_pages_with_cursor(self):
+        for day in (3, 1, 2):
+            CommunicationSchedule.objects.create(
+                recipient="page@example.com",
+                message="Test message",
+                scheduled_datetime=f"2024-11-0{day}T10:00:00Z",
+                channel=self.channel,
+                status=self.status,
+            )
+        url = reverse("communication-schedule-get-schedules")
+        seen = []
+        next_url = f"{url}?page_size=3"
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item["scheduled_datetime"] for item in response.data["results"])
+            next_url = response.data["next"]
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_get_schedules_filters(self):
+        sms = Channel.objects.get(name="sms")
+        CommunicationSchedule.objects.create(
+            recipient="5591999999999",
+            message="Test message",
+            scheduled_datetime="2025-01-01T10:00:00Z",
+            channel=sms,
+            status=self.status,
+        )
+        url = reverse("communication-schedule-get-schedules")
+        response = self.client.get(url, {"channel": "sms"})
+        self.assertEqual([item["channel"] for item in response.data["results"]], ["sms"])
+        response = self.client.get(url, {"scheduled_before": "2024-12-31T00:00:00Z", "status": "scheduled"})
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.schedule.id])
+        response = self.client.get(url, {"scheduled_after": "not-a-date"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_schedules_invalid_cursor(self):
+        url = reverse("communication-schedule-get-schedules")
+        response = self.client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_ndjson(self):
+        url = reverse("communication-schedule-export")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        detail = self.client.get(reverse("communication-schedule-check", kwargs={"pk": self.schedule.id})).data
+        self.assertEqual([json.loads(line) for line in lines], [dict(detail)])
+
+    def test_export_csv_applies_filters(self):
+        sms = Channel.objects.get(name="sms")
+        schedule = CommunicationSchedule.objects.create(
+            recipient="5591999999999",
+            message="Test, message",
+            scheduled_datetime="2025-01-01T10:00:00Z",
+            channel=sms,
+            status=self.status,
+        )
+        url = reverse("communication-schedule-export")
+        response = self.client.get(url, {"export_format": "csv", "channel": "sms"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["message"], "Test, message")
+        schedule.refresh_from_db()
+        self.assertEqual(rows[0]["scheduled_datetime"], ScheduleDetailSerializer(schedule).data["scheduled_datetime"])
+
+    def test_export_rejects_invalid_parameters(self):
+        url = reverse("communication-schedule-export")
+        self.assertEqual(self.client.get(url, {"export_format": "xml"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"scheduled_after": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_check_schedule(self):
         url = reverse("communication-schedule-check", kwargs={"pk": self.schedule.id})
@@ -66,6 +243,66 @@ class CommunicationScheduleViewSetTest(APITestCase):
         self.schedule.refresh_from_db()
         self.assertEqual(self.schedule.status.name, "canceled")
 
+    def test_cancel_sent_schedule_conflicts(self):
+        self.schedule.status = Status.objects.get(name="sent")
+        self.schedule.save()
+        url = reverse("communication-schedule-cancel", kwargs={"pk": self.schedule.id})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.status.name, "sent")
+
+    def test_bulk_cancel_by_ids(self):
+        sent = CommunicationSchedule.objects.create(
+            recipient="sent@example.com",
+            message="Test message",
+            scheduled_datetime="2024-12-01T10:00:00Z",
+            channel=self.channel,
+            status=Status.objects.get(name="sent"),
+        )
+        url = reverse("communication-schedule-bulk-cancel")
+        response = self.client.post(url, {"ids": [self.schedule.id, sent.id, 999999]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {"status": "canceled", "requested": 3, "matched": 2, "updated": 1, "skipped": 1, "not_found": 1},
+        )
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.status.name, "canceled")
+
+    @override_settings(SCHEDULE_BULK_UPDATE_CHUNK_SIZE=2)
+    def test_bulk_cancel_by_filter_in_chunks(self):
+        sms = Channel.objects.get(name="sms")
+        for day in range(1, 6):
+            CommunicationSchedule.objects.create(
+                recipient="5591999999999",
+                message="Test message",
+                scheduled_datetime=f"2024-11-0{day}T10:00:00Z",
+                channel=sms,
+                status=self.status,
+            )
+        url = reverse("communication-schedule-bulk-cancel")
+        response = self.client.post(
+            url, {"filter": {"channel": "sms", "scheduled_before": "2024-11-05T00:00:00Z"}}, format="json"
+        )
+        self.assertEqual(response.data, {"status": "canceled", "matched": 4, "updated": 4, "skipped": 0})
+        self.assertEqual(CommunicationSchedule.objects.filter(status__name="scheduled").count(), 2)
+
+    def test_bulk_transition_follows_the_allowed_transitions(self):
+        url = reverse("communication-schedule-bulk-transition")
+        response = self.client.post(url, {"status": "failed", "ids": [self.schedule.id]}, format="json")
+        self.assertEqual(response.data["updated"], 1)
+        response = self.client.post(url, {"status": "sent", "ids": [self.schedule.id]}, format="json")
+        self.assertEqual(response.data["skipped"], 1)
+        response = self.client.post(url, {"status": "scheduled", "filter": {"status": "failed"}}, format="json")
+        self.assertEqual(response.data["updated"], 1)
+
+    def test_bulk_cancel_validation(self):
+        url = reverse("communication-schedule-bulk-cancel")
+        for payload in ({}, {"filter": {}}, {"filter": {"campaign": "x"}}, {"ids": [1], "filter": {"channel": "sms"}}):
+            response = self.client.post(url, payload, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+
     def test_update_schedule(self):
         update_data = {
             "recipient": "updated@example.com",
@@ -77,3 +314,496 @@ class CommunicationScheduleViewSetTest(APITestCase):
         self.schedule.refresh_from_db()
         self.assertEqual(self.schedule.recipient, "updated@example.com")
         self.assertEqual(self.schedule.message, "Updated message")
+
+    def test_stats_follow_creates_transitions_and_updates(self):
+        create_url = reverse("communication-schedule-create-schedule")
+        data = {**self.schedule_data, "channel": "sms", "scheduled_datetime": "2024-12-02T23:30:00-03:00"}
+        ids = [self.client.post(create_url, data, format="json").data["id"] for _ in range(3)]
+        self.client.post(reverse("communication-schedule-bulk-create"), [data], format="json")
+        self.client.post(reverse("communication-schedule-cancel", kwargs={"pk": ids[0]}))
+        update_url = reverse("communication-schedule-update-schedule", kwargs={"pk": ids[1]})
+        self.client.put(update_url, {"channel": "email"}, format="json")
+
+        url = reverse("communication-schedule-stats")
+        response = self.client.get(url, {"day_from": "2024-12-03"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Counted on the UTC day of the scheduled datetime.
+        self.assertEqual(
+            response.data,
+            [
+                {"day": "2024-12-03", "channel": "email", "status": "scheduled", "count": 1},
+                {"day": "2024-12-03", "channel": "sms", "status": "scheduled", "count": 2},
+                {"day": "2024-12-03", "channel": "sms", "status": "canceled", "count": 1},
+            ],
+        )
+        response = self.client.get(url, {"day_from": "2024-12-03", "channel": "sms", "group_by": "status"})
+        self.assertEqual(response.data, [{"status": "scheduled", "count": 2}, {"status": "canceled", "count": 1}])
+        response = self.client.get(url, {"day_from": "2024-12-03", "group_by": ""})
+        self.assertEqual(response.data, [{"count": 4}])
+
+    def test_stats_validation(self):
+        url = reverse("communication-schedule-stats")
+        invalid = ({"group_by": "recipient"}, {"channel": "fax"}, {"day_from": "2024-12-03", "day_to": "2024-12-01"})
+        for params in invalid:
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER)
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("communication-schedule-create-schedule")
+        self.schedule_data = {
+            "recipient": "test@example.com",
+            "message": "Test message",
+            "scheduled_datetime": "2024-12-01T10:00:00Z",
+            "channel": "email",
+            "exchange": "test_exchange",
+        }
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format="json", headers={"Idempotency-Key": key})
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_retry_returns_the_original_response(self):
+        first = self.post(self.url, self.schedule_data, "retry-1")
+        second = self.post(self.url, self.schedule_data, "retry-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(CommunicationSchedule.objects.count(), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().schedule_id, first.json()["id"])
+
+    def test_cached_keys_skip_the_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post(self.url, self.schedule_data, "cached")
+        with self.assertNumQueries(0):
+            second = self.post(self.url, self.schedule_data, "cached")
+        self.assertEqual(second.json(), first.json())
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.post(self.url, self.schedule_data, "reused")
+        response = self.post(self.url, dict(self.schedule_data, recipient="other@example.com"), "reused")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(CommunicationSchedule.objects.count(), 1)
+
+    def test_rejected_requests_are_not_recorded(self):
+        response = self.post(self.url, dict(self.schedule_data, channel="pigeon"), "fixed")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post(self.url, dict(self.schedule_data, channel="pigeon"), "fixed")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.post(self.url, self.schedule_data, "x" * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_replay(self):
+        url = reverse("communication-schedule-bulk-create")
+        items = [self.schedule_data, dict(self.schedule_data, channel="pigeon")]
+        first = self.post(url, items, "bulk-1")
+        second = self.post(url, items, "bulk-1")
+        self.assertEqual(first.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(second.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(CommunicationSchedule.objects.count(), 1)
+        # Keys are scoped by endpoint.
+        response = self.post(self.url, self.schedule_data, "bulk-1")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER)
+class CampaignViewSetTest(APITestCase):
+    def setUp(self):
+        self.payload = {
+            "name": "Black Friday",
+            "message": "Olá $name, seu cupom é $code.",
+            "channel": "email",
+            "exchange": "test_exchange",
+            "scheduled_datetime": "2024-12-01T10:00:00Z",
+            "recipients": [
+                {"recipient": "ana@example.com", "variables": {"name": "Ana", "code": "A1"}},
+                {"recipient": "bia@example.com", "variables": {"name": "Bia", "code": "B2"}},
+                {"recipient": "caio@example.com", "scheduled_datetime": "2024-12-02T10:00:00Z"},
+            ],
+        }
+
+    @override_settings(SCHEDULE_BULK_CREATE_BATCH_SIZE=2)
+    def test_create_campaign_stores_the_message_once(self):
+        response = self.client.post(reverse("campaign-create-campaign"), self.payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["recipients"], 3)
+        campaign = Campaign.objects.get(pk=response.data["id"])
+        schedules = list(campaign.schedules.order_by("id"))
+        self.assertEqual([schedule.message for schedule in schedules], ["", "", ""])
+        self.assertEqual(schedules[0].variables, {"name": "Ana", "code": "A1"})
+        self.assertIsNone(schedules[2].variables)
+        self.assertEqual(schedules[2].scheduled_datetime.day, 2)
+        self.assertEqual(OutboxMessage.objects.count(), 0)
+
+    def test_schedules_render_the_campaign_message(self):
+        response = self.client.post(reverse("campaign-create-campaign"), self.payload, format="json")
+        campaign_id = response.data["id"]
+        response = self.client.get(reverse("communication-schedule-get-schedules"), {"campaign": campaign_id})
+        messages = [row["message"] for row in response.data["results"]]
+        self.assertEqual(
+            messages, ["Olá Ana, seu cupom é A1.", "Olá Bia, seu cupom é B2.", "Olá $name, seu cupom é $code."]
+        )
+        schedule = Campaign.objects.get(pk=campaign_id).schedules.order_by("id").first()
+        response = self.client.get(reverse("communication-schedule-check", kwargs={"pk": schedule.pk}))
+        self.assertEqual(response.data["message"], "Olá Ana, seu cupom é A1.")
+        self.assertEqual(response.data["channel"], "email")
+
+    def test_add_recipients_and_bulk_cancel_by_campaign(self):
+        response = self.client.post(reverse("campaign-create-campaign"), self.payload, format="json")
+        campaign_id = response.data["id"]
+        payload = dict(self.payload, recipients=[{"recipient": "davi@example.com"}])
+        url = reverse("campaign-add-recipients", kwargs={"pk": campaign_id})
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["recipients"], 4)
+        response = self.client.get(reverse("campaign-check", kwargs={"pk": campaign_id}))
+        self.assertEqual(response.data["recipients"], 4)
+
+        response = self.client.post(
+            reverse("communication-schedule-bulk-cancel"), {"filter": {"campaign": campaign_id}}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 4)
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_create_campaign_immediate_enqueues_each_recipient(self):
+        self.client.post(reverse("campaign-create-campaign"), self.payload, format="json")
+        self.assertEqual(OutboxMessage.objects.count(), 3)
+
+    def test_create_campaign_validation(self):
+        for payload in (
+            dict(self.payload, recipients=[]),
+            dict(self.payload, channel="pigeon"),
+            dict(self.payload, recipients=[{"variables": {"name": "Ana"}}]),
+        ):
+            response = self.client.post(reverse("campaign-create-campaign"), payload, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+        url = reverse("campaign-add-recipients", kwargs={"pk": 999999})
+        response = self.client.post(url, self.payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER)
+class RabbitMqViewSetTest(APITestCase):
+    def setUp(self):
+        get_broker().reset()
+
+    def test_create_and_bind(self):
+        response = self.client.post(reverse("rabbitmq-create-exchange"), {"exchange_name": "schedule_data"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse("rabbitmq-create-queue"), {"queue_name": "emails"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(
+            reverse("rabbitmq-queue-bind"),
+            {"exchange_name": "schedule_data", "queue_name": "emails", "rout_key_name": "email"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        get_broker().send_message("schedule_data", "email", {"id": 1})
+        self.assertEqual(get_broker().drain("emails")[0]["body"], {"id": 1})
+
+    def test_bind_to_missing_queue_fails(self):
+        response = self.client.post(
+            reverse("rabbitmq-queue-bind"), {"exchange_name": "amq.direct", "queue_name": "missing"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_list_queues_honours_if_none_match(self):
+        get_broker().create_queue("emails")
+        url = reverse("rabbitmq-list-queues")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([queue["name"] for queue in response.data], ["emails"])
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        get_broker().create_queue("sms")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_apply_topology_declares_only_the_changes(self):
+        spec = {
+            "exchanges": [{"name": "schedule_data", "type": "topic"}],
+            "queues": [{"name": f"queue_{i}", "arguments": {"x-message-ttl": 60000}} for i in range(3)],
+            "bindings": [
+                {"exchange": "schedule_data", "queue": f"queue_{i}", "routing_key": "sms.#"} for i in range(3)
+            ],
+        }
+        url = reverse("rabbitmq-apply-topology")
+        response = self.client.post(url, spec, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["summary"], {"created": 7})
+        response = self.client.post(url, spec, format="json")
+        self.assertEqual(response.data["summary"], {"unchanged": 7})
+        get_broker().send_message("schedule_data", "sms.br", {"id": 1})
+        self.assertEqual(len(get_broker().drain("queue_2")), 1)
+
+    def test_apply_topology_reports_conflicts_and_failures(self):
+        get_broker().create_exchange("schedule_data")
+        spec = {
+            "exchanges": [{"name": "schedule_data", "type": "fanout"}],
+            "queues": [{"name": "emails"}],
+            "bindings": [
+                {"exchange": "schedule_data", "queue": "missing"},
+                {"exchange": "schedule_data", "queue": "emails", "routing_key": "email"},
+            ],
+        }
+        response = self.client.post(reverse("rabbitmq-apply-topology"), spec, format="json")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = [(result["kind"], result["result"]) for result in response.data["results"]]
+        self.assertEqual(
+            results, [("exchange", "conflict"), ("queue", "created"), ("binding", "failed"), ("binding", "created")]
+        )
+        self.assertIn("type is 'direct', not 'fanout'", response.data["results"][0]["detail"])
+        self.assertIn("404", response.data["results"][2]["detail"])
+
+    @override_settings(SCHEDULE_DELAY_TIERS=[5, 60])
+    def test_delay_tiers_provisions_a_ttl_queue_per_tier(self):
+        get_broker().create_exchange("schedule_data")
+        url = reverse("rabbitmq-delay-tiers")
+        response = self.client.post(url, {"exchange_name": "schedule_data"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["summary"], {"created": 9})
+        queues = {queue["name"]: queue["arguments"] for queue in get_broker().list_queues()}
+        self.assertEqual(
+            queues["schedule_data.delay.60s"],
+            {"x-message-ttl": 60000, "x-dead-letter-exchange": "schedule_delay.router"},
+        )
+        get_broker().send_message("schedule_data.delay.5s", "email", {"id": 1})
+        self.assertEqual(get_broker().drain("schedule_data.delay.5s")[0]["routing_key"], "email")
+        response = self.client.post(url, {"exchange_name": "schedule_data", "delays": [0]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_dead_letter_queue_peek_and_replay(self):
+        response = self.client.post(
+            reverse("rabbitmq-create-queue"), {"queue_name": "emails", "dead_letter": True}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["summary"], {"created": 4})
+        broker = get_broker()
+        broker.queue_bind("amq.direct", "emails", "email")
+        broker.send_messages([("amq.direct", "email", {"id": i}) for i in range(5)])
+        consumer = broker.open_consumer("emails", 10)
+        consumer.settle([], [delivery.tag for delivery in consumer.fetch(10, 0)])
+
+        url = reverse("rabbitmq-dead-letters")
+        response = self.client.get(url, {"queue_name": "emails.dlq", "page": 2, "page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual([message["position"] for message in response.data["results"]], [2, 3])
+        self.assertEqual(response.data["results"][0]["exchange"], "amq.direct")
+        fingerprint = response.data["results"][0]["fingerprint"]
+        response = self.client.get(url, {"queue_name": "emails.dlq", "page": 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        url = reverse("rabbitmq-replay-dead-letters")
+        response = self.client.post(url, {"queue_name": "emails.dlq"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {"queue_name": "emails.dlq", "fingerprints": [fingerprint]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["replayed"], response.data["failed"]), (1, 0))
+        self.assertEqual(broker.drain("emails")[0]["body"], {"id": 2})
+        response = self.client.post(url, {"queue_name": "emails.dlq", "all": True}, format="json")
+        self.assertEqual(response.data["replayed"], 4)
+        self.assertEqual(DeadLetterReplay.objects.count(), 2)
+
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER, CHANNEL_RATE_LIMIT_ADMISSION=True)
+class ChannelRateLimitTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # The limits are rolled back with the test, the cached channels are not.
+        self.addCleanup(channels.invalidate)
+        self.schedule_data = {
+            "recipient": "+5511999999999",
+            "message": "Test message",
+            "scheduled_datetime": "2024-12-01T10:00:00Z",
+            "channel": "sms",
+            "exchange": "test_exchange",
+        }
+
+    def set_limit(self, rate_limit, burst):
+        url = reverse("communication-schedule-update-channel-rate-limit", kwargs={"name": "sms"})
+        return self.client.put(url, {"rate_limit": rate_limit, "burst": burst}, format="json")
+
+    def test_update_rate_limit(self):
+        response = self.set_limit(5, 10)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["rate_limit"], response.data["burst"]), (5, 10))
+        self.assertEqual(self.set_limit(5, 0).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_over_the_rate_returns_429_with_retry_after(self):
+        self.set_limit(0.1, 2)
+        url = reverse("communication-schedule-create-schedule")
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, self.schedule_data, format="json").status_code, 201)
+        response = self.client.post(url, self.schedule_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "10")
+        # Other channels are not affected.
+        response = self.client.post(url, {**self.schedule_data, "channel": "email"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_async_create_is_throttled_too(self):
+        self.set_limit(0.1, 1)
+        url = reverse("async-schedule-create-schedule")
+        self.assertEqual(self.client.post(url, self.schedule_data, format="json").status_code, 201)
+        response = self.client.post(url, self.schedule_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER)
+class MetricsViewTest(APITestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_requests_are_recorded_by_view(self):
+        self.client.get(reverse("communication-schedule-get-schedules"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn(
+            'http_requests_total{view="communication-schedule-get-schedules",method="GET",status="200"} 1', body
+        )
+        self.assertIn('http_request_db_queries_count{view="communication-schedule-get-schedules"} 1', body)
+        self.assertNotIn('http_request_db_queries_sum{view="communication-schedule-get-schedules"} 0.0', body)
+        self.assertIn('serializer_duration_seconds_count{serializer="ScheduleDetailSerializer",phase="values"} 1', body)
+
+
+@override_settings(BROKER_BACKEND=MEMORY_BROKER)
+class AsyncScheduleViewTest(APITestCase):
+    def setUp(self):
+        self.broker = get_broker()
+        self.broker.reset()
+        self.broker.create_exchange("test_exchange")
+        self.broker.create_queue("test_queue")
+        self.broker.queue_bind("test_exchange", "test_queue", "")
+        self.schedule_data = {
+            "recipient": "test@example.com",
+            "message": "Test message",
+            "scheduled_datetime": "2024-12-01T10:00:00Z",
+            "channel": "email",
+            "exchange": "test_exchange",
+        }
+        self.schedule = CommunicationSchedule.objects.create(
+            recipient="test@example.com",
+            message="Test message",
+            scheduled_datetime="2024-12-01T10:00:00Z",
+            channel=Channel.objects.get(name="email"),
+            status=Status.objects.get(name="scheduled"),
+        )
+
+    def test_create_schedule(self):
+        url = reverse("async-schedule-create-schedule")
+        response = self.client.post(url, self.schedule_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        schedule = CommunicationSchedule.objects.get(pk=response.json()["id"])
+        self.assertEqual(schedule.exchange, "test_exchange")
+        self.assertEqual(response.json()["status"], "scheduled")
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_create_schedule_publishes_without_leaving_outbox(self):
+        url = reverse("async-schedule-create-schedule")
+        response = self.client.post(url, self.schedule_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([message["body"] for message in self.broker.drain("test_queue")], [{"id": response.json()["id"]}])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_failed_publish_is_left_to_the_relay(self):
+        self.broker.disconnect()
+        url = reverse("async-schedule-create-schedule")
+        response = self.client.post(url, self.schedule_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(OutboxMessage.objects.get().body, {"id": response.json()["id"]})
+
+    def test_create_schedule_validation_error(self):
+        url = reverse("async-schedule-create-schedule")
+        response = self.client.post(url, dict(self.schedule_data, channel="pigeon"), format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("channel", response.json())
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_unconfirmed_eager_publish_is_left_to_the_relay(self):
+        url = reverse("async-schedule-create-schedule")
+        response = self.client.post(url, dict(self.schedule_data, exchange="missing_exchange"), format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.body, message.attempts), ({"id": response.json()["id"]}, 1))
+
+    def test_create_schedule_without_message_is_rejected(self):
+        url = reverse("async-schedule-create-schedule")
+        data = {key: value for key, value in self.schedule_data.items() if key != "message"}
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("message", response.json())
+
+    @override_settings(SCHEDULE_DISPATCH_MODE="immediate")
+    def test_create_schedule_replays_idempotent_requests(self):
+        cache.clear()
+        url = reverse("async-schedule-create-schedule")
+        first = self.client.post(url, self.schedule_data, format="json", headers={"Idempotency-Key": "k1"})
+        second = self.client.post(url, self.schedule_data, format="json", headers={"Idempotency-Key": "k1"})
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(len(self.broker.drain("test_queue")), 1)
+        # The synchronous endpoint shares the keys of the asynchronous one.
+        third = self.client.post(
+            reverse("communication-schedule-create-schedule"), self.schedule_data, format="json",
+            headers={"Idempotency-Key": "k1"},
+        )
+        self.assertEqual(third.json(), first.json())
+
+    def test_check_and_cancel(self):
+        response = self.client.get(reverse("async-schedule-check", kwargs={"pk": self.schedule.id}))
+        self.assertEqual(response.json()["status"], "scheduled")
+        response = self.client.post(reverse("async-schedule-cancel", kwargs={"pk": self.schedule.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.status.name, "canceled")
+        response = self.client.get(reverse("async-schedule-check", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def read_events(self, response, count):
+        events = []
+        async for chunk in response.streaming_content:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            events += [json.loads(line[len("data: "):]) for line in text.splitlines() if line.startswith("data: ")]
+            if len(events) >= count:
+                break
+        return events
+
+    async def test_stream_pushes_status_changes_until_final(self):
+        canceled = await sync_to_async(Status.objects.get)(name="canceled")
+        url = reverse("async-schedule-stream")
+        response = await self.async_client.get(url, {"id": str(self.schedule.id)})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        # The current status comes first.
+        self.assertEqual(
+            await self.read_events(response, 1), [{"id": self.schedule.id, "channel": "email", "status": "scheduled"}]
+        )
+        event = status_events.StatusEvent(self.schedule.id, self.schedule.channel_id, canceled.id)
+        await sync_to_async(status_events.hub.publish)([event])
+        self.assertEqual(
+            await self.read_events(response, 1), [{"id": self.schedule.id, "channel": "email", "status": "canceled"}]
+        )
+        # A canceled schedule cannot change anymore, so the stream ends.
+        self.assertEqual([chunk async for chunk in response.streaming_content], [])
+        self.assertEqual(len(status_events.hub), 0)
+
+    def test_stream_validation(self):
+        url = reverse("async-schedule-stream")
+        for params in ({"id": "x"}, {"channel": "pigeon"}, {"status": "lost"}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST, params)